@@ -9,10 +9,95 @@ DEFAULT_CONFIG: Dict[str, Any] = {
         "model": "gemini-2.5-flash-image-preview",
         "api_key": "sk-abc",
         "return_base64_default": False,
-    }
+        "upstreams": [],
+        "balance_policy": "least_in_flight",
+        "eject_seconds": 30,
+        "pool_connections": 4,
+        "pool_maxsize": 10,
+        "connect_timeout": 10,
+        "read_timeout": 120,
+        "requests_per_minute": 0,
+        "max_in_flight": 0,
+        "batch_max_workers": 8,
+        "retry": {
+            "max_attempts": 3,
+            "retry_statuses": [429, 500, 502, 503, 504],
+            "retry_on_timeout": True,
+            "backoff_base": 1.0,
+            "backoff_max": 20.0,
+            "deadline_seconds": 300,
+            "hedge_after_seconds": 0,
+            "hedge_percentile": 0.95,
+            "hedge_min_samples": 20,
+            "hedge_window": 200,
+        },
+        "cache": {
+            "dir": "cache/gemini",
+            "max_bytes": 1073741824,
+            "default_mode": "bypass",
+        },
+        "pipeline": {
+            "dir": "cache/gemini-steps",
+            "max_bytes": 1073741824,
+        },
+        "preprocess": {
+            "enabled": False,
+            "max_edge": 1536,
+            "format": "jpeg",
+            "quality": 85,
+            "max_workers": 4,
+            "recent_entries": 256,
+            "recent_max_bytes": 67108864,
+        },
+    },
+    "tts": {
+        "base_url": "https://ai.gitee.com/v1",
+        "model": "IndexTTS-2",
+        "max_workers": 4,
+        "requests_per_minute": 0,
+        "max_in_flight": 0,
+        "cache": {
+            "dir": "cache/tts",
+            "max_bytes": 1073741824,
+            "default_mode": "bypass",
+        },
+    },
+    "storage": {
+        "dedup": False,
+        "dir": "store/blobs",
+        "batch_max_workers": 4,
+    },
+    "bilibili": {
+        "backend": "auto",
+        "direct_api_url": "",
+        "direct_api_headers": {},
+        "direct_api_timeout": 30,
+        "page_url": "https://www.feiyudo.com/caption/subtitle/bilibili",
+        "browser_pool_size": 2,
+        "context_max_uses": 50,
+        "headless": True,
+        "blocked_resource_types": ["image", "media", "font", "stylesheet"],
+        "blocked_domains": [
+            "google-analytics.com",
+            "googletagmanager.com",
+            "doubleclick.net",
+            "hm.baidu.com",
+            "cnzz.com",
+            "umeng.com",
+        ],
+        "allowed_domains": [],
+        "batch_concurrency": 4,
+        "cache": {
+            "enabled": True,
+            "max_entries": 512,
+            "ttl_seconds": 86400,
+            "db_path": "",
+        },
+    },
 }
 
-CONFIG_PATH = Path(__file__).resolve().parent / "config.json"
+BASE_DIR = Path(__file__).resolve().parent
+CONFIG_PATH = BASE_DIR / "config.json"
 _CONFIG_CACHE: Dict[str, Any] | None = None
 
 
@@ -50,3 +135,9 @@ def load_config(refresh: bool = False) -> Dict[str, Any]:
         _CONFIG_CACHE = _deep_merge(DEFAULT_CONFIG, file_config)
 
     return _CONFIG_CACHE
+
+
+def resolve_path(value: str) -> Path:
+    """将配置中的路径解析为绝对路径（相对路径以项目根目录为基准）"""
+    path = Path(value).expanduser()
+    return path if path.is_absolute() else BASE_DIR / path
@@ -0,0 +1,93 @@
+"""
+后台事件循环模块
+整个服务共享一个常驻事件循环线程，同步的 Flask 处理函数通过它执行协程，
+浏览器池、HTTP 会话等长生命周期资源也都挂在这个循环上跨请求复用
+"""
+
+import asyncio
+import atexit
+import threading
+from concurrent.futures import Future
+from typing import Any, Awaitable, Callable, List, Optional
+
+_loop: Optional[asyncio.AbstractEventLoop] = None
+_thread: Optional[threading.Thread] = None
+_lock = threading.Lock()
+
+# 关闭时需要在事件循环上执行的清理协程
+_shutdown_hooks: List[Callable[[], Awaitable[Any]]] = []
+
+
+def get_loop() -> asyncio.AbstractEventLoop:
+    """返回共享的后台事件循环，首次调用时启动线程"""
+    global _loop, _thread
+
+    with _lock:
+        if _loop is None or _loop.is_closed():
+            _loop = asyncio.new_event_loop()
+            _thread = threading.Thread(
+                target=_loop.run_forever,
+                name="async-runtime",
+                daemon=True
+            )
+            _thread.start()
+
+    return _loop
+
+
+def submit(coro: Awaitable[Any]) -> Future:
+    """
+    将协程提交到后台事件循环
+
+    Returns:
+        concurrent.futures.Future，可在任意线程中等待结果
+    """
+    return asyncio.run_coroutine_threadsafe(coro, get_loop())
+
+
+def run_sync(coro: Awaitable[Any], timeout: Optional[float] = None) -> Any:
+    """在后台事件循环上执行协程并阻塞等待结果（供同步代码调用）"""
+    future = submit(coro)
+    try:
+        return future.result(timeout)
+    except TimeoutError:
+        future.cancel()
+        raise
+
+
+def register_shutdown_hook(hook: Callable[[], Awaitable[Any]]):
+    """注册服务关闭时在事件循环上执行的清理协程（如关闭浏览器池）"""
+    _shutdown_hooks.append(hook)
+
+
+def shutdown(timeout: float = 10):
+    """执行清理钩子并停止后台事件循环"""
+    global _loop, _thread
+
+    with _lock:
+        loop, thread = _loop, _thread
+        _loop, _thread = None, None
+
+    if loop is None or loop.is_closed():
+        return
+
+    async def _run_hooks():
+        for hook in reversed(_shutdown_hooks):
+            try:
+                await hook()
+            except Exception as e:
+                print(f"关闭钩子执行失败: {e}")
+
+    try:
+        asyncio.run_coroutine_threadsafe(_run_hooks(), loop).result(timeout)
+    except Exception:
+        pass
+
+    loop.call_soon_threadsafe(loop.stop)
+    if thread is not None:
+        thread.join(timeout)
+    if not loop.is_running():
+        loop.close()
+
+
+atexit.register(shutdown)
@@ -0,0 +1,180 @@
+"""
+Base64 流式解码模块
+分块解码 Base64 并直接写入磁盘：不需要把完整的 Base64 字符串或解码后的数据放在内存中
+"""
+
+import binascii
+import errno
+import hashlib
+import os
+import shutil
+import uuid
+from pathlib import Path
+from typing import Optional, Tuple, Union
+
+_ALPHABET = b"ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789+/="
+# 解码前删除的字符：换行、空格以及 JSON 中 "\/" 转义留下的反斜杠等
+_NON_ALPHABET = bytes(c for c in range(256) if c not in _ALPHABET)
+
+# 保留的文件头字节数，用于检测文件类型（与 save_base64.SNIFF_BYTES 一致）
+HEAD_BYTES = 512
+
+
+class Base64StreamDecoder:
+    """
+    增量 Base64 解码器
+
+    每次 feed 只解码凑满 4 字符的部分，余下的留到下一块；非字母表字符会被忽略
+    """
+
+    def __init__(self):
+        self._pending = b""
+
+    def feed(self, chunk: Union[bytes, bytearray, memoryview]) -> bytes:
+        data = self._pending + bytes(chunk).translate(None, _NON_ALPHABET)
+        usable = len(data) - len(data) % 4
+        self._pending = data[usable:]
+        return binascii.a2b_base64(data[:usable]) if usable else b""
+
+    def finish(self) -> bytes:
+        """解码剩余字符（允许省略末尾的 = 填充）"""
+        pending, self._pending = self._pending, b""
+        if not pending:
+            return b""
+        if len(pending) == 1:
+            raise binascii.Error("Base64 数据长度不正确")
+        return binascii.a2b_base64(pending + b"=" * (-len(pending) % 4))
+
+
+class Base64FileWriter:
+    """
+    把分块到达的 Base64 解码写入文件
+
+    数据先写入目标目录下的临时文件，commit() 时原子重命名为最终文件；
+    出错或调用 abort() 时删除临时文件，不会留下半截文件。
+    同时统计写入字节数并增量计算 sha256。
+
+    用法:
+        with Base64FileWriter(directory) as writer:
+            for chunk in chunks:
+                writer.feed(chunk)
+            writer.commit(final_path)
+    """
+
+    def __init__(self, directory: Union[str, Path]):
+        directory = Path(directory)
+        directory.mkdir(parents=True, exist_ok=True)
+
+        self.temp_path = directory / f".{uuid.uuid4().hex}.part"
+        self.bytes_written = 0
+        self.head = b""
+        self.path: Optional[Path] = None
+
+        self._decoder = Base64StreamDecoder()
+        self._hash = hashlib.sha256()
+        self._file = open(self.temp_path, "wb")
+
+    def _write(self, data: bytes):
+        if data:
+            if len(self.head) < HEAD_BYTES:
+                self.head += data[:HEAD_BYTES - len(self.head)]
+            self._file.write(data)
+            self._hash.update(data)
+            self.bytes_written += len(data)
+
+    def feed(self, chunk: Union[bytes, bytearray, memoryview]):
+        self._write(self._decoder.feed(chunk))
+
+    @property
+    def sha256(self) -> str:
+        return self._hash.hexdigest()
+
+    def finish(self):
+        """写完剩余数据并关闭临时文件（之后 head / bytes_written / sha256 为最终值）"""
+        if not self._file.closed:
+            self._write(self._decoder.finish())
+            self._file.close()
+
+    def commit(self, final_path: Union[str, Path]) -> Path:
+        """写完剩余数据并重命名为 final_path（已存在则覆盖）；跨文件系统时退化为移动"""
+        self.finish()
+        try:
+            os.replace(self.temp_path, final_path)
+        except OSError as e:
+            if e.errno != errno.EXDEV:
+                raise
+            shutil.move(str(self.temp_path), str(final_path))
+        self.path = Path(final_path)
+        return self.path
+
+    def abort(self):
+        """放弃写入并删除临时文件"""
+        if not self._file.closed:
+            self._file.close()
+        if self.path is None:
+            try:
+                self.temp_path.unlink()
+            except OSError:
+                pass
+
+    def __enter__(self) -> "Base64FileWriter":
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.abort()
+        return False
+
+
+class JsonStringFilter:
+    """
+    从分块到达的 JSON 字符串值中取出原始字符
+
+    处理转义（"\/" 还原为 "/"，其余转义如 "\n" 直接丢弃，Base64 中不会出现需要保留的转义字符），
+    遇到未转义的引号表示字符串结束
+    """
+
+    def __init__(self):
+        self._pending_escape = False
+        self._skip = 0
+
+    def feed(self, chunk: bytes) -> Tuple[bytes, int]:
+        """
+        Returns:
+            (字符串内容, 结束引号在 chunk 中的位置)；字符串尚未结束时位置为 -1
+        """
+        out = []
+        size = len(chunk)
+        i = min(self._skip, size)
+        self._skip -= i
+
+        if self._pending_escape and i < size:
+            self._pending_escape = False
+            i = self._handle_escape(chunk, i, out)
+
+        while i < size:
+            quote = chunk.find(b'"', i)
+            backslash = chunk.find(b"\\", i, quote if quote >= 0 else size)
+            if backslash < 0:
+                out.append(chunk[i:quote if quote >= 0 else size])
+                return b"".join(out), quote
+
+            out.append(chunk[i:backslash])
+            if backslash + 1 >= size:
+                self._pending_escape = True
+                break
+            i = self._handle_escape(chunk, backslash + 1, out)
+
+        return b"".join(out), -1
+
+    def _handle_escape(self, chunk: bytes, pos: int, out: list) -> int:
+        """处理 chunk[pos] 处的转义字符，返回之后的位置"""
+        escaped = chunk[pos:pos + 1]
+        if escaped == b"/":
+            out.append(b"/")
+        elif escaped == b"u":
+            # \uXXXX：跳过 4 位十六进制，可能跨块
+            end = pos + 5
+            if end > len(chunk):
+                self._skip = end - len(chunk)
+            return min(end, len(chunk))
+        return pos + 1
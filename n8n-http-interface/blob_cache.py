@@ -0,0 +1,178 @@
+"""
+磁盘 LRU 缓存模块
+按内容哈希键把二进制结果（图片、音频等）存到磁盘，总大小超过上限时淘汰最久未使用的条目
+"""
+
+import hashlib
+import json
+import os
+import threading
+import uuid
+from collections import OrderedDict
+from pathlib import Path
+from typing import Optional, Tuple, Union
+
+from config_loader import resolve_path
+
+
+def hash_bytes(data: Union[bytes, str]) -> str:
+    """返回数据的 sha256 十六进制摘要"""
+    if isinstance(data, str):
+        data = data.encode("utf-8")
+    return hashlib.sha256(data).hexdigest()
+
+
+def hash_json(value) -> str:
+    """对可 JSON 序列化的对象计算稳定的 sha256 摘要（键排序）"""
+    return hash_bytes(json.dumps(value, sort_keys=True, ensure_ascii=False, separators=(",", ":")))
+
+
+class DiskLRUCache:
+    """
+    以哈希为键的磁盘缓存
+
+    - 目录结构：<root>/<key 前两位>/<key>（数据）和 <key>.json（元数据）
+    - 索引在首次使用时扫描一次目录重建，按文件修改时间恢复 LRU 顺序
+    - 命中时刷新修改时间，重启后 LRU 顺序仍然有效
+    - 写入先落临时文件再原子替换，并发写同一个键不会产生半截文件
+    """
+
+    def __init__(self, root: Union[str, Path], max_bytes: int = 1024 ** 3):
+        self.root = resolve_path(str(root))
+        self.max_bytes = max(0, int(max_bytes))
+
+        self._index: Optional["OrderedDict[str, int]"] = None
+        self._total_bytes = 0
+        self._lock = threading.Lock()
+        self._stats = {
+            "hits": 0,
+            "misses": 0,
+            "stores": 0,
+            "evictions": 0,
+        }
+
+    def _blob_path(self, key: str) -> Path:
+        return self.root / key[:2] / key
+
+    def _meta_path(self, key: str) -> Path:
+        return self.root / key[:2] / f"{key}.json"
+
+    def _load_index(self):
+        """首次访问时扫描目录重建索引"""
+        if self._index is not None:
+            return
+
+        entries = []
+        if self.root.exists():
+            for shard in self.root.iterdir():
+                if not shard.is_dir():
+                    continue
+                for blob in shard.iterdir():
+                    if blob.suffix or blob.name.startswith("."):
+                        continue
+                    try:
+                        stat = blob.stat()
+                    except OSError:
+                        continue
+                    entries.append((stat.st_mtime, blob.name, stat.st_size))
+
+        entries.sort()
+        self._index = OrderedDict((key, size) for _, key, size in entries)
+        self._total_bytes = sum(self._index.values())
+
+    def _remove(self, key: str):
+        size = self._index.pop(key, 0)
+        self._total_bytes -= size
+        for path in (self._blob_path(key), self._meta_path(key)):
+            try:
+                path.unlink()
+            except OSError:
+                pass
+
+    def _evict(self):
+        while self._total_bytes > self.max_bytes and self._index:
+            oldest = next(iter(self._index))
+            self._remove(oldest)
+            self._stats["evictions"] += 1
+
+    def get_path(self, key: str) -> Optional[Path]:
+        """
+        查询缓存，命中时返回数据文件路径（可直接硬链接或复制），未命中返回 None
+
+        返回的文件可能随后被淘汰，调用方应尽快使用。
+        """
+        with self._lock:
+            self._load_index()
+            path = self._blob_path(key)
+
+            if key not in self._index or not path.exists():
+                if key in self._index:
+                    self._remove(key)
+                self._stats["misses"] += 1
+                return None
+
+            self._index.move_to_end(key)
+            try:
+                os.utime(path)
+            except OSError:
+                pass
+            self._stats["hits"] += 1
+            return path
+
+    def get(self, key: str) -> Optional[Tuple[bytes, dict]]:
+        """读取缓存，命中时返回 (数据, 元数据)"""
+        path = self.get_path(key)
+        if path is None:
+            return None
+
+        try:
+            data = path.read_bytes()
+        except OSError:
+            return None
+
+        meta = {}
+        try:
+            meta = json.loads(self._meta_path(key).read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            pass
+        return data, meta
+
+    def _write_atomic(self, path: Path, data: bytes):
+        tmp_path = path.with_name(f".{path.name}.{uuid.uuid4().hex}.tmp")
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+    def put(self, key: str, data: bytes, meta: Optional[dict] = None) -> Optional[Path]:
+        """写入缓存，必要时淘汰最久未使用的条目；返回数据文件路径，超过容量上限不写入时返回 None"""
+        if len(data) > self.max_bytes:
+            return None
+
+        blob_path = self._blob_path(key)
+        blob_path.parent.mkdir(parents=True, exist_ok=True)
+
+        # 先写元数据再写数据：数据文件存在即视为条目完整
+        self._write_atomic(self._meta_path(key), json.dumps(meta or {}, ensure_ascii=False).encode("utf-8"))
+        self._write_atomic(blob_path, data)
+
+        with self._lock:
+            self._load_index()
+            self._total_bytes -= self._index.pop(key, 0)
+            self._index[key] = len(data)
+            self._total_bytes += len(data)
+            self._stats["stores"] += 1
+            self._evict()
+
+        return blob_path
+
+    def stats(self) -> dict:
+        """返回缓存统计"""
+        with self._lock:
+            self._load_index()
+            return {
+                "root": str(self.root),
+                "entries": len(self._index),
+                "bytes": self._total_bytes,
+                "max_bytes": self.max_bytes,
+                **self._stats,
+            }
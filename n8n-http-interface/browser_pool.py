@@ -0,0 +1,294 @@
+"""
+Chromium 浏览器池模块
+常驻一个 Chromium 进程，并维护一组可复用的浏览器上下文，避免每次请求冷启动浏览器
+"""
+
+import asyncio
+from contextlib import asynccontextmanager
+from typing import Iterable, Optional
+from urllib.parse import urlsplit
+
+from playwright.async_api import async_playwright
+
+from async_runtime import register_shutdown_hook
+from config_loader import DEFAULT_CONFIG, load_config
+
+
+def _match_domain(host: str, domains: frozenset) -> bool:
+    """host 等于列表中的域名或是其子域名"""
+    while host:
+        if host in domains:
+            return True
+        _, _, host = host.partition(".")
+    return False
+
+
+class ResourceBlocker:
+    """
+    请求拦截规则：按资源类型和域名决定是否中止请求
+
+    - blocked_resource_types: 直接中止的资源类型（image / font / stylesheet / media 等）
+    - blocked_domains: 直接中止的域名（含子域名），如统计、广告脚本
+    - allowed_domains: 非空时只放行这些域名（含子域名），其他第三方请求全部中止
+    """
+
+    def __init__(
+        self,
+        blocked_resource_types: Iterable[str] = (),
+        blocked_domains: Iterable[str] = (),
+        allowed_domains: Iterable[str] = (),
+    ):
+        self.blocked_resource_types = frozenset(t.lower() for t in blocked_resource_types)
+        self.blocked_domains = frozenset(d.lower().lstrip(".") for d in blocked_domains)
+        self.allowed_domains = frozenset(d.lower().lstrip(".") for d in allowed_domains)
+
+    def __bool__(self) -> bool:
+        return bool(self.blocked_resource_types or self.blocked_domains or self.allowed_domains)
+
+    def should_block(self, resource_type: str, url: str) -> bool:
+        if resource_type in self.blocked_resource_types:
+            return True
+
+        parts = urlsplit(url)
+        if parts.scheme not in ("http", "https"):
+            return False
+
+        host = (parts.hostname or "").lower()
+        if _match_domain(host, self.blocked_domains):
+            return True
+        if self.allowed_domains and not _match_domain(host, self.allowed_domains):
+            return True
+        return False
+
+
+class _ContextSlot:
+    """池中的一个浏览器上下文及其使用次数"""
+
+    def __init__(self, context):
+        self.context = context
+        self.uses = 0
+        # 当前租约的网络统计，由请求拦截和响应监听更新
+        self.network = {}
+
+
+class BrowserPool:
+    """
+    有界的浏览器上下文池
+
+    - 浏览器进程常驻，首次租用时启动，断开后自动重启
+    - 同时租出的上下文数量不超过 size
+    - 每个上下文使用 max_uses 次后回收重建
+    - 每次租用都会新建页面，归还时关闭页面并清理 Cookie，保证请求之间互相隔离
+
+    注意：池内的 Playwright 对象绑定在创建它们的事件循环上，只能在 async_runtime 的共享循环中使用。
+    """
+
+    def __init__(
+        self,
+        size: int = 2,
+        max_uses: int = 50,
+        headless: bool = True,
+        blocker: Optional[ResourceBlocker] = None,
+    ):
+        self.size = max(1, int(size))
+        self.max_uses = max(1, int(max_uses))
+        self.headless = headless
+        self.blocker = blocker
+
+        self._playwright = None
+        self._browser = None
+        self._idle: list[_ContextSlot] = []
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._start_lock: Optional[asyncio.Lock] = None
+
+        self._stats = {
+            "browser_launches": 0,
+            "contexts_created": 0,
+            "contexts_recycled": 0,
+            "leases": 0,
+        }
+
+    def _ensure_primitives(self):
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.size)
+            self._start_lock = asyncio.Lock()
+
+    def _browser_healthy(self) -> bool:
+        return self._browser is not None and self._browser.is_connected()
+
+    async def _ensure_browser(self):
+        """启动浏览器（或在浏览器断开后重启）"""
+        if self._browser_healthy():
+            return
+
+        async with self._start_lock:
+            if self._browser_healthy():
+                return
+
+            # 浏览器已断开，原有上下文全部作废
+            self._idle.clear()
+            if self._browser is not None:
+                try:
+                    await self._browser.close()
+                except Exception:
+                    pass
+                self._browser = None
+
+            if self._playwright is None:
+                self._playwright = await async_playwright().start()
+
+            self._browser = await self._playwright.chromium.launch(headless=self.headless)
+            self._stats["browser_launches"] += 1
+
+    async def _new_slot(self) -> _ContextSlot:
+        context = await self._browser.new_context()
+        slot = _ContextSlot(context)
+
+        if self.blocker:
+            blocker = self.blocker
+
+            async def handle_route(route):
+                request = route.request
+                if blocker.should_block(request.resource_type, request.url):
+                    slot.network["blocked"] = slot.network.get("blocked", 0) + 1
+                    await route.abort()
+                else:
+                    slot.network["requests"] = slot.network.get("requests", 0) + 1
+                    await route.continue_()
+
+            await context.route("**/*", handle_route)
+
+        self._stats["contexts_created"] += 1
+        return slot
+
+    async def _discard_slot(self, slot: _ContextSlot):
+        self._stats["contexts_recycled"] += 1
+        try:
+            await slot.context.close()
+        except Exception:
+            pass
+
+    async def _acquire_slot(self) -> _ContextSlot:
+        await self._ensure_browser()
+
+        while self._idle:
+            slot = self._idle.pop()
+            # 健康检查：所属浏览器仍然在线
+            if slot.context.browser is self._browser and self._browser_healthy():
+                return slot
+            await self._discard_slot(slot)
+
+        return await self._new_slot()
+
+    async def _release_slot(self, slot: _ContextSlot, healthy: bool):
+        slot.uses += 1
+
+        if healthy and slot.uses < self.max_uses and self._browser_healthy():
+            try:
+                await slot.context.clear_cookies()
+                self._idle.append(slot)
+                return
+            except Exception:
+                pass
+
+        await self._discard_slot(slot)
+
+    @asynccontextmanager
+    async def lease(self, network_stats: Optional[dict] = None):
+        """
+        租用一个隔离的页面
+
+        Args:
+            network_stats: 可选的字典，租用期间写入放行请求数、拦截请求数和响应字节数
+
+        用法:
+            async with pool.lease() as page:
+                await page.goto(...)
+        """
+        self._ensure_primitives()
+
+        async with self._semaphore:
+            slot = await self._acquire_slot()
+            self._stats["leases"] += 1
+            healthy = True
+            page = None
+
+            network = network_stats if network_stats is not None else {}
+            network.update(requests=0, blocked=0, bytes_received=0)
+            slot.network = network
+
+            def handle_response(response):
+                length = response.headers.get("content-length")
+                if length and length.isdigit():
+                    network["bytes_received"] += int(length)
+
+            try:
+                page = await slot.context.new_page()
+                page.on("response", handle_response)
+                yield page
+            except Exception:
+                healthy = False
+                raise
+            finally:
+                if page is not None:
+                    try:
+                        await page.close()
+                    except Exception:
+                        healthy = False
+                slot.network = {}
+                await self._release_slot(slot, healthy)
+
+    async def close(self):
+        """关闭所有上下文和浏览器"""
+        for slot in self._idle:
+            try:
+                await slot.context.close()
+            except Exception:
+                pass
+        self._idle.clear()
+
+        if self._browser is not None:
+            try:
+                await self._browser.close()
+            except Exception:
+                pass
+            self._browser = None
+
+        if self._playwright is not None:
+            await self._playwright.stop()
+            self._playwright = None
+
+    def stats(self) -> dict:
+        """返回浏览器池状态"""
+        return {
+            "size": self.size,
+            "max_uses": self.max_uses,
+            "idle_contexts": len(self._idle),
+            "browser_connected": self._browser_healthy(),
+            **self._stats,
+        }
+
+
+_POOL: Optional[BrowserPool] = None
+
+
+def get_browser_pool() -> BrowserPool:
+    """返回进程级共享的浏览器池（按 config.json 中的 bilibili 配置创建）"""
+    global _POOL
+
+    if _POOL is None:
+        cfg = load_config().get("bilibili", {})
+        defaults = DEFAULT_CONFIG["bilibili"]
+        _POOL = BrowserPool(
+            size=cfg.get("browser_pool_size", defaults["browser_pool_size"]),
+            max_uses=cfg.get("context_max_uses", defaults["context_max_uses"]),
+            headless=cfg.get("headless", defaults["headless"]),
+            blocker=ResourceBlocker(
+                blocked_resource_types=cfg.get("blocked_resource_types", defaults["blocked_resource_types"]),
+                blocked_domains=cfg.get("blocked_domains", defaults["blocked_domains"]),
+                allowed_domains=cfg.get("allowed_domains", defaults["allowed_domains"]),
+            ),
+        )
+        register_shutdown_hook(_POOL.close)
+
+    return _POOL
@@ -0,0 +1,277 @@
+"""
+内容寻址存储模块
+开启 storage.dedup 后，保存的文件按 sha256 在存储目录中只保留一份，用户看到的编号文件是指向它的硬链接；
+重复保存相同内容时不再写数据，只新建一个硬链接
+"""
+
+import errno
+import hashlib
+import os
+import shutil
+import threading
+import uuid
+from pathlib import Path
+from typing import Dict, Optional, Tuple, Union
+
+from config_loader import DEFAULT_CONFIG, load_config, resolve_path
+
+# 计算已有文件哈希时每次读取的字节数
+_HASH_CHUNK_SIZE = 1024 * 1024
+
+
+class ContentStore:
+    """
+    以 sha256 为键的去重存储
+
+    - 目录结构：<root>/<哈希前两位>/<哈希 3-4 位>/<哈希>
+    - 用户路径与存储中的数据是同一个文件（硬链接），两者删除其一不影响另一个；
+      不要原地修改保存出来的文件，否则会同时改掉存储中的数据
+    - 存储目录需要与输出目录在同一文件系统上；无法创建硬链接时照常保存，结果中 deduplicated 为 false
+    """
+
+    def __init__(self, root: Union[str, Path]):
+        self.root = resolve_path(str(root))
+        self._lock = threading.Lock()
+        self._stats = {
+            "stored": 0,
+            "deduplicated": 0,
+            "bytes_saved": 0,
+            "link_failures": 0,
+        }
+
+    def blob_path(self, digest: str) -> Path:
+        return self.root / digest[:2] / digest[2:4] / digest
+
+    def _count(self, name: str, amount: int = 1):
+        with self._lock:
+            self._stats[name] += amount
+
+    def _link_to(self, blob: Path, final_path: Path) -> bool:
+        """把 final_path 原子替换为 blob 的硬链接，失败返回 False"""
+        link_path = final_path.with_name(f".{final_path.name}.{uuid.uuid4().hex}.link")
+        try:
+            os.link(blob, link_path)
+            os.replace(link_path, final_path)
+        except OSError:
+            try:
+                link_path.unlink()
+            except OSError:
+                pass
+            return False
+        return True
+
+    def commit_file(self, temp_path: Union[str, Path], final_path: Union[str, Path], digest: str) -> bool:
+        """
+        把已写完的临时文件保存为 final_path
+
+        内容已存在时丢弃临时文件，final_path 链接到已有数据；否则临时文件登记到存储后重命名为 final_path。
+        临时文件不在 final_path 所在目录时（如系统临时目录）先移动过去，跨文件系统时退化为复制。
+
+        Returns:
+            是否去重（复用了已有数据）
+        """
+        temp_path = Path(temp_path)
+        final_path = Path(final_path)
+        blob = self.blob_path(digest)
+
+        if blob.exists() and self._link_to(blob, final_path):
+            size = blob.stat().st_size
+            temp_path.unlink()
+            self._count("deduplicated")
+            self._count("bytes_saved", size)
+            return True
+
+        staged = _stage_next_to(temp_path, final_path)
+        try:
+            try:
+                blob.parent.mkdir(parents=True, exist_ok=True)
+                os.link(staged, blob)
+                self._count("stored")
+            except FileExistsError:
+                # 并发保存了相同内容
+                if self._link_to(blob, final_path):
+                    size = blob.stat().st_size
+                    staged.unlink()
+                    self._count("deduplicated")
+                    self._count("bytes_saved", size)
+                    return True
+            except OSError:
+                self._count("link_failures")
+
+            os.replace(staged, final_path)
+            return False
+        finally:
+            if staged != temp_path and staged.exists():
+                staged.unlink()
+
+    def save_bytes(self, data: bytes, final_path: Union[str, Path], digest: Optional[str] = None) -> Tuple[str, bool]:
+        """
+        保存数据到 final_path
+
+        Returns:
+            (sha256, 是否去重)
+        """
+        final_path = Path(final_path)
+        digest = digest or hashlib.sha256(data).hexdigest()
+
+        blob = self.blob_path(digest)
+        if blob.exists() and self._link_to(blob, final_path):
+            self._count("deduplicated")
+            self._count("bytes_saved", len(data))
+            return digest, True
+
+        temp_path = final_path.with_name(f".{uuid.uuid4().hex}.part")
+        try:
+            with open(temp_path, "wb") as f:
+                f.write(data)
+            return digest, self.commit_file(temp_path, final_path, digest)
+        finally:
+            if temp_path.exists():
+                temp_path.unlink()
+
+    def ingest(self, path: Union[str, Path]) -> Tuple[str, bool]:
+        """
+        登记一个已经写好的文件（如由第三方 SDK 直接写入的音频）
+
+        Returns:
+            (sha256, 是否去重)
+        """
+        path = Path(path)
+        digest = hash_file(path)
+        return digest, self._ingest(path, digest)
+
+    def _ingest(self, path: Path, digest: str) -> bool:
+        """内容已存在时把 path 替换为已有数据的硬链接，否则把 path 登记到存储"""
+        blob = self.blob_path(digest)
+
+        if blob.exists():
+            if os.path.samefile(blob, path):
+                return False
+            size = path.stat().st_size
+            if self._link_to(blob, path):
+                self._count("deduplicated")
+                self._count("bytes_saved", size)
+                return True
+            return False
+
+        try:
+            blob.parent.mkdir(parents=True, exist_ok=True)
+            os.link(path, blob)
+            self._count("stored")
+        except FileExistsError:
+            return self._ingest(path, digest)
+        except OSError:
+            self._count("link_failures")
+        return False
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"root": str(self.root), **self._stats}
+
+
+def _stage_next_to(temp_path: Path, final_path: Path) -> Path:
+    """把临时文件移动到 final_path 所在目录（同一文件系统才能重命名和硬链接），返回新的临时文件路径"""
+    if temp_path.parent == final_path.parent:
+        return temp_path
+
+    staged = final_path.with_name(f".{uuid.uuid4().hex}.part")
+    try:
+        os.replace(temp_path, staged)
+    except OSError as e:
+        if e.errno != errno.EXDEV:
+            raise
+        shutil.move(str(temp_path), str(staged))
+    return staged
+
+
+def hash_file(path: Union[str, Path]) -> str:
+    """分块计算文件的 sha256"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(_HASH_CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+_stores: Dict[Path, ContentStore] = {}
+_stores_lock = threading.Lock()
+
+
+def get_content_store() -> Optional[ContentStore]:
+    """按配置返回进程级共享的去重存储，未开启 storage.dedup 时返回 None"""
+    cfg = load_config().get("storage", {})
+    defaults = DEFAULT_CONFIG["storage"]
+    if not cfg.get("dedup", defaults["dedup"]):
+        return None
+
+    root = resolve_path(str(cfg.get("dir", defaults["dir"])))
+    with _stores_lock:
+        store = _stores.get(root)
+        if store is None:
+            store = ContentStore(root)
+            _stores[root] = store
+    return store
+
+
+def content_store_stats() -> Optional[dict]:
+    """返回去重存储的统计，未开启时返回 None"""
+    store = get_content_store()
+    return store.stats() if store else None
+
+
+def save_bytes(data: bytes, final_path: Union[str, Path]) -> dict:
+    """
+    保存数据到 final_path，开启去重时经过内容寻址存储
+
+    Returns:
+        {"sha256": ..., "deduplicated": ...}；未开启去重时不计算哈希，sha256 为 None
+    """
+    store = get_content_store()
+    if store is not None:
+        digest, deduplicated = store.save_bytes(data, final_path)
+        return {"sha256": digest, "deduplicated": deduplicated}
+
+    # 先写同目录临时文件再替换，不原地截断目标文件：它可能是去重时创建的硬链接，与其他文件共享数据
+    final_path = Path(final_path)
+    temp_path = final_path.with_name(f".{uuid.uuid4().hex}.part")
+    try:
+        with open(temp_path, "wb") as f:
+            f.write(data)
+        os.replace(temp_path, final_path)
+    finally:
+        if temp_path.exists():
+            temp_path.unlink()
+    return {"sha256": None, "deduplicated": False}
+
+
+def commit_writer(writer, final_path: Union[str, Path]) -> dict:
+    """
+    提交 Base64FileWriter 写好的临时文件为 final_path（哈希已在写入时算好），开启去重时经过内容寻址存储
+
+    Returns:
+        {"sha256": ..., "deduplicated": ...}
+    """
+    store = get_content_store()
+    if store is None:
+        writer.commit(final_path)
+        return {"sha256": writer.sha256, "deduplicated": False}
+
+    writer.finish()
+    deduplicated = store.commit_file(writer.temp_path, final_path, writer.sha256)
+    writer.path = Path(final_path)
+    return {"sha256": writer.sha256, "deduplicated": deduplicated}
+
+
+def ingest_file(path: Union[str, Path]) -> dict:
+    """
+    登记一个已经写好的文件，开启去重时内容重复的文件被替换为存储中已有数据的硬链接
+
+    Returns:
+        {"sha256": ..., "deduplicated": ...}；未开启去重时不读取文件，sha256 为 None
+    """
+    store = get_content_store()
+    if store is None:
+        return {"sha256": None, "deduplicated": False}
+
+    digest, deduplicated = store.ingest(path)
+    return {"sha256": digest, "deduplicated": deduplicated}
@@ -0,0 +1,114 @@
+"""
+按序编号文件名分配模块
+为保存到目录的文件分配 1、2、3... 的编号：每个目录首次使用时扫描一次，之后只递增计数器；
+通过独占创建（O_EXCL）占用文件名，并发请求和多个进程都不会拿到同一个编号
+"""
+
+import os
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Optional, Union
+
+# 最多记住这么多个目录的计数器，超出时淘汰最久未使用的目录（之后再使用时重新扫描）
+MAX_TRACKED_DIRECTORIES = 1024
+
+
+def _max_numbered_stem(directory: Path) -> int:
+    """扫描目录，返回文件名（去掉扩展名）为纯数字的最大编号"""
+    highest = 0
+    try:
+        with os.scandir(directory) as entries:
+            for entry in entries:
+                stem = entry.name.split(".", 1)[0]
+                if stem.isdigit():
+                    highest = max(highest, int(stem))
+    except FileNotFoundError:
+        pass
+    return highest
+
+
+class _DirectoryState:
+    """一个目录的计数器：上次分配的编号、文件和目录的 inode"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counter: Optional[int] = None
+        self.last_path: Optional[Path] = None
+        self.inode: Optional[int] = None
+
+
+class SequentialFileAllocator:
+    """
+    按目录维护的编号计数器
+
+    - 计数器在目录首次使用时由扫描恢复为当前最大编号
+    - 上次分配的文件已不存在（目录被清空）或目录被删除重建（inode 变化）时重新扫描，编号从现有最大值继续
+    - 每次分配递增计数器并独占创建该文件；文件已存在（其他进程或外部写入）时继续递增
+    - 不同目录各自加锁，互不阻塞；最多记住 max_directories 个目录
+    """
+
+    def __init__(self, max_directories: int = MAX_TRACKED_DIRECTORIES):
+        self.max_directories = max(1, int(max_directories))
+        self._states: "OrderedDict[Path, _DirectoryState]" = OrderedDict()
+        self._states_lock = threading.Lock()
+
+    def _state_for(self, directory: Path) -> _DirectoryState:
+        with self._states_lock:
+            state = self._states.get(directory)
+            if state is None:
+                state = _DirectoryState()
+                self._states[directory] = state
+            self._states.move_to_end(directory)
+
+            # 淘汰最久未使用且当前没有在分配的目录；即使被淘汰的目录仍在使用，O_EXCL 也保证不会重复
+            excess = len(self._states) - self.max_directories
+            for key in list(self._states)[:max(0, excess)]:
+                if not self._states[key].lock.locked():
+                    del self._states[key]
+
+            return state
+
+    def allocate(self, directory: Union[str, Path], extension: str = "") -> Path:
+        """
+        在 directory 下独占创建下一个编号的空文件并返回其路径
+
+        调用方随后直接写入（或原子替换）该文件；放弃使用时应删除它。
+        """
+        directory = Path(directory).absolute()
+        directory.mkdir(parents=True, exist_ok=True)
+        suffix = f".{extension.lstrip('.')}" if extension else ""
+
+        state = self._state_for(directory)
+        with state.lock:
+            inode = os.stat(directory).st_ino
+            stale = (
+                state.counter is None
+                or state.inode != inode
+                or (state.last_path is not None and not state.last_path.exists())
+            )
+            counter = _max_numbered_stem(directory) if stale else state.counter
+
+            while True:
+                counter += 1
+                path = directory / f"{counter}{suffix}"
+                try:
+                    fd = os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY, 0o644)
+                except FileExistsError:
+                    continue
+                os.close(fd)
+                break
+
+            state.counter = counter
+            state.last_path = path
+            state.inode = inode
+
+        return path
+
+
+_ALLOCATOR = SequentialFileAllocator()
+
+
+def allocate_numbered_path(directory: Union[str, Path], extension: str = "") -> Path:
+    """使用进程级共享的分配器分配编号文件名（见 SequentialFileAllocator.allocate）"""
+    return _ALLOCATOR.allocate(directory, extension)
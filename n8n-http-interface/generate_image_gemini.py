@@ -4,274 +4,936 @@ Google Gemini 图像生成模块
 """
 
 import base64
+import binascii
+import json
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import contextmanager
 from pathlib import Path
-from typing import List, Optional, Union
+from typing import Callable, Iterator, List, Optional, Tuple, Union
 
 import requests
 
+from b64stream import Base64FileWriter
+from blob_cache import DiskLRUCache, hash_bytes, hash_json
 from config_loader import DEFAULT_CONFIG, load_config
+from http_client import get_session
+from image_preprocess import preprocess_inline_parts
+from content_store import commit_writer, save_bytes
+from file_allocator import allocate_numbered_path
+from image_sources import ImageSource
+from rate_limiter import KeyedRateLimiter
+from retry_policy import RETRYABLE_EXCEPTIONS, LatencyTracker, RetryPolicy
+from upstream_balancer import Upstream, UpstreamBalancer
+
+# 生成结果缓存模式：
+#   bypass  - 不读也不写缓存
+#   use     - 命中则直接返回，未命中时请求并写入缓存
+#   refresh - 忽略已有缓存，重新请求并覆盖写入
+CACHE_MODES = ("bypass", "use", "refresh")
+
+# 用于在原始响应字节中定位 inlineData.data，避免把整段 base64 解析成 Python 字符串
+_INLINE_DATA_PATTERN = re.compile(rb'"inlineData"\s*:\s*\{')
+_DATA_FIELD_PATTERN = re.compile(rb'"data"\s*:\s*"')
+
+_image_cache: Optional[DiskLRUCache] = None
+_image_cache_lock = threading.Lock()
+_step_store: Optional[DiskLRUCache] = None
+_step_store_lock = threading.Lock()
+_rate_limiter: Optional[KeyedRateLimiter] = None
+_rate_limiter_lock = threading.Lock()
+_balancer: Optional[UpstreamBalancer] = None
+_balancer_lock = threading.Lock()
+_latency_tracker: Optional[LatencyTracker] = None
+_latency_tracker_lock = threading.Lock()
+
+# 批量生成时每项可覆盖的参数
+BATCH_ITEM_FIELDS = (
+    "prompt", "save_path", "aspect_ratio", "added_prompt", "refine_prompts", "resume_from", "base_url", "model", "api_key",
+    "cache",
+)
 
 
 def _get_gemini_config() -> dict:
     return load_config().get("gemini", {})
 
 
-def _resolve_gemini_settings(
-    base_url: Optional[str],
-    model: Optional[str],
-    api_key: Optional[str],
-) -> tuple[str, str, str]:
-    cfg = _get_gemini_config()
-    resolved_base_url = base_url or cfg.get("base_url", DEFAULT_CONFIG["gemini"]["base_url"])
-    resolved_model = model or cfg.get("model", DEFAULT_CONFIG["gemini"]["model"])
-    resolved_api_key = api_key or cfg.get("api_key", DEFAULT_CONFIG["gemini"]["api_key"])
-    return resolved_base_url, resolved_model, resolved_api_key
+def _gemini_config_value(key: str):
+    return _get_gemini_config().get(key, DEFAULT_CONFIG["gemini"][key])
 
 
-def generate_image_gemini_core(
-    prompt: str,
-    save_path: str,
-    aspect_ratio: Optional[str] = None,
-    added_prompt: Optional[str] = None,
-    base_url: Optional[str] = None,
-    model: Optional[str] = None,
-    api_key: Optional[str] = None,
+def _get_gemini_session() -> requests.Session:
+    """进程级共享的 Gemini 会话（keep-alive 连接池，线程安全）"""
+    return get_session(
+        "gemini",
+        pool_connections=_gemini_config_value("pool_connections"),
+        pool_maxsize=_gemini_config_value("pool_maxsize"),
+    )
+
+
+def _get_rate_limiter() -> KeyedRateLimiter:
+    """按 API Key 限流的共享调度器（每分钟请求数 + 在途请求数）"""
+    global _rate_limiter
+
+    with _rate_limiter_lock:
+        if _rate_limiter is None:
+            _rate_limiter = KeyedRateLimiter(
+                requests_per_minute=_gemini_config_value("requests_per_minute"),
+                max_in_flight=_gemini_config_value("max_in_flight"),
+            )
+
+    return _rate_limiter
+
+
+def _get_balancer() -> Optional[UpstreamBalancer]:
+    """
+    共享的上游负载均衡器
+
+    config.json 中配置了 gemini.upstreams 时在这些上游之间分配请求，否则只使用 base_url + api_key；
+    两者都没有配置时返回 None
+    """
+    global _balancer
+
+    with _balancer_lock:
+        if _balancer is None:
+            entries = _gemini_config_value("upstreams") or [{
+                "base_url": _gemini_config_value("base_url"),
+                "api_key": _gemini_config_value("api_key"),
+            }]
+            if not any(entry.get("base_url") for entry in entries):
+                return None
+            _balancer = UpstreamBalancer.from_config(
+                entries,
+                policy=_gemini_config_value("balance_policy"),
+                eject_seconds=_gemini_config_value("eject_seconds"),
+                requests_per_minute=_gemini_config_value("requests_per_minute"),
+            )
+
+    return _balancer
+
+
+def _get_latency_tracker() -> LatencyTracker:
+    """各上游最近成功请求的耗时（用于计算对冲阈值），所有 Gemini 请求共用"""
+    global _latency_tracker
+
+    with _latency_tracker_lock:
+        if _latency_tracker is None:
+            cfg = _gemini_config_value("retry")
+            _latency_tracker = LatencyTracker(cfg.get("hedge_window", DEFAULT_CONFIG["gemini"]["retry"]["hedge_window"]))
+
+    return _latency_tracker
+
+
+def upstream_stats() -> dict:
+    """返回各上游的负载与错误统计，以及各上游最近成功请求的耗时分位数"""
+    balancer = _get_balancer()
+    if balancer is None:
+        stats = {"policy": _gemini_config_value("balance_policy"), "upstreams": []}
+    else:
+        stats = balancer.stats()
+    stats["latency"] = _get_latency_tracker().stats()
+    return stats
+
+
+def _missing_upstream_error(upstream: Optional[Upstream], balancer: Optional[UpstreamBalancer]) -> Optional[str]:
+    """请求没有可用上游时返回错误信息"""
+    if upstream is not None:
+        return None if upstream.base_url else "未指定 Gemini 上游地址：请求中传入 base_url，或在 config.json 中配置 gemini.base_url"
+    if balancer is None:
+        return "未配置 Gemini 上游：请在 config.json 中配置 gemini.base_url 或 gemini.upstreams，或在请求中传入 base_url"
+    return None
+
+
+@contextmanager
+def _track_upstream(balancer: Optional[UpstreamBalancer], target: Upstream):
+    """通过负载均衡器记录请求；请求显式指定的上游不参与负载均衡，也不计入统计"""
+    if balancer is None:
+        yield lambda status: None
+        return
+
+    with balancer.track(target) as record:
+        yield record
+
+
+def _resolve_upstream_override(base_url: Optional[str], api_key: Optional[str]) -> Optional[Upstream]:
+    """请求显式传入 base_url / api_key 时固定使用该上游，不参与负载均衡"""
+    if not base_url and not api_key:
+        return None
+    return Upstream(
+        base_url or _gemini_config_value("base_url"),
+        api_key or _gemini_config_value("api_key"),
+    )
+
+
+def rate_limit_stats() -> dict:
+    """返回各 API Key 的限流统计"""
+    return _get_rate_limiter().stats()
+
+
+def _get_image_cache() -> DiskLRUCache:
+    """进程级共享的图像生成结果缓存"""
+    global _image_cache
+
+    with _image_cache_lock:
+        if _image_cache is None:
+            cfg = _gemini_config_value("cache")
+            defaults = DEFAULT_CONFIG["gemini"]["cache"]
+            _image_cache = DiskLRUCache(
+                cfg.get("dir", defaults["dir"]),
+                max_bytes=cfg.get("max_bytes", defaults["max_bytes"]),
+            )
+
+    return _image_cache
+
+
+def _get_step_store() -> DiskLRUCache:
+    """进程级共享的多步流水线中间图片存储，按图片内容哈希保存，与结果缓存模式无关"""
+    global _step_store
+
+    with _step_store_lock:
+        if _step_store is None:
+            cfg = _gemini_config_value("pipeline")
+            defaults = DEFAULT_CONFIG["gemini"]["pipeline"]
+            _step_store = DiskLRUCache(
+                cfg.get("dir", defaults["dir"]),
+                max_bytes=cfg.get("max_bytes", defaults["max_bytes"]),
+            )
+
+    return _step_store
+
+
+def image_cache_stats() -> dict:
+    """返回图像生成结果缓存的统计"""
+    return _get_image_cache().stats()
+
+
+def _resolve_cache_mode(cache: Optional[str]) -> str:
+    if cache is None:
+        cache = _gemini_config_value("cache").get("default_mode", DEFAULT_CONFIG["gemini"]["cache"]["default_mode"])
+    return str(cache).lower()
+
+
+def _digest_inline_data(value):
+    """把请求体中的内联图像数据替换为其哈希，得到体积很小且等价的缓存键材料"""
+    if isinstance(value, dict):
+        digested = {}
+        for key, item in value.items():
+            if key == "inlineData" and isinstance(item, dict) and "data" in item:
+                item = {**item, "data": f"sha256:{hash_bytes(item['data'])}"}
+            digested[key] = _digest_inline_data(item)
+        return digested
+    if isinstance(value, list):
+        return [_digest_inline_data(item) for item in value]
+    return value
+
+
+def _encode_bytes(value):
+    if isinstance(value, (bytes, bytearray)):
+        return base64.b64encode(value).decode("ascii")
+    raise TypeError(f"无法序列化的类型: {type(value).__name__}")
+
+
+def _encode_request_body(request_body: dict) -> bytes:
+    """序列化请求体：以原始字节保存的内联图像在这里编码为 Base64（每张图片只编码一次），其余 base64 数据是纯 ASCII，直接拼入 JSON"""
+    return json.dumps(request_body, separators=(",", ":"), default=_encode_bytes).encode("ascii")
+
+
+def _request_cache_key(model: str, request_body: dict) -> str:
+    return hash_json({"model": model, "body": _digest_inline_data(request_body)})
+
+
+def _request_image(
+    request_body: dict,
+    model: str,
+    cache_mode: str = "bypass",
+    error_prefix: str = "",
+    upstream: Optional[Upstream] = None,
 ) -> dict:
     """
-    使用 Gemini 生成图片（核心函数）
+    发送一次 generateContent 请求并提取图像（按 cache_mode 读写结果缓存）
 
-    Args:
-        prompt: 用于生成图像的提示词
-        save_path: 图片保存路径
-        aspect_ratio: 图片宽高比（可选），如 "16:9", "1:1", "9:16" 等
-        added_prompt: 附加提示词（可选）。如果提供，将先用 prompt 生成图片，再用生成的图片 + added_prompt 生成最终图片
-        base_url: API 基础地址（可选，不传则读取 config.json）
-        model: 模型名称（可选，不传则读取 config.json）
-        api_key: API 密钥（可选，不传则读取 config.json）
+    Returns:
+        成功时: {"success": True, "image_bytes": 图像字节, "mime_type", "text": 生成的文本, "cache_hit": 是否命中缓存}
+        失败时: 包含 error 的结果字典
+    """
+    cache_key = None
+    if cache_mode != "bypass":
+        cache_key = _request_cache_key(model, request_body)
+
+    if cache_mode == "use":
+        cached = _get_image_cache().get(cache_key)
+        if cached is not None:
+            image_bytes, meta = cached
+            return {
+                "success": True,
+                "image_bytes": image_bytes,
+                "mime_type": meta.get("mime_type", "image/png"),
+                "text": meta.get("text"),
+                "cache_hit": True,
+                "upstream": None,
+            }
+
+    generated = _call_generate_content(request_body, model, error_prefix, upstream)
+
+    if cache_key and generated["success"]:
+        _get_image_cache().put(
+            cache_key,
+            generated["image_bytes"],
+            {"text": generated["text"], "model": model, "mime_type": generated["mime_type"]},
+        )
+
+    generated["cache_hit"] = False
+    return generated
+
+
+def _split_inline_data(raw: bytes) -> Tuple[bytes, Optional[Tuple[int, int]]]:
+    """
+    把响应中所有 inlineData.data 的内容替换为空字符串
 
     Returns:
-        包含操作结果的字典
+        (去掉图像数据后的响应字节, 最后一段图像 base64 在 raw 中的 (起, 止) 位置)
     """
-    try:
-        resolved_base_url, resolved_model, resolved_api_key = _resolve_gemini_settings(base_url, model, api_key)
+    pieces = []
+    span = None
+    pos = 0
 
-        # 构建完整的 API 端点
-        endpoint = f"{resolved_base_url.rstrip('/')}/v1beta/models/{resolved_model}:generateContent"
+    for match in _INLINE_DATA_PATTERN.finditer(raw):
+        if match.start() < pos:
+            continue
 
-        # 设置请求头
+        # data 字段必须位于当前 inlineData 对象内（base64 和 mimeType 中都不会出现 "}"）
+        object_end = raw.find(b"}", match.end())
+        field = _DATA_FIELD_PATTERN.search(raw, match.end(), object_end if object_end >= 0 else len(raw))
+        if field is None:
+            continue
+
+        value_end = raw.find(b'"', field.end())
+        if value_end < 0:
+            break
+
+        pieces.append(raw[pos:field.end()])
+        span = (field.end(), value_end)
+        pos = value_end
+
+    pieces.append(raw[pos:])
+    return b"".join(pieces), span
+
+
+def _parse_generate_content(raw: bytes) -> Tuple[dict, Optional[bytes]]:
+    """
+    解析 generateContent 响应，返回 (去掉图像数据的响应字典, 图像字节)
+
+    图像的 base64 直接从原始响应字节解码，不会在 JSON 树中保留一份完整的 base64 字符串；
+    JSON 中可能出现的 "\\/" 转义由 a2b_base64 忽略非字母表字符处理。
+    """
+    skeleton, span = _split_inline_data(raw)
+    response_data = json.loads(skeleton)
+
+    image_bytes = None
+    if span is not None:
+        image_bytes = binascii.a2b_base64(memoryview(raw)[span[0]:span[1]])
+
+    return response_data, image_bytes
+
+
+class _StreamingResponseParser:
+    """
+    增量解析 streamGenerateContent（alt=sse）的响应字节流
+
+    普通 JSON 累积在缓冲区中，遇到 inlineData.data 时把后续的 base64 直接交给 open_sink() 返回的写入器，
+    缓冲区里只留下空字符串；每个 SSE 事件结束时解析为字典。内存占用与图片大小无关。
+    """
+
+    # 向前多保留的字节数，保证跨块的 "inlineData": { ... "data": " 也能匹配
+    _OVERLAP = 64
+
+    def __init__(self, open_sink: Callable[[], Base64FileWriter]):
+        self._open_sink = open_sink
+        self._buffer = bytearray()
+        self._scan_from = 0
+        self.sink: Optional[Base64FileWriter] = None
+        self.sinks: List[Base64FileWriter] = []
+
+    def _find_image_start(self) -> Optional[int]:
+        """返回缓冲区中 base64 数据开始的位置，尚未出现时返回 None"""
+        pos = self._scan_from
+        while True:
+            match = _INLINE_DATA_PATTERN.search(self._buffer, pos)
+            if match is None:
+                self._scan_from = max(pos, len(self._buffer) - self._OVERLAP)
+                return None
+
+            object_end = self._buffer.find(b"}", match.end())
+            field = _DATA_FIELD_PATTERN.search(
+                self._buffer, match.end(), object_end if object_end >= 0 else len(self._buffer)
+            )
+            if field is not None:
+                return field.end()
+            if object_end < 0:
+                # data 字段可能还在后面的数据块里
+                self._scan_from = match.start()
+                return None
+            pos = object_end
+
+    def _find_event_end(self) -> Optional[Tuple[int, int]]:
+        ends = [(self._buffer.find(sep), len(sep)) for sep in (b"\n\n", b"\r\n\r\n")]
+        ends = [end for end in ends if end[0] >= 0]
+        return min(ends) if ends else None
+
+    def _pop_event(self, end: int, separator: int) -> Optional[dict]:
+        raw = bytes(self._buffer[:end])
+        del self._buffer[:end + separator]
+        self._scan_from = 0
+
+        payload = b"\n".join(
+            line[5:].strip() for line in raw.splitlines() if line.startswith(b"data:")
+        )
+        return json.loads(payload) if payload else None
+
+    def _drain(self, events: List[dict]) -> bytes:
+        """取出缓冲区中完整的事件；遇到图像数据时切换到写入器，返回缓冲区中属于图像的部分"""
+        while True:
+            image_start = self._find_image_start()
+            event_end = self._find_event_end()
+
+            if event_end is not None and (image_start is None or event_end[0] < image_start):
+                event = self._pop_event(*event_end)
+                if event is not None:
+                    events.append(event)
+                continue
+
+            if image_start is None:
+                return b""
+
+            # 缓冲区中 base64 开始之后的部分转交给写入器
+            rest = bytes(self._buffer[image_start:])
+            del self._buffer[image_start:]
+            self._scan_from = len(self._buffer)
+            self.sink = self._open_sink()
+            self.sinks.append(self.sink)
+            return rest
+
+    def feed(self, chunk: bytes) -> List[dict]:
+        """处理一块响应数据，返回其中完整的事件"""
+        events = []
+
+        while chunk:
+            if self.sink is not None:
+                end = chunk.find(b'"')
+                if end < 0:
+                    self.sink.feed(chunk)
+                    break
+                self.sink.feed(chunk[:end])
+                self.sink = None
+                chunk = chunk[end:]
+                continue
+
+            self._buffer += chunk
+            chunk = self._drain(events)
+
+        return events
+
+    def close(self) -> List[dict]:
+        """响应结束时处理缓冲区中剩余的最后一个事件"""
+        events = []
+        self._buffer += b"\n\n"
+        if self.sink is not None or self._drain(events):
+            raise ValueError("响应在图像数据中途结束")
+        return events
+
+
+def _call_generate_content(
+    request_body: dict,
+    model: str,
+    error_prefix: str = "",
+    upstream: Optional[Upstream] = None,
+) -> dict:
+    """
+    发送一次 generateContent 请求并提取图像
+
+    未指定 upstream 时每次尝试（含重试和对冲）都由负载均衡器重新选择上游，
+    返回 429 的上游会被暂时摘除，重试自然落到其他上游上。
+
+    Returns:
+        成功时: {"success": True, "image_bytes": 图像字节, "mime_type", "text": 生成的文本}
+        失败时: 包含 error 的结果字典
+    """
+    policy = RetryPolicy.from_config(_gemini_config_value("retry"), latency=_get_latency_tracker())
+    connect_timeout = _gemini_config_value("connect_timeout")
+    read_timeout = _gemini_config_value("read_timeout")
+
+    balancer = None if upstream is not None else _get_balancer()
+    missing = _missing_upstream_error(upstream, balancer)
+    if missing:
+        return {
+            "success": False,
+            "error": f"{error_prefix}{missing}",
+        }
+
+    # 请求体只序列化一次，重试和对冲复用同一份字节
+    payload = _encode_request_body(request_body)
+
+    def pick() -> Upstream:
+        return upstream or balancer.pick()
+
+    def send(remaining: float, target: Upstream) -> requests.Response:
         headers = {
-            "x-goog-api-key": resolved_api_key,
+            "x-goog-api-key": target.api_key,
             "Content-Type": "application/json",
         }
 
-        # ========== 第一步：使用 prompt 生成初始图片 ==========
-        request_body_step1 = {
-            "contents": [{"parts": [{"text": prompt}]}]
+        # 先进入 track，保证 pick 占用的在途名额一定被释放；再按 API Key 排队，保证不超过上游配额
+        with _track_upstream(balancer, target) as record, _get_rate_limiter().acquire(target.api_key):
+            response = _get_gemini_session().post(
+                f"{target.base_url}/v1beta/models/{model}:generateContent",
+                data=payload,
+                headers=headers,
+                timeout=(connect_timeout, max(1.0, min(read_timeout, remaining))),
+            )
+            record(response.status_code)
+
+        response.upstream_name = target.name
+        return response
+
+    try:
+        response, upstream_meta = policy.execute(send, pick)
+        upstream_meta["served_by"] = response.upstream_name
+    except RETRYABLE_EXCEPTIONS as e:
+        is_timeout = isinstance(e, requests.exceptions.Timeout)
+        return {
+            "success": False,
+            "error": f"{error_prefix}请求超时，图像生成时间过长" if is_timeout else f"{error_prefix}网络请求失败: {str(e)}",
+            "upstream": getattr(e, "retry_meta", None),
         }
 
-        # 如果指定了宽高比，添加到配置项
-        if aspect_ratio:
-            request_body_step1["generationConfig"] = {
-                "imageConfig": {
-                    "aspectRatio": aspect_ratio
-                }
-            }
+    # 检查响应状态
+    if response.status_code != 200:
+        return {
+            "success": False,
+            "error": f"{error_prefix}API 请求失败: HTTP {response.status_code}",
+            "details": response.text,
+            "upstream": upstream_meta,
+        }
 
-        # 发送第一次请求
-        response_step1 = requests.post(
-            endpoint,
-            json=request_body_step1,
-            headers=headers,
-            timeout=120,
-        )
+    # 解析响应（图像数据直接从原始字节解码）
+    response_data, image_bytes = _parse_generate_content(response.content)
+    response.close()
 
-        # 检查第一次响应状态
-        if response_step1.status_code != 200:
-            return {
-                "success": False,
-                "error": f"第一步 API 请求失败: HTTP {response_step1.status_code}",
-                "details": response_step1.text,
-            }
+    # 提取生成的图像数据
+    if "candidates" not in response_data or len(response_data["candidates"]) == 0:
+        return {
+            "success": False,
+            "error": f"{error_prefix}API 响应中没有找到生成的图像",
+            "response": response_data,
+            "upstream": upstream_meta,
+        }
 
-        # 解析第一次响应
-        response_data_step1 = response_step1.json()
+    candidate = response_data["candidates"][0]
+    if "content" not in candidate or "parts" not in candidate["content"]:
+        return {
+            "success": False,
+            "error": f"{error_prefix}API 响应格式不正确",
+            "response": response_data,
+            "upstream": upstream_meta,
+        }
 
-        # 提取第一次生成的图像数据
-        if "candidates" not in response_data_step1 or len(response_data_step1["candidates"]) == 0:
-            return {
-                "success": False,
-                "error": "第一步：API 响应中没有找到生成的图像",
-                "response": response_data_step1,
-            }
+    # 查找生成的图像数据
+    mime_type = "image/png"
+    generated_text = None
 
-        candidate_step1 = response_data_step1["candidates"][0]
-        if "content" not in candidate_step1 or "parts" not in candidate_step1["content"]:
-            return {
-                "success": False,
-                "error": "第一步：API 响应格式不正确",
-                "response": response_data_step1,
+    for part in candidate["content"]["parts"]:
+        if "inlineData" in part and "data" in part["inlineData"]:
+            mime_type = part["inlineData"].get("mimeType", mime_type)
+        elif "text" in part:
+            generated_text = part["text"]
+
+    if not image_bytes:
+        return {
+            "success": False,
+            "error": f"{error_prefix}未找到图像数据",
+            "text": generated_text,
+            "response": response_data,
+            "upstream": upstream_meta,
+        }
+
+    return {
+        "success": True,
+        "image_bytes": image_bytes,
+        "mime_type": mime_type,
+        "text": generated_text,
+        "upstream": upstream_meta,
+    }
+
+
+def _build_request_body(parts: list, aspect_ratio: Optional[str]) -> dict:
+    request_body = {
+        "contents": [{
+            "parts": parts
+        }]
+    }
+
+    # 如果指定了宽高比，添加到配置项
+    if aspect_ratio:
+        request_body["generationConfig"] = {
+            "imageConfig": {
+                "aspectRatio": aspect_ratio
             }
+        }
 
-        # 查找第一次生成的图像数据
-        image_data_step1 = None
-        generated_text_step1 = None
+    return request_body
 
-        for part in candidate_step1["content"]["parts"]:
-            if "inlineData" in part and "data" in part["inlineData"]:
-                image_data_step1 = part["inlineData"]["data"]
-            elif "text" in part:
-                generated_text_step1 = part["text"]
 
-        if not image_data_step1:
-            return {
-                "success": False,
-                "error": "第一步：未找到图像数据",
-                "text": generated_text_step1,
-                "response": response_data_step1,
-            }
+def _load_resume_point(resume_from, step_prompts: List[str], aspect_ratio: Optional[str], model: str) -> dict:
+    """
+    从中间图片存储取回 resume_from 指向的图片及其之前已完成的步骤
 
-        # ========== 第二步：如果有 added_prompt，使用图片 + 文本生成最终图片 ==========
-        final_image_data = image_data_step1
-        final_generated_text = generated_text_step1
+    Returns:
+        {"success": True, "steps": [已完成步骤的摘要], "previous": 最后完成的一步的生成结果}，失败时包含 error
+    """
+    if not isinstance(resume_from, dict) or not resume_from.get("image_sha256"):
+        return {"success": False, "error": "resume_from 参数必须是包含 image_sha256 的对象"}
+
+    cached = _get_step_store().get(str(resume_from["image_sha256"]))
+    if cached is None:
+        return {"success": False, "error": "resume_from 指向的中间图片不存在或已被淘汰，请重新生成"}
+
+    image_bytes, meta = cached
+    # 相同内容的图片只存一份，元数据记录的是最近一次保存它时的步骤，按 step 截取到该图片为止
+    steps = meta.get("steps") or []
+    resume_step = resume_from.get("step", len(steps))
+    if (
+        not isinstance(resume_step, int)
+        or not 1 <= resume_step <= len(steps)
+        or resume_step >= len(step_prompts)
+        or steps[resume_step - 1].get("image_sha256") != resume_from["image_sha256"]
+        or [step["prompt"] for step in steps[:resume_step]] != step_prompts[:resume_step]
+        or meta.get("model") != model
+        or meta.get("aspect_ratio") != aspect_ratio
+    ):
+        return {"success": False, "error": "resume_from 与本次请求的提示词、模型或宽高比不一致"}
+    steps = steps[:resume_step]
+
+    previous = {
+        "image_bytes": image_bytes,
+        "mime_type": meta.get("mime_type", "image/png"),
+        "text": steps[-1].get("text"),
+        "cache_hit": steps[-1].get("cache_hit", False),
+        "upstream": steps[-1].get("upstream"),
+    }
+    return {"success": True, "steps": [{**step, "resumed": True} for step in steps], "previous": previous}
+
+
+def _run_refinement_pipeline(
+    prompt: str,
+    refine_prompts: List[str],
+    aspect_ratio: Optional[str],
+    model: str,
+    cache_mode: str,
+    upstream: Optional[Upstream],
+    resume_from: Optional[dict] = None,
+) -> dict:
+    """
+    多步精修流水线：第 1 步用 prompt 生成图片，之后每一步用上一步的图片 + 对应的精修提示词生成新图片
 
-        if added_prompt:
-            # 构建第二次请求体：图片 + 附加提示词
-            request_body_step2 = {
-                "contents": [{
-                    "parts": [
-                        {
-                            "inlineData": {
-                                "mimeType": "image/png",
-                                "data": image_data_step1,
-                            }
-                        },
-                        {"text": added_prompt},
-                    ]
-                }]
-            }
+    - 每一步都按调用方的 cache_mode 读写结果缓存，每一步的缓存键包含上一步图片的哈希
+    - 无论 cache_mode 如何，每个中间步骤的图片都按内容哈希保存到中间图片存储（gemini.pipeline）
+    - 某一步失败时返回 resume_from（最后完成的步骤及其图片哈希）；用相同参数加上 resume_from 重试，
+      会从存储中取回该图片，从失败的那一步继续，不会重复付费
 
-            # 如果指定了宽高比，添加到配置项
-            if aspect_ratio:
-                request_body_step2["generationConfig"] = {
-                    "imageConfig": {
-                        "aspectRatio": aspect_ratio
+    Returns:
+        {"success", "steps": [每一步的摘要], "final": 最后一步的生成结果}；
+        失败时附带 error、completed_steps、steps、resumable 和 resume_from
+    """
+    step_prompts = [prompt, *refine_prompts]
+
+    steps = []
+    previous = None
+
+    if resume_from is not None:
+        resumed = _load_resume_point(resume_from, step_prompts, aspect_ratio, model)
+        if not resumed["success"]:
+            return resumed
+        steps, previous = resumed["steps"], resumed["previous"]
+
+    for number, step_prompt in enumerate(step_prompts[len(steps):], start=len(steps) + 1):
+        if previous is None:
+            parts = [{"text": step_prompt}]
+        else:
+            parts = [
+                {
+                    "inlineData": {
+                        "mimeType": previous["mime_type"],
+                        "data": previous["image_bytes"],
                     }
-                }
+                },
+                {"text": step_prompt},
+            ]
+
+        generated = _request_image(
+            _build_request_body(parts, aspect_ratio),
+            model,
+            cache_mode,
+            f"第 {number} 步：" if len(step_prompts) > 1 else "",
+            upstream,
+        )
 
-            # 发送第二次请求
-            response_step2 = requests.post(
-                endpoint,
-                json=request_body_step2,
-                headers=headers,
-                timeout=120,
+        if not generated["success"]:
+            if len(step_prompts) > 1:
+                generated["completed_steps"] = len(steps)
+                generated["steps"] = steps
+                # 已完成步骤的图片都在中间图片存储里，带上 resume_from 重试即可从失败的一步继续
+                generated["resumable"] = bool(steps)
+                if steps:
+                    generated["resume_from"] = {"step": len(steps), "image_sha256": steps[-1]["image_sha256"]}
+            return generated
+
+        step = {
+            "step": number,
+            "prompt": step_prompt,
+            "text": generated["text"],
+            "cache_hit": generated["cache_hit"],
+            "image_sha256": hash_bytes(generated["image_bytes"]),
+            "upstream": generated["upstream"],
+        }
+        steps.append(step)
+        previous = generated
+
+        # 保存中间步骤的图片（最终图片由调用方保存），失败时可以从这里继续
+        if number < len(step_prompts):
+            image_path = _get_step_store().put(
+                step["image_sha256"],
+                generated["image_bytes"],
+                {"mime_type": generated["mime_type"], "model": model, "aspect_ratio": aspect_ratio, "steps": steps},
             )
+            step["image_path"] = str(image_path) if image_path else None
+
+    return {
+        "success": True,
+        "steps": steps,
+        "final": previous,
+    }
+
+
+def _build_image_parts(images: List[Union[str, dict, ImageSource]]) -> Tuple[list, Optional[str]]:
+    """把输入图片转换为请求体的 parts，返回 (parts, 错误信息)"""
+    parts = []
+
+    # 添加所有图片到 parts
+    for idx, image in enumerate(images):
+        if isinstance(image, str):
+            # 如果是字符串，默认为 base64 数据，MIME 类型为 image/png
+            inline_data = {"mimeType": "image/png", "data": image}
+        elif isinstance(image, dict) and ("path" in image or "url" in image):
+            # 本地文件或 URL，此时才读取并编码
+            if "path" in image:
+                image = ImageSource.from_path(image["path"], image.get("mime_type"))
+            else:
+                image = ImageSource.from_url(image["url"], image.get("mime_type"))
+            inline_data = None
+        elif isinstance(image, dict):
+            # 如果是字典，提取数据和 MIME 类型
+            if not image.get("data"):
+                return [], f"第 {idx + 1} 张图片缺少 data 字段"
+            inline_data = {"mimeType": image.get("mime_type", "image/png"), "data": image["data"]}
+        elif not isinstance(image, ImageSource):
+            return [], f"第 {idx + 1} 张图片格式不正确"
 
-            # 检查第二次响应状态
-            if response_step2.status_code != 200:
-                return {
-                    "success": False,
-                    "error": f"第二步 API 请求失败: HTTP {response_step2.status_code}",
-                    "details": response_step2.text,
-                    "step1_completed": True,
-                }
+        if isinstance(image, ImageSource):
+            try:
+                inline_data = image.to_inline_data()
+            except (OSError, ValueError, requests.exceptions.RequestException) as e:
+                return [], f"第 {idx + 1} 张图片读取失败: {str(e)}"
 
-            # 解析第二次响应
-            response_data_step2 = response_step2.json()
+        # 添加图片到 parts
+        parts.append({"inlineData": inline_data})
 
-            # 提取第二次生成的图像数据
-            if "candidates" not in response_data_step2 or len(response_data_step2["candidates"]) == 0:
-                return {
-                    "success": False,
-                    "error": "第二步：API 响应中没有找到生成的图像",
-                    "response": response_data_step2,
-                    "step1_completed": True,
-                }
+    return parts, None
 
-            candidate_step2 = response_data_step2["candidates"][0]
-            if "content" not in candidate_step2 or "parts" not in candidate_step2["content"]:
-                return {
-                    "success": False,
-                    "error": "第二步：API 响应格式不正确",
-                    "response": response_data_step2,
-                    "step1_completed": True,
-                }
 
-            # 查找第二次生成的图像数据
-            image_data_step2 = None
-            generated_text_step2 = None
+def _preprocess_parts(parts: list, preprocess: Optional[Union[bool, dict]]) -> Tuple[list, Optional[dict]]:
+    """
+    按需预处理输入图片
+
+    preprocess 为 None 时读取 config.json 中的 gemini.preprocess.enabled；为字典时覆盖配置中的参数
 
-            for part in candidate_step2["content"]["parts"]:
-                if "inlineData" in part and "data" in part["inlineData"]:
-                    image_data_step2 = part["inlineData"]["data"]
-                elif "text" in part:
-                    generated_text_step2 = part["text"]
+    Returns:
+        (parts, 预处理统计)；未启用预处理时统计为 None
+    """
+    cfg = {**DEFAULT_CONFIG["gemini"]["preprocess"], **_gemini_config_value("preprocess")}
+    if isinstance(preprocess, dict):
+        cfg.update(preprocess)
+        preprocess = True
+    if preprocess is None:
+        preprocess = cfg["enabled"]
+    if not preprocess:
+        return parts, None
+
+    return preprocess_inline_parts(
+        parts,
+        max_edge=cfg["max_edge"],
+        output_format=cfg["format"],
+        quality=cfg["quality"],
+        max_workers=cfg["max_workers"],
+        recent_entries=cfg["recent_entries"],
+        recent_max_bytes=cfg["recent_max_bytes"],
+    )
+
+
+def _numbered_save_dir(save_path: Path) -> Optional[Path]:
+    """save_path 是目录或没有扩展名时返回自动编号所在的目录，否则返回 None"""
+    if save_path.is_dir() or not save_path.suffix or str(save_path).endswith(('/', '\\')):
+        return save_path if not save_path.is_file() else save_path.parent
+    return None
+
+
+def _resolve_save_path(save_path: str) -> Path:
+    """
+    确定图片的保存文件并创建所在目录
 
-            if not image_data_step2:
-                return {
-                    "success": False,
-                    "error": "第二步：未找到图像数据",
-                    "text": generated_text_step2,
-                    "response": response_data_step2,
-                    "step1_completed": True,
-                }
+    save_path 是目录或没有扩展名时，由编号分配器在该目录下独占创建下一个 <N>.png；否则保存到指定文件
+    """
+    # 处理保存路径
+    save_path = Path(save_path)
 
-            # 使用第二次生成的图像作为最终结果
-            final_image_data = image_data_step2
-            final_generated_text = generated_text_step2
+    # 如果路径是目录或没有扩展名，自动分配按序编号的文件名
+    target_dir = _numbered_save_dir(save_path)
+    if target_dir is not None:
+        return allocate_numbered_path(target_dir, "png")
 
-        # ========== 保存最终图片 ==========
-        image_bytes = base64.b64decode(final_image_data)
+    # 创建目标目录（如果不存在）
+    save_path.parent.mkdir(parents=True, exist_ok=True)
+
+    return save_path
 
-        # 处理保存路径
-        save_path = Path(save_path)
 
-        # 如果路径是目录或没有扩展名，自动生成按序编号的文件名
-        if save_path.is_dir() or not save_path.suffix or str(save_path).endswith(('/', '\\')):
-            # 确定目标目录
-            target_dir = save_path if not save_path.is_file() else save_path.parent
+def _save_image(image_bytes: bytes, save_path: str) -> Tuple[Path, dict]:
+    """
+    保存生成的图片（开启去重时相同内容只存一份）
 
-            # 创建目录（如果不存在）
-            target_dir.mkdir(parents=True, exist_ok=True)
+    Returns:
+        (实际保存的文件路径, {"sha256": ..., "deduplicated": ...})
+    """
+    save_path = _resolve_save_path(save_path)
 
-            # 获取目录中已有的 .png 文件数量
-            existing_files = list(target_dir.glob("*.png"))
-            file_count = len(existing_files)
+    # 保存图像
+    stored = save_bytes(image_bytes, save_path)
 
-            # 生成新的编号（从1开始）
-            next_number = file_count + 1
+    return save_path, stored
 
-            # 生成新的文件名：编号.png
-            save_path = target_dir / f"{next_number}.png"
-        else:
-            # 如果是完整的文件路径，确保有 .png 扩展名
-            if not save_path.suffix:
-                save_path = save_path.with_suffix(".png")
 
-            # 创建目标目录（如果不存在）
-            save_path.parent.mkdir(parents=True, exist_ok=True)
+def generate_image_gemini_core(
+    prompt: str,
+    save_path: Optional[str],
+    aspect_ratio: Optional[str] = None,
+    added_prompt: Optional[str] = None,
+    base_url: Optional[str] = None,
+    model: Optional[str] = None,
+    api_key: Optional[str] = None,
+    cache: Optional[str] = None,
+    refine_prompts: Optional[List[str]] = None,
+    return_bytes: bool = False,
+    resume_from: Optional[dict] = None,
+) -> dict:
+    """
+    使用 Gemini 生成图片（核心函数）
+
+    Args:
+        prompt: 用于生成图像的提示词
+        save_path: 图片保存路径（return_bytes=True 时可为 None，表示不保存）
+        aspect_ratio: 图片宽高比（可选），如 "16:9", "1:1", "9:16" 等
+        added_prompt: 附加提示词（可选）。如果提供，将先用 prompt 生成图片，再用生成的图片 + added_prompt 生成最终图片
+        base_url: API 基础地址（可选，不传则读取 config.json）
+        model: 模型名称（可选，不传则读取 config.json）
+        api_key: API 密钥（可选，不传则读取 config.json）
+        cache: 结果缓存模式 bypass / use / refresh（可选，不传则读取 config.json）
+        refine_prompts: 精修提示词列表（可选）。每一步使用上一步生成的图片 + 对应提示词，
+                        与 added_prompt 同时提供时 added_prompt 作为第一条精修提示词
+        return_bytes: 是否在结果中附带原始图像字节 image_bytes（用于直接返回二进制响应）
+        resume_from: 多步生成失败时返回的 resume_from（可选），从其中记录的步骤之后继续生成
+
+    Returns:
+        包含操作结果的字典
+    """
+    try:
+        resolved_model = model or _gemini_config_value("model")
+        upstream = _resolve_upstream_override(base_url, api_key)
+        cache_mode = _resolve_cache_mode(cache)
+        if cache_mode not in CACHE_MODES:
+            return {
+                "success": False,
+                "error": f"不支持的 cache 模式: {cache_mode}，可选值: {', '.join(CACHE_MODES)}",
+            }
+
+        if not save_path and not return_bytes:
+            return {
+                "success": False,
+                "error": "缺少必需参数: save_path",
+            }
 
-        # 保存图像
-        with open(save_path, "wb") as f:
-            f.write(image_bytes)
+        if refine_prompts is not None and (
+            not isinstance(refine_prompts, list) or not all(isinstance(p, str) and p for p in refine_prompts)
+        ):
+            return {
+                "success": False,
+                "error": "refine_prompts 参数必须是非空字符串列表",
+            }
+
+        all_refine_prompts = ([added_prompt] if added_prompt else []) + (refine_prompts or [])
+
+        # ========== 依次执行各步生成 ==========
+        pipeline = _run_refinement_pipeline(
+            prompt, all_refine_prompts, aspect_ratio, resolved_model, cache_mode, upstream, resume_from
+        )
+        if not pipeline["success"]:
+            if added_prompt and pipeline.get("completed_steps", 0) >= 1:
+                pipeline["step1_completed"] = True
+            return pipeline
+
+        steps = pipeline["steps"]
+        final = pipeline["final"]
+        final_generated_text = final["text"]
+
+        # ========== 保存最终图片 ==========
+        image_bytes = final["image_bytes"]
+
+        stored = {}
+        if save_path:
+            saved_path, stored = _save_image(image_bytes, save_path)
 
         file_size = len(image_bytes)
 
         result = {
             "success": True,
-            "file_path": str(save_path.absolute()),
+            "file_path": str(saved_path.absolute()) if save_path else None,
             "file_size": file_size,
+            "mime_type": final["mime_type"],
             "prompt": prompt,
             "aspect_ratio": aspect_ratio,
             "generated_text": final_generated_text,
-            "message": f"图片生成成功: {save_path.absolute()}",
+            "cache_hit": final["cache_hit"],
+            "upstream": final["upstream"],
+            "message": f"图片生成成功: {saved_path.absolute()}" if save_path else "图片生成成功",
+            **stored,
         }
 
+        # 原始字节模式：由调用方直接作为响应体返回
+        if return_bytes:
+            result["image_bytes"] = image_bytes
+
+        # 多步生成时附带每一步的信息
+        if len(steps) > 1:
+            result["steps"] = steps
+
         # 如果使用了两步生成，添加相关信息
         if added_prompt:
             result["two_step_generation"] = True
             result["added_prompt"] = added_prompt
-            result["step1_text"] = generated_text_step1
-            result["step2_text"] = final_generated_text
+            result["step1_text"] = steps[0]["text"]
+            result["step2_text"] = steps[1]["text"]
+            result["step1_cache_hit"] = steps[0]["cache_hit"]
+            result["step1_upstream"] = steps[0]["upstream"]
 
         return result
 
@@ -301,7 +963,7 @@ def generate_image_gemini_core(
 
 
 def modify_image_with_prompt(
-    images: List[Union[str, dict]],
+    images: List[Union[str, dict, ImageSource]],
     prompt: str,
     save_path: Optional[str] = None,
     aspect_ratio: Optional[str] = None,
@@ -309,17 +971,23 @@ def modify_image_with_prompt(
     base_url: Optional[str] = None,
     model: Optional[str] = None,
     api_key: Optional[str] = None,
+    cache: Optional[str] = None,
+    return_bytes: bool = False,
+    preprocess: Optional[Union[bool, dict]] = None,
 ) -> dict:
     """
     使用多张图片和提示词修改/生成新图片
 
     Args:
-        images: 图片列表，支持两种格式：
+        images: 图片列表，支持以下格式：
                 1. Base64 字符串列表 ["base64_data1", "base64_data2", ...]
                 2. 包含图片信息的字典列表 [
                     {"data": "base64_data", "mime_type": "image/png"},
                     {"data": "base64_data", "mime_type": "image/jpeg"}
                    ]
+                3. 本地文件或 URL [{"path": "D:/input/1.png"}, {"url": "https://..."}]
+                4. ImageSource 对象（如 multipart 上传的文件）
+                文件、URL 和 ImageSource 在构建请求时才读取，只编码一次
         prompt: 用于修改/生成图像的提示词
         save_path: 图片保存路径（可选，当 return_base64=True 或不保存时可不提供）
         aspect_ratio: 图片宽高比（可选），如 "16:9", "1:1", "9:16" 等
@@ -327,10 +995,15 @@ def modify_image_with_prompt(
         base_url: API 基础地址（可选，不传则读取 config.json）
         model: 模型名称（可选，不传则读取 config.json）
         api_key: API 密钥（可选，不传则读取 config.json）
+        cache: 结果缓存模式 bypass / use / refresh（可选，不传则读取 config.json）
+        return_bytes: 是否在结果中附带原始图像字节 image_bytes（优先于 return_base64，save_path 可不提供）
+        preprocess: 是否预处理输入图片（缩小、重新编码、去重），可传字典覆盖参数（可选，不传则读取 config.json）
 
     Returns:
         包含操作结果的字典
     """
+    started = time.monotonic()
+
     try:
         if not images:
             return {
@@ -342,176 +1015,95 @@ def modify_image_with_prompt(
         if return_base64 is None:
             return_base64 = bool(gemini_cfg.get("return_base64_default", DEFAULT_CONFIG["gemini"]["return_base64_default"]))
 
-        resolved_base_url, resolved_model, resolved_api_key = _resolve_gemini_settings(base_url, model, api_key)
-
-        # 构建完整的 API 端点
-        endpoint = f"{resolved_base_url.rstrip('/')}/v1beta/models/{resolved_model}:generateContent"
-
-        # 设置请求头
-        headers = {
-            "x-goog-api-key": resolved_api_key,
-            "Content-Type": "application/json",
-        }
-
-        # 构建请求体的 parts 数组
-        parts = []
-
-        # 添加所有图片到 parts
-        for idx, image in enumerate(images):
-            if isinstance(image, str):
-                # 如果是字符串，默认为 base64 数据，MIME 类型为 image/png
-                image_data = image
-                mime_type = "image/png"
-            elif isinstance(image, dict):
-                # 如果是字典，提取数据和 MIME 类型
-                image_data = image.get("data", "")
-                mime_type = image.get("mime_type", "image/png")
-
-                if not image_data:
-                    return {
-                        "success": False,
-                        "error": f"第 {idx + 1} 张图片缺少 data 字段",
-                    }
-            else:
-                return {
-                    "success": False,
-                    "error": f"第 {idx + 1} 张图片格式不正确",
-                }
-
-            # 添加图片到 parts
-            parts.append({
-                "inlineData": {
-                    "mimeType": mime_type,
-                    "data": image_data,
-                }
-            })
-
-        # 添加提示词
-        parts.append({"text": prompt})
-
-        # 构建请求体
-        request_body = {
-            "contents": [{
-                "parts": parts
-            }]
-        }
-
-        # 如果指定了宽高比，添加到配置项
-        if aspect_ratio:
-            request_body["generationConfig"] = {
-                "imageConfig": {
-                    "aspectRatio": aspect_ratio
-                }
-            }
-
-        # 发送请求
-        response = requests.post(
-            endpoint,
-            json=request_body,
-            headers=headers,
-            timeout=120,
-        )
-
-        # 检查响应状态
-        if response.status_code != 200:
+        # 需要保存文件时先检查路径，避免白白发起请求
+        if not return_bytes and not return_base64 and not save_path:
             return {
                 "success": False,
-                "error": f"API 请求失败: HTTP {response.status_code}",
-                "details": response.text,
+                "error": "当 return_base64=False 时，必须提供 save_path 参数",
             }
 
-        # 解析响应
-        response_data = response.json()
-
-        # 提取生成的图像数据
-        if "candidates" not in response_data or len(response_data["candidates"]) == 0:
+        resolved_model = model or _gemini_config_value("model")
+        upstream = _resolve_upstream_override(base_url, api_key)
+        cache_mode = _resolve_cache_mode(cache)
+        if cache_mode not in CACHE_MODES:
             return {
                 "success": False,
-                "error": "API 响应中没有找到生成的图像",
-                "response": response_data,
+                "error": f"不支持的 cache 模式: {cache_mode}，可选值: {', '.join(CACHE_MODES)}",
             }
 
-        candidate = response_data["candidates"][0]
-        if "content" not in candidate or "parts" not in candidate["content"]:
+        # 构建请求体的 parts 数组
+        parts, error = _build_image_parts(images)
+        if error:
             return {
                 "success": False,
-                "error": "API 响应格式不正确",
-                "response": response_data,
+                "error": error,
             }
 
-        # 查找生成的图像数据
-        image_data = None
-        generated_text = None
-
-        for part in candidate["content"]["parts"]:
-            if "inlineData" in part and "data" in part["inlineData"]:
-                image_data = part["inlineData"]["data"]
-            elif "text" in part:
-                generated_text = part["text"]
-
-        if not image_data:
+        # 预处理输入图片（缩小、重新编码、去重）
+        parts, preprocess_stats = _preprocess_parts(parts, preprocess)
+        if preprocess_stats and "error" in preprocess_stats:
             return {
                 "success": False,
-                "error": "未找到图像数据",
-                "text": generated_text,
-                "response": response_data,
-            }
-
-        # ========== 返回结果 ==========
-        # 如果启用了返回 Base64 开关，直接返回
-        if return_base64:
-            return {
-                "success": True,
-                "base64": image_data,
-                "prompt": prompt,
-                "image_count": len(images),
-                "aspect_ratio": aspect_ratio,
-                "generated_text": generated_text,
-                "message": "图片生成成功（返回 Base64 格式）",
+                "error": preprocess_stats["error"],
+                "preprocess": preprocess_stats,
             }
 
-        # 否则保存文件
-        if not save_path:
-            return {
-                "success": False,
-                "error": "当 return_base64=False 时，必须提供 save_path 参数",
-            }
+        # 添加提示词
+        parts.append({"text": prompt})
 
-        # ========== 保存图像 ==========
-        image_bytes = base64.b64decode(image_data)
-
-        # 处理保存路径
-        save_path = Path(save_path)
-
-        # 如果路径是目录或没有扩展名，自动生成按序编号的文件名
-        if save_path.is_dir() or not save_path.suffix or str(save_path).endswith(('/', '\\')):
-            target_dir = save_path if not save_path.is_file() else save_path.parent
-            target_dir.mkdir(parents=True, exist_ok=True)
-            existing_files = list(target_dir.glob("*.png"))
-            file_count = len(existing_files)
-            next_number = file_count + 1
-            save_path = target_dir / f"{next_number}.png"
-        else:
-            if not save_path.suffix:
-                save_path = save_path.with_suffix(".png")
-            save_path.parent.mkdir(parents=True, exist_ok=True)
+        # 构建请求体
+        request_body = _build_request_body(parts, aspect_ratio)
 
-        # 保存图像
-        with open(save_path, "wb") as f:
-            f.write(image_bytes)
+        # 发送请求
+        generated = _request_image(request_body, resolved_model, cache_mode, upstream=upstream)
+        if not generated["success"]:
+            return generated
 
-        file_size = len(image_bytes)
+        image_bytes = generated["image_bytes"]
+        generated_text = generated["text"]
 
-        return {
+        result = {
             "success": True,
-            "file_path": str(save_path.absolute()),
-            "file_size": file_size,
+            "mime_type": generated["mime_type"],
             "prompt": prompt,
             "image_count": len(images),
             "aspect_ratio": aspect_ratio,
             "generated_text": generated_text,
-            "message": f"图片生成成功: {save_path.absolute()}",
+            "cache_hit": generated["cache_hit"],
+            "upstream": generated["upstream"],
+            "elapsed_ms": round((time.monotonic() - started) * 1000, 1),
         }
+        if preprocess_stats is not None:
+            result["preprocess"] = preprocess_stats
+
+        # ========== 返回结果 ==========
+        # 原始字节模式：由调用方直接作为响应体返回，指定了 save_path 时同时保存
+        if return_bytes:
+            result["image_bytes"] = image_bytes
+            result["file_size"] = len(image_bytes)
+            result["file_path"] = None
+            if save_path:
+                saved_path, stored = _save_image(image_bytes, save_path)
+                result["file_path"] = str(saved_path.absolute())
+                result.update(stored)
+            result["message"] = "图片生成成功"
+            return result
+
+        # 如果启用了返回 Base64 开关，直接返回
+        if return_base64:
+            result["base64"] = base64.b64encode(image_bytes).decode("ascii")
+            result["message"] = "图片生成成功（返回 Base64 格式）"
+            return result
+
+        # 否则保存文件
+        # ========== 保存图像 ==========
+        save_path, stored = _save_image(image_bytes, save_path)
+
+        result["file_path"] = str(save_path.absolute())
+        result["file_size"] = len(image_bytes)
+        result.update(stored)
+        result["message"] = f"图片生成成功: {save_path.absolute()}"
+        return result
 
     except requests.exceptions.Timeout:
         return {
@@ -536,3 +1128,391 @@ def modify_image_with_prompt(
             "error": str(e),
             "traceback": traceback.format_exc(),
         }
+
+
+# 流式模式下每写入这么多图像字节推送一次进度
+STREAM_PROGRESS_BYTES = 256 * 1024
+
+
+def _consume_image_stream(response: requests.Response, save_path: str, upstream_meta: dict, started: float) -> Iterator[dict]:
+    """读取 streamGenerateContent 的 SSE 响应，转发文本片段，并把图像边接收边解码写入 save_path"""
+    save_dir = _numbered_save_dir(Path(save_path)) or Path(save_path).parent
+    parser = _StreamingResponseParser(lambda: Base64FileWriter(save_dir))
+    text_parts = []
+    mime_type = "image/png"
+    finish_reason = None
+    ttfb_ms = None
+    reported_bytes = 0
+
+    try:
+        chunks = response.iter_content(chunk_size=64 * 1024)
+        while True:
+            chunk = next(chunks, None)
+            if chunk is None:
+                events = parser.close()
+            else:
+                if ttfb_ms is None:
+                    ttfb_ms = round((time.monotonic() - started) * 1000, 1)
+                events = parser.feed(chunk)
+
+            for event in events:
+                if "error" in event:
+                    yield {
+                        "event": "error",
+                        "success": False,
+                        "error": f"API 流式响应返回错误: {event['error'].get('message', event['error'])}",
+                        "upstream": upstream_meta,
+                    }
+                    return
+
+                for candidate in event.get("candidates", [])[:1]:
+                    finish_reason = candidate.get("finishReason", finish_reason)
+                    for part in candidate.get("content", {}).get("parts", []):
+                        if "inlineData" in part:
+                            mime_type = part["inlineData"].get("mimeType", mime_type)
+                        elif "text" in part:
+                            text_parts.append(part["text"])
+                            yield {"event": "text", "text": part["text"]}
+
+            if chunk is None:
+                break
+
+            if parser.sink is not None and parser.sink.bytes_written - reported_bytes >= STREAM_PROGRESS_BYTES:
+                reported_bytes = parser.sink.bytes_written
+                yield {"event": "progress", "image_bytes": reported_bytes}
+
+        generated_text = "".join(text_parts) or None
+
+        # 与非流式模式一致，多张图片时取最后一张
+        image = parser.sinks[-1] if parser.sinks else None
+        if image is None or image.bytes_written == 0:
+            yield {
+                "event": "error",
+                "success": False,
+                "error": "未找到图像数据",
+                "text": generated_text,
+                "finish_reason": finish_reason,
+                "upstream": upstream_meta,
+            }
+            return
+
+        # 图像完整后才分配文件名，失败时不会留下空的编号文件
+        final_path = _resolve_save_path(save_path)
+        stored = commit_writer(image, final_path)
+        yield {
+            "event": "done",
+            "success": True,
+            "file_path": str(final_path.absolute()),
+            "file_size": image.bytes_written,
+            "sha256": stored["sha256"],
+            "deduplicated": stored["deduplicated"],
+            "mime_type": mime_type,
+            "generated_text": generated_text,
+            "finish_reason": finish_reason,
+            "ttfb_ms": ttfb_ms,
+            "elapsed_ms": round((time.monotonic() - started) * 1000, 1),
+            "upstream": upstream_meta,
+            "message": f"图片生成成功: {final_path.absolute()}",
+        }
+
+    except (requests.exceptions.RequestException, ValueError, binascii.Error) as e:
+        yield {
+            "event": "error",
+            "success": False,
+            "error": f"流式响应读取失败: {str(e)}",
+            "upstream": upstream_meta,
+        }
+
+    finally:
+        for sink in parser.sinks:
+            sink.abort()
+        response.close()
+
+
+def _stream_generate_content(
+    request_body: dict,
+    model: str,
+    save_path: str,
+    upstream: Optional[Upstream] = None,
+) -> Iterator[dict]:
+    """
+    通过 streamGenerateContent 流式生成图片，逐个产出事件
+
+    只在收到响应之前按重试策略重试；开始接收数据后不再重试。
+    流式模式不读写结果缓存。
+
+    Yields:
+        {"event": "start", "upstream"}：已连接上游
+        {"event": "text", "text"}：模型输出的文本片段
+        {"event": "progress", "image_bytes"}：已解码写入磁盘的图像字节数
+        {"event": "retry", "attempt", "status", "error", "backoff_seconds"}：连接失败，等待后重试
+        最后产出 {"event": "done", "success": True, ...} 或 {"event": "error", "success": False, ...}
+    """
+    policy = RetryPolicy.from_config(_gemini_config_value("retry"))
+    connect_timeout = _gemini_config_value("connect_timeout")
+    read_timeout = _gemini_config_value("read_timeout")
+
+    balancer = None if upstream is not None else _get_balancer()
+    missing = _missing_upstream_error(upstream, balancer)
+    if missing:
+        yield {
+            "event": "error",
+            "success": False,
+            "error": missing,
+        }
+        return
+
+    started = time.monotonic()
+    payload = _encode_request_body(request_body)
+
+    attempt = 0
+    while True:
+        attempt += 1
+        target = upstream or balancer.pick()
+        upstream_meta = {"attempts": attempt, "served_by": target.name}
+        headers = {
+            "x-goog-api-key": target.api_key,
+            "Content-Type": "application/json",
+        }
+
+        response = None
+        error = None
+        # 限流名额和在途计数覆盖整个流式读取过程（先进入 track，保证 pick 占用的在途名额一定被释放）
+        with _track_upstream(balancer, target) as record, _get_rate_limiter().acquire(target.api_key):
+            try:
+                response = _get_gemini_session().post(
+                    f"{target.base_url}/v1beta/models/{model}:streamGenerateContent",
+                    params={"alt": "sse"},
+                    data=payload,
+                    headers=headers,
+                    timeout=(connect_timeout, read_timeout),
+                    stream=True,
+                )
+                record(response.status_code)
+            except RETRYABLE_EXCEPTIONS as e:
+                error = e
+
+            if response is not None and response.status_code == 200:
+                yield {"event": "start", "upstream": upstream_meta}
+                yield from _consume_image_stream(response, save_path, upstream_meta, started)
+                return
+
+            if response is not None and response.status_code not in policy.retry_statuses:
+                details = response.text
+                response.close()
+                yield {
+                    "event": "error",
+                    "success": False,
+                    "error": f"API 请求失败: HTTP {response.status_code}",
+                    "details": details,
+                    "upstream": upstream_meta,
+                }
+                return
+
+        delay = policy.backoff(attempt, response)
+        if response is not None:
+            response.close()
+
+        exhausted = attempt >= policy.max_attempts or time.monotonic() - started + delay >= policy.deadline_seconds
+        if exhausted or (error is not None and not policy.retry_on_timeout):
+            yield {
+                "event": "error",
+                "success": False,
+                "error": f"API 请求失败: HTTP {response.status_code}" if response is not None else f"网络请求失败: {str(error)}",
+                "upstream": upstream_meta,
+            }
+            return
+
+        yield {
+            "event": "retry",
+            "attempt": attempt,
+            "status": response.status_code if response is not None else None,
+            "error": type(error).__name__ if error is not None else None,
+            "backoff_seconds": round(delay, 3),
+        }
+        time.sleep(delay)
+
+
+def _iter_stream_guarded(events: Iterator[dict]) -> Iterator[dict]:
+    """把流式生成中的意外异常转换为 error 事件"""
+    try:
+        yield from events
+    except Exception as e:
+        import traceback
+
+        yield {
+            "event": "error",
+            "success": False,
+            "error": str(e),
+            "traceback": traceback.format_exc(),
+        }
+
+
+def iter_generate_image_gemini_stream(
+    prompt: str,
+    save_path: str,
+    aspect_ratio: Optional[str] = None,
+    base_url: Optional[str] = None,
+    model: Optional[str] = None,
+    api_key: Optional[str] = None,
+) -> Iterator[dict]:
+    """
+    使用 Gemini 流式生成图片，逐个产出事件（事件格式见 _stream_generate_content）
+
+    Args:
+        prompt: 用于生成图像的提示词
+        save_path: 图片保存路径（流式模式直接写入磁盘，必须提供）
+        aspect_ratio: 图片宽高比（可选）
+        base_url / model / api_key: 同 generate_image_gemini_core
+    """
+    def events():
+        if not save_path:
+            yield {"event": "error", "success": False, "error": "缺少必需参数: save_path"}
+            return
+
+        request_body = _build_request_body([{"text": prompt}], aspect_ratio)
+        yield from _stream_generate_content(
+            request_body,
+            model or _gemini_config_value("model"),
+            save_path,
+            _resolve_upstream_override(base_url, api_key),
+        )
+
+    return _iter_stream_guarded(events())
+
+
+def iter_modify_image_with_prompt_stream(
+    images: List[Union[str, dict, ImageSource]],
+    prompt: str,
+    save_path: str,
+    aspect_ratio: Optional[str] = None,
+    base_url: Optional[str] = None,
+    model: Optional[str] = None,
+    api_key: Optional[str] = None,
+    preprocess: Optional[Union[bool, dict]] = None,
+) -> Iterator[dict]:
+    """
+    使用多张图片和提示词流式生成新图片，逐个产出事件（事件格式见 _stream_generate_content）
+
+    Args:
+        images: 图片列表，格式同 modify_image_with_prompt
+        prompt: 用于修改/生成图像的提示词
+        save_path: 图片保存路径（流式模式直接写入磁盘，必须提供）
+        aspect_ratio: 图片宽高比（可选）
+        base_url / model / api_key / preprocess: 同 modify_image_with_prompt
+    """
+    # 输入图片在调用时就读取：上传的文件在 HTTP 请求结束后会被关闭，而事件是在返回响应之后才产出的
+    parts, error = _build_image_parts(images) if images else ([], "至少需要提供一张图片")
+
+    def events():
+        nonlocal parts
+
+        if not save_path:
+            yield {"event": "error", "success": False, "error": "缺少必需参数: save_path"}
+            return
+
+        if error:
+            yield {"event": "error", "success": False, "error": error}
+            return
+
+        parts, preprocess_stats = _preprocess_parts(parts, preprocess)
+        if preprocess_stats is not None:
+            if "error" in preprocess_stats:
+                yield {"event": "error", "success": False, "error": preprocess_stats["error"]}
+                return
+            yield {"event": "preprocess", **preprocess_stats}
+
+        parts.append({"text": prompt})
+
+        yield from _stream_generate_content(
+            _build_request_body(parts, aspect_ratio),
+            model or _gemini_config_value("model"),
+            save_path,
+            _resolve_upstream_override(base_url, api_key),
+        )
+
+    return _iter_stream_guarded(events())
+
+
+def iter_generate_image_gemini_batch(
+    items: List[dict],
+    defaults: Optional[dict] = None,
+    max_workers: Optional[int] = None,
+) -> Iterator[dict]:
+    """
+    并发批量生成图片，逐个产出进度事件
+
+    Args:
+        items: 每项一个参数字典，字段同 generate_image_gemini_core（prompt、save_path 等）
+        defaults: 各项缺省时使用的公共参数
+        max_workers: 并发线程数（可选，不传则读取 config.json）；实际请求速率由按 API Key 的限流器控制
+
+    Yields:
+        {"event": "progress", "index", "completed", "total", "success", "error"}，每完成一项产出一次；
+        最后产出 {"event": "done", ...}，其中 results 与输入顺序一致
+    """
+    defaults = defaults or {}
+    if max_workers is None:
+        max_workers = _gemini_config_value("batch_max_workers")
+    max_workers = max(1, min(int(max_workers), len(items) or 1))
+
+    total = len(items)
+    results: List[Optional[dict]] = [None] * total
+
+    def run_one(item) -> dict:
+        if not isinstance(item, dict):
+            return {"success": False, "error": "每一项必须是对象"}
+
+        kwargs = {key: defaults[key] for key in BATCH_ITEM_FIELDS if key in defaults}
+        kwargs.update({key: item[key] for key in BATCH_ITEM_FIELDS if key in item})
+
+        for param in ("prompt", "save_path"):
+            if not kwargs.get(param):
+                return {"success": False, "error": f"缺少必需参数: {param}"}
+
+        return generate_image_gemini_core(**kwargs)
+
+    completed = 0
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="gemini-batch") as executor:
+        futures = {executor.submit(run_one, item): index for index, item in enumerate(items)}
+
+        for future in as_completed(futures):
+            index = futures[future]
+            try:
+                result = future.result()
+            except Exception as e:
+                result = {"success": False, "error": str(e)}
+
+            results[index] = {"index": index, **result}
+            completed += 1
+            yield {
+                "event": "progress",
+                "index": index,
+                "completed": completed,
+                "total": total,
+                "success": result.get("success", False),
+                "error": result.get("error"),
+            }
+
+    succeeded = sum(1 for result in results if result["success"])
+    yield {
+        "event": "done",
+        "success": True,
+        "total": total,
+        "succeeded": succeeded,
+        "failed": total - succeeded,
+        "results": results,
+    }
+
+
+def generate_image_gemini_batch_core(
+    items: List[dict],
+    defaults: Optional[dict] = None,
+    max_workers: Optional[int] = None,
+) -> dict:
+    """并发批量生成图片，等待全部完成后返回按输入顺序排列的结果"""
+    final = {}
+    for event in iter_generate_image_gemini_batch(items, defaults, max_workers):
+        final = event
+    final.pop("event", None)
+    return final
@@ -4,33 +4,55 @@ B站字幕提取模块
 """
 
 import asyncio
-from playwright.async_api import async_playwright, TimeoutError as PlaywrightTimeoutError
+import time
+from typing import List, Optional
 
+from playwright.async_api import TimeoutError as PlaywrightTimeoutError
 
-def parse_srt_to_text(srt_content: str) -> str:
-    """将 SRT 格式字幕转换为纯文本（去除序号和时间戳）"""
-    if not srt_content:
-        return ""
-    
-    lines = srt_content.strip().split('\n')
-    text_lines = []
-    
-    for line in lines:
-        line = line.strip()
-        if not line or line.isdigit() or '-->' in line:
-            continue
-        text_lines.append(line)
-    
-    return '\n'.join(text_lines)
+from browser_pool import get_browser_pool
+from config_loader import DEFAULT_CONFIG, load_config
+from http_client import get_session
+from srt_parser import format_vtt, iter_srt_segments, parse_srt_to_text, segments_to_dicts
+from subtitle_cache import get_subtitle_cache, normalize_bv_id
+
+# 可选的字幕提取后端：
+#   direct     - 直接请求 subtitleExtract 接口，不启动浏览器
+#   playwright - 用浏览器池驱动提取页面并捕获接口响应
+#   auto       - 先走 direct，失败时回退到 playwright；接口正常返回的业务错误（JSON 中 code 不为 200，如视频没有字幕）不回退
+SUBTITLE_BACKENDS = ("auto", "direct", "playwright")
+
+# 字幕内容的输出形式：
+#   text     - 纯文本（去除序号和时间戳）
+#   segments - 结构化片段列表 [{index, start_ms, end_ms, text}]
+#   srt      - 原始 SRT 文本
+#   vtt      - WebVTT 文本
+SUBTITLE_OUTPUTS = ("text", "segments", "srt", "vtt")
 
 
-async def get_bilibili_subtitle_core(video_url: str, text_only: bool = True) -> dict:
+def _get_bilibili_config() -> dict:
+    return load_config().get("bilibili", {})
+
+
+def _config_value(cfg: dict, key: str):
+    return cfg.get(key, DEFAULT_CONFIG["bilibili"][key])
+
+
+async def get_bilibili_subtitle_core(
+    video_url: str,
+    text_only: bool = True,
+    backend: Optional[str] = None,
+    use_cache: bool = True,
+    output: Optional[str] = None,
+) -> dict:
     """
     获取B站视频字幕（核心功能）
     
     Args:
         video_url: B站视频链接或BV号
-        text_only: 是否只返回纯文本（去除时间戳）
+        text_only: 是否只返回纯文本（去除时间戳），未指定 output 时决定输出形式
+        backend: 提取后端 auto / direct / playwright（可选，不传则读取 config.json）
+        use_cache: 是否读写字幕缓存（缓存本身的开关见 config.json）
+        output: 字幕内容输出形式 text / segments / srt / vtt（可选，优先于 text_only）
     
     Returns:
         包含字幕数据的字典
@@ -39,81 +61,311 @@ async def get_bilibili_subtitle_core(video_url: str, text_only: bool = True) ->
     if video_url.startswith("BV"):
         video_url = f"https://www.bilibili.com/video/{video_url}"
     
-    async with async_playwright() as p:
-        browser = await p.chromium.launch(headless=True)
-        context = await browser.new_context()
-        page = await context.new_page()
-        
-        api_response = None
-        
-        async def handle_response(response):
-            nonlocal api_response
-            if "subtitleExtract" in response.url:
-                try:
-                    api_response = await response.json()
-                except:
-                    pass
-        
-        page.on("response", handle_response)
-        
-        try:
-            await page.goto(
-                "https://www.feiyudo.com/caption/subtitle/bilibili",
-                wait_until="networkidle",
-                timeout=30000
-            )
-            
-            input_selector = 'input[placeholder*="请将链接粘贴到这里"]'
-            await page.wait_for_selector(input_selector, timeout=10000)
-            await page.fill(input_selector, video_url)
-            
-            button_selector = 'button.el-button--primary:has-text("提取")'
-            await page.click(button_selector)
-            
-            # 等待API响应
-            wait_time = 0
-            max_wait = 30
-            while api_response is None and wait_time < max_wait:
-                await asyncio.sleep(0.5)
-                wait_time += 0.5
-            
-            if api_response is None:
-                return {
-                    "success": False,
-                    "error": "等待超时，未收到API响应"
-                }
-            
-            if api_response.get("code") != 200:
+    if output is None:
+        output = "text" if text_only else "srt"
+    output = output.lower()
+    if output not in SUBTITLE_OUTPUTS:
+        return {
+            "success": False,
+            "error": f"不支持的 output: {output}，可选值: {', '.join(SUBTITLE_OUTPUTS)}"
+        }
+    
+    cfg = _get_bilibili_config()
+    backend = (backend or _config_value(cfg, "backend")).lower()
+    if backend not in SUBTITLE_BACKENDS:
+        return {
+            "success": False,
+            "error": f"不支持的 backend: {backend}，可选值: {', '.join(SUBTITLE_BACKENDS)}"
+        }
+    
+    # auto 模式下未配置直连接口时直接使用浏览器
+    if backend == "auto" and not _config_value(cfg, "direct_api_url"):
+        backend = "playwright"
+    
+    timings = {}
+    started = time.perf_counter()
+    
+    cache = get_subtitle_cache() if use_cache else None
+    cache_key = normalize_bv_id(video_url) if cache is not None else None
+    
+    if cache_key:
+        cached = await cache.get_async(cache_key)
+        if cached is not None:
+            result = _finalize({"success": True, "data": cached}, output, "cache", timings, started)
+            result["cache"] = "hit"
+            return result
+    
+    fallback_reason = None
+    result = None
+    
+    if backend in ("direct", "auto"):
+        result = await _extract_via_direct(video_url, cfg, timings)
+        used_backend = "direct"
+        business_error = result.pop("business_error", False)
+        if not result["success"] and backend == "auto" and not business_error:
+            fallback_reason = result["error"]
+            result = None
+    
+    if result is None:
+        result = await _extract_via_playwright(video_url, timings)
+        used_backend = "playwright"
+    
+    # 缓存原始响应，字幕内容在 _finalize 中按请求参数处理
+    if cache_key and result["success"]:
+        await cache.set_async(cache_key, result["data"])
+    
+    result = _finalize(result, output, used_backend, timings, started)
+    if fallback_reason:
+        result["fallback_reason"] = fallback_reason
+    if cache_key:
+        result["cache"] = "miss"
+    return result
+
+
+async def get_bilibili_subtitles_batch_core(
+    video_urls: List[str],
+    text_only: bool = True,
+    backend: Optional[str] = None,
+    use_cache: bool = True,
+    concurrency: Optional[int] = None,
+    output: Optional[str] = None,
+) -> dict:
+    """
+    批量获取B站视频字幕
+    
+    Args:
+        video_urls: B站视频链接或BV号列表
+        text_only: 是否只返回纯文本（去除时间戳）
+        backend: 提取后端 auto / direct / playwright（可选，不传则读取 config.json）
+        use_cache: 是否读写字幕缓存
+        concurrency: 最大并发数（可选，不传则读取 config.json）；playwright 后端同时还受浏览器池大小限制
+        output: 字幕内容输出形式 text / segments / srt / vtt（可选，优先于 text_only）
+    
+    Returns:
+        包含逐项结果的字典，results 与输入顺序一致，单项失败不影响其他项
+    """
+    if concurrency is None:
+        concurrency = _config_value(_get_bilibili_config(), "batch_concurrency")
+    semaphore = asyncio.Semaphore(max(1, int(concurrency)))
+    started = time.perf_counter()
+    
+    async def run_one(video_url: str) -> dict:
+        async with semaphore:
+            try:
+                return await get_bilibili_subtitle_core(video_url, text_only, backend, use_cache, output)
+            except Exception as e:
                 return {
                     "success": False,
-                    "error": api_response.get('message', '未知错误')
+                    "error": str(e)
                 }
-            
-            # 处理字幕内容
-            data = api_response.get("data", {})
-            if text_only:
-                subtitle_list = data.get('subtitleItemVoList', [])
-                for subtitle_item in subtitle_list:
-                    if 'content' in subtitle_item:
-                        original_content = subtitle_item['content']
-                        text_content = parse_srt_to_text(original_content)
-                        subtitle_item['content'] = text_content
-                        subtitle_item['content_with_timestamp'] = original_content
-            
-            return {
-                "success": True,
-                "data": api_response
-            }
-            
-        except PlaywrightTimeoutError:
-            return {
-                "success": False,
-                "error": "操作超时"
-            }
-        except Exception as e:
-            return {
+    
+    # 同一批次中重复的视频只提取一次
+    tasks = {}
+    item_tasks = []
+    for video_url in video_urls:
+        if not isinstance(video_url, str) or not video_url:
+            item_tasks.append(None)
+            continue
+        key = normalize_bv_id(video_url) or video_url
+        if key not in tasks:
+            tasks[key] = asyncio.ensure_future(run_one(video_url))
+        item_tasks.append(tasks[key])
+    
+    if tasks:
+        await asyncio.gather(*tasks.values())
+    
+    results = []
+    for index, (video_url, task) in enumerate(zip(video_urls, item_tasks)):
+        if task is None:
+            item = {
                 "success": False,
-                "error": str(e)
+                "error": "url 必须是非空字符串"
             }
-        finally:
-            await browser.close()
+        else:
+            item = task.result()
+        results.append({"index": index, "url": video_url, **item})
+    
+    succeeded = sum(1 for item in results if item["success"])
+    return {
+        "success": True,
+        "total": len(results),
+        "succeeded": succeeded,
+        "failed": len(results) - succeeded,
+        "results": results,
+        "total_ms": _elapsed_ms(started)
+    }
+
+
+def _render_content(srt_content: str, output: str):
+    """按输出形式渲染一条字幕轨道，只生成需要的那一种表示"""
+    if output == "srt":
+        return srt_content
+    if output == "text":
+        return parse_srt_to_text(srt_content)
+    if output == "segments":
+        return segments_to_dicts(iter_srt_segments(srt_content))
+    return format_vtt(iter_srt_segments(srt_content))
+
+
+def _finalize(result: dict, output: str, backend: str, timings: dict, started: float) -> dict:
+    """统一处理字幕内容并附加后端与耗时信息"""
+    if result["success"] and output != "srt":
+        api_response = result["data"]
+        data = api_response.get("data", {})
+        subtitle_list = data.get('subtitleItemVoList', [])
+        for subtitle_item in subtitle_list:
+            if 'content' in subtitle_item:
+                content = _render_content(subtitle_item.pop('content'), output)
+                subtitle_item['segments' if output == "segments" else 'content'] = content
+    
+    timings["total_ms"] = _elapsed_ms(started)
+    result["backend"] = backend
+    result["output"] = output
+    result["timings"] = timings
+    return result
+
+
+def _check_api_response(api_response) -> dict:
+    if not isinstance(api_response, dict):
+        return {
+            "success": False,
+            "error": "API 响应格式不正确"
+        }
+    
+    if api_response.get("code") != 200:
+        return {
+            "success": False,
+            "error": api_response.get('message', '未知错误')
+        }
+    
+    return {
+        "success": True,
+        "data": api_response
+    }
+
+
+def _direct_request(video_url: str, cfg: dict) -> dict:
+    """直接请求 subtitleExtract 接口（阻塞调用，在线程池中执行）"""
+    session = get_session("bilibili")
+    response = session.post(
+        _config_value(cfg, "direct_api_url"),
+        json={"url": video_url},
+        headers=_config_value(cfg, "direct_api_headers"),
+        timeout=_config_value(cfg, "direct_api_timeout"),
+    )
+    
+    if response.status_code != 200:
+        return {
+            "success": False,
+            "error": f"直连接口请求失败: HTTP {response.status_code}"
+        }
+    
+    try:
+        api_response = response.json()
+    except ValueError as e:
+        return {
+            "success": False,
+            "error": f"直连接口响应解析失败: {e}"
+        }
+    
+    result = _check_api_response(api_response)
+    # 接口正常返回的业务错误（code 不为 200），换用浏览器也会得到相同结果
+    if not result["success"] and isinstance(api_response, dict):
+        result["business_error"] = True
+    return result
+
+
+async def _extract_via_direct(video_url: str, cfg: dict, timings: dict) -> dict:
+    """direct 后端：不启动浏览器，直接调用提取接口"""
+    if not _config_value(cfg, "direct_api_url"):
+        return {
+            "success": False,
+            "error": "未配置 bilibili.direct_api_url，无法使用 direct 后端"
+        }
+    
+    step = time.perf_counter()
+    try:
+        return await asyncio.to_thread(_direct_request, video_url, cfg)
+    except Exception as e:
+        return {
+            "success": False,
+            "error": f"直连接口请求失败: {e}"
+        }
+    finally:
+        timings["direct_ms"] = _elapsed_ms(step)
+
+
+async def _extract_via_playwright(video_url: str, timings: dict) -> dict:
+    """playwright 后端：租用浏览器页面完成提取"""
+    network = {}
+    started = time.perf_counter()
+    
+    try:
+        async with get_browser_pool().lease(network) as page:
+            timings["lease_ms"] = _elapsed_ms(started)
+            result = await _extract_with_page(page, video_url, timings)
+        result["network"] = network
+        return result
+    except PlaywrightTimeoutError:
+        return {
+            "success": False,
+            "error": "操作超时"
+        }
+    except Exception as e:
+        return {
+            "success": False,
+            "error": str(e)
+        }
+
+
+def _elapsed_ms(since: float) -> float:
+    return round((time.perf_counter() - since) * 1000, 1)
+
+
+async def _extract_with_page(page, video_url: str, timings: dict) -> dict:
+    """在租用的页面上完成一次字幕提取，各阶段耗时写入 timings"""
+    page_url = _config_value(_get_bilibili_config(), "page_url")
+    
+    # 只等到收到页面响应，之后仅等待输入框出现，不再等待网络空闲
+    step = time.perf_counter()
+    await page.goto(page_url, wait_until="commit", timeout=30000)
+    timings["navigate_ms"] = _elapsed_ms(step)
+    
+    step = time.perf_counter()
+    input_selector = 'input[placeholder*="请将链接粘贴到这里"]'
+    await page.wait_for_selector(input_selector, timeout=30000)
+    timings["page_ready_ms"] = _elapsed_ms(step)
+    
+    step = time.perf_counter()
+    await page.fill(input_selector, video_url)
+    timings["fill_ms"] = _elapsed_ms(step)
+    
+    # 先注册响应监听再点击，响应到达即返回，无需轮询
+    try:
+        async with page.expect_response(
+            lambda response: "subtitleExtract" in response.url,
+            timeout=30000
+        ) as response_info:
+            step = time.perf_counter()
+            button_selector = 'button.el-button--primary:has-text("提取")'
+            await page.click(button_selector)
+            timings["click_ms"] = _elapsed_ms(step)
+            step = time.perf_counter()
+        
+        response = await response_info.value
+        timings["response_ms"] = _elapsed_ms(step)
+    except PlaywrightTimeoutError:
+        return {
+            "success": False,
+            "error": "等待超时，未收到API响应"
+        }
+    
+    try:
+        api_response = await response.json()
+    except Exception as e:
+        return {
+            "success": False,
+            "error": f"API 响应解析失败: {e}"
+        }
+    
+    return _check_api_response(api_response)
@@ -0,0 +1,80 @@
+"""
+共享 HTTP 会话模块
+按名称维护进程级的 requests.Session，复用 TCP/TLS 连接（keep-alive），并提供连接复用统计
+"""
+
+import atexit
+import threading
+from typing import Dict
+
+import requests
+from requests.adapters import HTTPAdapter
+
+_sessions: Dict[str, requests.Session] = {}
+_lock = threading.Lock()
+
+
+def get_session(name: str, pool_connections: int = 10, pool_maxsize: int = 10) -> requests.Session:
+    """
+    返回指定名称的共享会话，首次调用时创建
+
+    Args:
+        name: 会话名称，不同上游使用不同会话，互不影响连接池
+        pool_connections: 缓存的主机连接池数量
+        pool_maxsize: 每个主机连接池保留的最大连接数（即单主机并发上限）
+    """
+    session = _sessions.get(name)
+    if session is not None:
+        return session
+
+    with _lock:
+        session = _sessions.get(name)
+        if session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=pool_connections, pool_maxsize=pool_maxsize)
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            _sessions[name] = session
+
+    return session
+
+
+def session_stats() -> dict:
+    """
+    返回各会话的连接复用统计
+
+    每个主机连接池给出新建连接数 connections 与请求数 requests，
+    requests 远大于 connections 说明连接被有效复用
+    """
+    stats = {}
+
+    with _lock:
+        sessions = list(_sessions.items())
+
+    for name, session in sessions:
+        hosts = {}
+        for adapter in {id(a): a for a in session.adapters.values()}.values():
+            pools = adapter.poolmanager.pools
+            for key in list(pools.keys()):
+                pool = pools.get(key)
+                if pool is None:
+                    continue
+                host = f"{pool.scheme}://{pool.host}:{pool.port}"
+                hosts[host] = {
+                    "connections": pool.num_connections,
+                    "requests": pool.num_requests,
+                }
+        stats[name] = hosts
+
+    return stats
+
+
+def close_sessions():
+    """关闭所有共享会话（进程退出时自动调用）"""
+    with _lock:
+        for session in _sessions.values():
+            session.close()
+        _sessions.clear()
+
+
+atexit.register(close_sessions)
@@ -0,0 +1,243 @@
+"""
+输入图片预处理模块
+在发送给 Gemini 之前校验、缩小并重新编码输入图片，减少上传体积；需要 Pillow（未安装时跳过预处理）
+"""
+
+import base64
+import io
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple, Union
+
+from blob_cache import hash_bytes
+
+try:
+    from PIL import Image, UnidentifiedImageError
+    from PIL.Image import DecompressionBombError
+except ImportError:  # Pillow 是可选依赖
+    Image = None
+    UnidentifiedImageError = DecompressionBombError = OSError
+
+# 可选的重新编码格式
+PREPROCESS_FORMATS = ("jpeg", "webp", "png")
+
+_FORMAT_MIME_TYPES = {
+    "jpeg": "image/jpeg",
+    "webp": "image/webp",
+    "png": "image/png",
+}
+
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+# 最近处理过的图片：(输入哈希, 参数) -> (图片数据, MIME 类型, 输出字节数)；_recent_bytes 为其中图片数据的总长度
+_recent: "OrderedDict[tuple, Tuple[Union[bytes, str], str, int]]" = OrderedDict()
+_recent_bytes = 0
+_recent_lock = threading.Lock()
+
+
+def _get_executor(max_workers: int) -> ThreadPoolExecutor:
+    global _executor
+
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=max(1, int(max_workers)), thread_name_prefix="preprocess")
+
+    return _executor
+
+
+def _has_alpha(image) -> bool:
+    return image.mode in ("RGBA", "LA", "PA") or (image.mode == "P" and "transparency" in image.info)
+
+
+def _raw_size(data: Union[bytes, str]) -> int:
+    """图片数据的原始字节数（Base64 字符串按长度估算）"""
+    return len(data) if isinstance(data, bytes) else len(data) * 3 // 4
+
+
+def _process_one(data: Union[bytes, str], max_edge: int, output_format: str, quality: int) -> Tuple[Union[bytes, str], str, int, int]:
+    """
+    处理一张图片（data 为原始字节或 Base64 字符串）
+
+    Returns:
+        (图片数据, MIME 类型, 原始字节数, 输出字节数)；输出为原始字节，缩小和重新编码后反而更大时原样返回输入
+    """
+    raw = data if isinstance(data, bytes) else base64.b64decode(data)
+
+    with Image.open(io.BytesIO(raw)) as image:
+        image.load()
+        original_mime = Image.MIME.get(image.format, "image/png")
+
+        resized = max(image.size) > max_edge
+        if resized:
+            image.thumbnail((max_edge, max_edge), Image.LANCZOS)
+
+        # 带透明通道的图片不能存成 JPEG，改用 PNG 保留透明度
+        fmt = output_format
+        if fmt == "jpeg" and _has_alpha(image):
+            fmt = "png"
+        if fmt == "jpeg" and image.mode != "RGB":
+            image = image.convert("RGB")
+
+        out = io.BytesIO()
+        if fmt == "png":
+            image.save(out, format="PNG", optimize=True)
+        else:
+            image.save(out, format=fmt.upper(), quality=quality)
+        encoded = out.getvalue()
+
+    if not resized and len(encoded) >= len(raw):
+        return data, original_mime, len(raw), len(raw)
+
+    return encoded, _FORMAT_MIME_TYPES[fmt], len(raw), len(encoded)
+
+
+def _remember(key: tuple, value: Tuple[Union[bytes, str], str, int], max_entries: int, max_bytes: int):
+    """记录一条最近处理结果，超过条数或总字节数上限时淘汰最久未使用的条目；单条超过上限时不记录"""
+    global _recent_bytes
+
+    size = len(value[0])
+    if max_entries <= 0 or size > max_bytes:
+        return
+
+    with _recent_lock:
+        previous = _recent.pop(key, None)
+        if previous is not None:
+            _recent_bytes -= len(previous[0])
+        _recent[key] = value
+        _recent_bytes += size
+        while len(_recent) > max_entries or _recent_bytes > max_bytes:
+            _, evicted = _recent.popitem(last=False)
+            _recent_bytes -= len(evicted[0])
+
+
+def preprocess_inline_parts(
+    parts: List[dict],
+    max_edge: int = 1536,
+    output_format: str = "jpeg",
+    quality: int = 85,
+    max_workers: int = 4,
+    recent_entries: int = 256,
+    recent_max_bytes: int = 64 * 1024 * 1024,
+) -> Tuple[List[dict], dict]:
+    """
+    预处理请求体 parts 中的所有 inlineData 图片
+
+    inlineData.data 可以是原始字节（本地文件、URL、上传的图片）或 Base64 字符串；处理后的图片为原始字节，
+    由序列化请求体时统一编码，不在这里来回编解码
+
+    - 图片在共享线程池中并行处理
+    - 同一请求内相同的图片只处理一次；最近处理过的图片（按内容哈希和参数）直接复用结果
+    - 像素数超过 Pillow 解压炸弹上限的图片不做处理，原样发送
+    - 无法解析的图片返回错误
+
+    Args:
+        parts: 请求体的 parts（不修改原列表）
+        max_edge: 长边超过该值时等比缩小
+        output_format: 重新编码格式 jpeg / webp / png（带透明通道的图片编码为 png）
+        quality: jpeg / webp 的编码质量
+        max_workers: 线程池大小（首次调用时生效）
+        recent_entries: 跨请求复用的最近结果条数，0 表示不复用
+        recent_max_bytes: 最近结果占用内存的上限（按图片数据长度计）
+
+    Returns:
+        (新的 parts, 统计)；统计包含 input_bytes、output_bytes、deduplicated、recent_hits、elapsed_ms、images，
+        失败时统计中包含 error
+    """
+    started = time.monotonic()
+    stats = {
+        "input_bytes": 0,
+        "output_bytes": 0,
+        "deduplicated": 0,
+        "recent_hits": 0,
+        "images": [],
+    }
+
+    if Image is None:
+        stats["skipped"] = "未安装 Pillow，跳过预处理"
+        return parts, stats
+
+    output_format = str(output_format).lower()
+    if output_format not in PREPROCESS_FORMATS:
+        stats["error"] = f"不支持的预处理格式: {output_format}，可选值: {', '.join(PREPROCESS_FORMATS)}"
+        return parts, stats
+
+    options = (int(max_edge), output_format, int(quality))
+    executor = _get_executor(max_workers)
+
+    # 按内容哈希提交任务，同一请求内相同的图片共用一个任务
+    pending: Dict[str, Future] = {}
+    jobs = []
+    for part in parts:
+        if "inlineData" not in part:
+            jobs.append(None)
+            continue
+
+        data = part["inlineData"]["data"]
+        key = hash_bytes(data)
+        jobs.append(key)
+
+        if key in pending:
+            stats["deduplicated"] += 1
+            continue
+
+        with _recent_lock:
+            recent = _recent.get((key, options))
+            if recent is not None:
+                _recent.move_to_end((key, options))
+
+        future = Future()
+        if recent is not None:
+            stats["recent_hits"] += 1
+            future.set_result((*recent[:2], None, recent[2]))
+        else:
+            future = executor.submit(_process_one, data, *options)
+        pending[key] = future
+
+    new_parts = []
+    for idx, (part, key) in enumerate(zip(parts, jobs)):
+        if key is None:
+            new_parts.append(part)
+            continue
+
+        try:
+            data, mime_type, input_size, output_size = pending[key].result()
+        except DecompressionBombError as e:
+            # 像素过多，解码会占用大量内存：跳过预处理，原图交给上游处理
+            input_size = _raw_size(part["inlineData"]["data"])
+            stats["input_bytes"] += input_size
+            stats["output_bytes"] += input_size
+            stats["images"].append({
+                "index": idx,
+                "input_bytes": input_size,
+                "output_bytes": input_size,
+                "mime_type": part["inlineData"].get("mimeType"),
+                "skipped": str(e),
+            })
+            new_parts.append(part)
+            continue
+        except (UnidentifiedImageError, OSError, ValueError) as e:
+            reason = "无法识别的图片格式" if isinstance(e, UnidentifiedImageError) else str(e)
+            stats["error"] = f"第 {idx + 1} 张图片无法解析: {reason}"
+            return parts, stats
+
+        if input_size is None:
+            # 最近处理过的结果，不再解码输入
+            input_size = _raw_size(part["inlineData"]["data"])
+        else:
+            _remember((key, options), (data, mime_type, output_size), int(recent_entries), int(recent_max_bytes))
+
+        stats["input_bytes"] += input_size
+        stats["output_bytes"] += output_size
+        stats["images"].append({
+            "index": idx,
+            "input_bytes": input_size,
+            "output_bytes": output_size,
+            "mime_type": mime_type,
+        })
+        new_parts.append({"inlineData": {"mimeType": mime_type, "data": data}})
+
+    stats["elapsed_ms"] = round((time.monotonic() - started) * 1000, 1)
+    return new_parts, stats
@@ -0,0 +1,84 @@
+"""
+图片输入来源模块
+除了 Base64 字符串，还支持本地文件路径、URL 和 multipart 上传的文件；
+来源在构建上游请求时才读取，每张图片只读取和编码一次
+"""
+
+import mimetypes
+from pathlib import Path
+from typing import Callable, Optional
+
+from config_loader import DEFAULT_CONFIG, load_config
+from http_client import get_session
+from save_base64 import detect_file_type
+
+
+class ImageSource:
+    """
+    延迟读取的图片来源
+
+    to_inline_data() 读取原始字节作为请求体中的 inlineData，预处理直接使用这些字节，序列化请求体时才编码为 Base64
+    """
+
+    def __init__(self, reader: Callable[[], bytes], mime_type: Optional[str] = None, name: str = ""):
+        self._reader = reader
+        self.mime_type = mime_type
+        self.name = name
+
+    def _resolve_mime_type(self, raw: bytes) -> str:
+        if self.mime_type:
+            return self.mime_type
+
+        _, detected = detect_file_type(raw)
+        if detected.startswith("image/"):
+            return detected
+
+        guessed, _ = mimetypes.guess_type(self.name)
+        return guessed or "image/png"
+
+    def to_inline_data(self) -> dict:
+        raw = self._reader()
+        if not raw:
+            raise ValueError(f"图片内容为空: {self.name}")
+
+        return {
+            "mimeType": self._resolve_mime_type(raw),
+            "data": raw,
+        }
+
+    @classmethod
+    def from_path(cls, path: str, mime_type: Optional[str] = None) -> "ImageSource":
+        """本地文件"""
+        file_path = Path(path)
+        return cls(file_path.read_bytes, mime_type, file_path.name)
+
+    @classmethod
+    def from_url(cls, url: str, mime_type: Optional[str] = None) -> "ImageSource":
+        """HTTP(S) 地址，使用共享连接池下载"""
+        source = cls(lambda: b"", mime_type, url)
+
+        def read() -> bytes:
+            gemini_cfg = load_config().get("gemini", {})
+            defaults = DEFAULT_CONFIG["gemini"]
+            response = get_session("images").get(
+                url,
+                timeout=(
+                    gemini_cfg.get("connect_timeout", defaults["connect_timeout"]),
+                    gemini_cfg.get("read_timeout", defaults["read_timeout"]),
+                ),
+            )
+            response.raise_for_status()
+
+            content_type = response.headers.get("Content-Type", "").split(";")[0].strip()
+            if not source.mime_type and content_type.startswith("image/"):
+                source.mime_type = content_type
+            return response.content
+
+        source._reader = read
+        return source
+
+    @classmethod
+    def from_upload(cls, upload) -> "ImageSource":
+        """multipart 上传的文件（werkzeug FileStorage，大文件由 werkzeug 暂存在临时文件中）"""
+        mime_type = upload.mimetype if upload.mimetype and upload.mimetype.startswith("image/") else None
+        return cls(upload.stream.read, mime_type, upload.filename or "")
@@ -0,0 +1,120 @@
+"""
+限流模块
+令牌桶控制每分钟请求数，信号量控制同时在途的请求数，可按 API Key 分别限流
+"""
+
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict
+
+
+class RateLimiter:
+    """
+    单个上游的限流器
+
+    - requests_per_minute: 每分钟允许发起的请求数（令牌桶，允许约 1 秒的突发），<= 0 表示不限制
+    - max_in_flight: 同时在途的最大请求数，<= 0 表示不限制
+    """
+
+    def __init__(self, requests_per_minute: float = 0, max_in_flight: int = 0):
+        self.requests_per_minute = float(requests_per_minute or 0)
+        self.max_in_flight = int(max_in_flight or 0)
+
+        self._rate = self.requests_per_minute / 60.0
+        self._capacity = max(1.0, self._rate)
+        self._tokens = self._capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(self.max_in_flight) if self.max_in_flight > 0 else None
+
+        self._in_flight = 0
+        self._stats = {
+            "acquired": 0,
+            "waited": 0,
+            "wait_seconds": 0.0,
+        }
+
+    def _take_token(self) -> float:
+        """尝试取一个令牌，成功返回 0，否则返回需要等待的秒数"""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self._capacity, self._tokens + (now - self._updated) * self._rate)
+            self._updated = now
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return 0.0
+            return (1 - self._tokens) / self._rate
+
+    @contextmanager
+    def acquire(self):
+        """阻塞直到允许发起请求；退出上下文时释放在途名额"""
+        started = time.monotonic()
+
+        if self._slots is not None:
+            self._slots.acquire()
+
+        try:
+            if self._rate > 0:
+                while True:
+                    delay = self._take_token()
+                    if delay <= 0:
+                        break
+                    time.sleep(delay)
+
+            waited = time.monotonic() - started
+            with self._lock:
+                self._in_flight += 1
+                self._stats["acquired"] += 1
+                if waited > 0.001:
+                    self._stats["waited"] += 1
+                    self._stats["wait_seconds"] += waited
+        except BaseException:
+            if self._slots is not None:
+                self._slots.release()
+            raise
+
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._in_flight -= 1
+            if self._slots is not None:
+                self._slots.release()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "requests_per_minute": self.requests_per_minute,
+                "max_in_flight": self.max_in_flight,
+                "in_flight": self._in_flight,
+                **self._stats,
+                "wait_seconds": round(self._stats["wait_seconds"], 3),
+            }
+
+
+class KeyedRateLimiter:
+    """按键（如 API Key）分别维护限流器，每个键使用相同的额度"""
+
+    def __init__(self, requests_per_minute: float = 0, max_in_flight: int = 0):
+        self.requests_per_minute = requests_per_minute
+        self.max_in_flight = max_in_flight
+        self._limiters: Dict[str, RateLimiter] = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> RateLimiter:
+        with self._lock:
+            limiter = self._limiters.get(key)
+            if limiter is None:
+                limiter = RateLimiter(self.requests_per_minute, self.max_in_flight)
+                self._limiters[key] = limiter
+            return limiter
+
+    def acquire(self, key: str):
+        return self.get(key).acquire()
+
+    def stats(self) -> dict:
+        """返回各键的限流统计（键只显示末 4 位，避免泄露密钥）"""
+        with self._lock:
+            limiters = list(self._limiters.items())
+        return {f"...{key[-4:]}" if key else "default": limiter.stats() for key, limiter in limiters}
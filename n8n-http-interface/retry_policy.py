@@ -0,0 +1,302 @@
+"""
+上游请求重试模块
+按状态码决定是否重试，指数退避 + 随机抖动，总时限控制，可选对冲请求（慢请求超过观测到的 p95 延迟后并发补发一份）
+"""
+
+import math
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Any, Callable, Deque, Dict, Iterable, Optional, Tuple
+
+import requests
+
+# 可重试的网络异常
+RETRYABLE_EXCEPTIONS = (requests.exceptions.Timeout, requests.exceptions.ConnectionError)
+
+_hedge_executor: Optional[ThreadPoolExecutor] = None
+_hedge_executor_lock = threading.Lock()
+
+
+def _get_hedge_executor() -> ThreadPoolExecutor:
+    global _hedge_executor
+
+    with _hedge_executor_lock:
+        if _hedge_executor is None:
+            _hedge_executor = ThreadPoolExecutor(max_workers=32, thread_name_prefix="hedge")
+
+    return _hedge_executor
+
+
+def _close_quietly(future):
+    try:
+        future.result().close()
+    except Exception:
+        pass
+
+
+def _no_target():
+    return None
+
+
+def _without_target(send: Callable[[float], requests.Response]) -> Callable[[float, Any], requests.Response]:
+    """把只接收剩余时限的 send 包装为 send(remaining, target)"""
+    def send_to_target(remaining: float, target: Any) -> requests.Response:
+        return send(remaining)
+
+    return send_to_target
+
+
+def _latency_key(target: Any) -> str:
+    """延迟统计的键：目标的 name 属性（如上游名称），没有目标时为 default"""
+    return getattr(target, "name", None) or "default"
+
+
+class LatencyTracker:
+    """
+    按键（如上游名称）保存最近 window 次成功请求的耗时，用于计算对冲阈值
+
+    多个 RetryPolicy 共用同一个实例，线程安全
+    """
+
+    def __init__(self, window: int = 200):
+        self.window = max(1, int(window))
+        self._samples: Dict[str, Deque[float]] = {}
+        self._lock = threading.Lock()
+
+    def record(self, key: str, seconds: float):
+        with self._lock:
+            samples = self._samples.get(key)
+            if samples is None:
+                samples = deque(maxlen=self.window)
+                self._samples[key] = samples
+            samples.append(seconds)
+
+    def percentile(self, key: str, quantile: float, min_samples: int = 1) -> Optional[float]:
+        """返回 key 最近耗时的分位数（秒），样本数不足 min_samples 时返回 None"""
+        with self._lock:
+            samples = sorted(self._samples.get(key, ()))
+
+        if not samples or len(samples) < min_samples:
+            return None
+        index = min(len(samples) - 1, max(0, math.ceil(quantile * len(samples)) - 1))
+        return samples[index]
+
+    def stats(self) -> dict:
+        with self._lock:
+            keys = list(self._samples)
+        return {
+            key: {
+                "samples": len(self._samples.get(key, ())),
+                "p50_ms": round(self.percentile(key, 0.5) * 1000, 1),
+                "p95_ms": round(self.percentile(key, 0.95) * 1000, 1),
+            }
+            for key in keys
+        }
+
+
+class RetryPolicy:
+    """
+    重试策略
+
+    - max_attempts: 最多尝试次数（含首次）
+    - retry_statuses: 需要重试的 HTTP 状态码
+    - retry_on_timeout: 超时 / 连接错误是否重试
+    - backoff_base / backoff_max: 第 n 次重试前等待 [0, min(backoff_max, backoff_base * 2^(n-1))] 秒（全抖动）；
+      429/503 带 Retry-After 时取两者较大值
+    - deadline_seconds: 从首次请求开始的总时限，超出后不再重试，并据此收紧单次读取超时
+    - hedge_after_seconds: > 0 时启用对冲，单次请求超过对冲阈值仍未返回就补发一份，取先成功的结果；
+      对冲阈值为该目标最近成功请求耗时的 hedge_percentile 分位数（样本不少于 hedge_min_samples 时），
+      hedge_after_seconds 作为阈值下限，样本不足时直接使用
+    - latency: 记录各目标耗时的 LatencyTracker，不传时只使用 hedge_after_seconds
+    """
+
+    def __init__(
+        self,
+        max_attempts: int = 3,
+        retry_statuses: Iterable[int] = (429, 500, 502, 503, 504),
+        retry_on_timeout: bool = True,
+        backoff_base: float = 1.0,
+        backoff_max: float = 20.0,
+        deadline_seconds: float = 300,
+        hedge_after_seconds: float = 0,
+        hedge_percentile: float = 0.95,
+        hedge_min_samples: int = 20,
+        latency: Optional[LatencyTracker] = None,
+    ):
+        self.max_attempts = max(1, int(max_attempts))
+        self.retry_statuses = frozenset(int(status) for status in retry_statuses)
+        self.retry_on_timeout = bool(retry_on_timeout)
+        self.backoff_base = float(backoff_base)
+        self.backoff_max = float(backoff_max)
+        self.deadline_seconds = float(deadline_seconds)
+        self.hedge_after_seconds = float(hedge_after_seconds or 0)
+        self.hedge_percentile = min(1.0, max(0.0, float(hedge_percentile)))
+        self.hedge_min_samples = max(1, int(hedge_min_samples))
+        self.latency = latency
+
+    @classmethod
+    def from_config(cls, cfg: dict, latency: Optional[LatencyTracker] = None) -> "RetryPolicy":
+        params = {key: value for key, value in cfg.items() if key in cls.__init__.__code__.co_varnames}
+        params.pop("latency", None)
+        return cls(**params, latency=latency)
+
+    def hedge_threshold(self, target: Any = None) -> float:
+        """发往 target 的请求的对冲阈值（秒）：观测到的分位数延迟，不低于 hedge_after_seconds"""
+        observed = None
+        if self.latency is not None:
+            observed = self.latency.percentile(_latency_key(target), self.hedge_percentile, self.hedge_min_samples)
+        if observed is None:
+            return self.hedge_after_seconds
+        return max(self.hedge_after_seconds, observed)
+
+    def backoff(self, attempt: int, response: Optional[requests.Response] = None) -> float:
+        """第 attempt 次失败后的等待秒数"""
+        delay = random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** (attempt - 1))))
+
+        if response is not None:
+            retry_after = response.headers.get("Retry-After", "")
+            if retry_after.isdigit():
+                delay = max(delay, min(float(retry_after), self.backoff_max))
+
+        return delay
+
+    def _is_retryable(self, response: requests.Response) -> bool:
+        return response.status_code in self.retry_statuses
+
+    def _send_timed(
+        self,
+        send: Callable[[float, Any], requests.Response],
+        target: Any,
+        remaining: float,
+    ) -> requests.Response:
+        """发送一次请求，成功（不需要重试）时记录耗时"""
+        started = time.monotonic()
+        response = send(remaining, target)
+        if self.latency is not None and not self._is_retryable(response):
+            self.latency.record(_latency_key(target), time.monotonic() - started)
+        return response
+
+    def _send_hedged(
+        self,
+        send: Callable[[float, Any], requests.Response],
+        pick: Callable[[], Any],
+        remaining: float,
+    ) -> Tuple[requests.Response, bool, float]:
+        """发送一次请求，超过对冲阈值仍未返回时（向重新选择的目标）补发一份，返回 (响应, 是否发生对冲, 对冲阈值)"""
+        executor = _get_hedge_executor()
+        target = pick()
+        threshold = self.hedge_threshold(target)
+        primary = executor.submit(self._send_timed, send, target, remaining)
+
+        done, _ = wait([primary], timeout=threshold)
+        if done:
+            return primary.result(), False, threshold
+
+        hedge = executor.submit(self._send_timed, send, pick(), max(0.0, remaining - threshold))
+        pending = {primary, hedge}
+        last_error = None
+        last_response = None
+        winner = None
+
+        while pending and winner is None:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                try:
+                    response = future.result()
+                except Exception as e:
+                    last_error = e
+                    continue
+
+                if winner is None and not self._is_retryable(response):
+                    winner = response
+                    continue
+
+                # 同时完成的多余响应和被替换的可重试响应都要释放连接，只保留最后一个可重试响应备用
+                if winner is None:
+                    if last_response is not None:
+                        last_response.close()
+                    last_response = response
+                else:
+                    response.close()
+
+        if winner is not None:
+            if last_response is not None:
+                last_response.close()
+            # 已有结果，另一路完成后直接释放连接
+            for other in pending:
+                other.add_done_callback(_close_quietly)
+            return winner, True, threshold
+
+        if last_response is not None:
+            return last_response, True, threshold
+        raise last_error
+
+    def execute(
+        self,
+        send: Callable[..., requests.Response],
+        pick: Optional[Callable[[], Any]] = None,
+    ) -> Tuple[requests.Response, dict]:
+        """
+        按策略执行请求
+
+        Args:
+            send: 发送一次请求的函数，参数为剩余总时限（秒）；传入 pick 时还有第二个参数 target，返回 requests.Response
+            pick: 可选，每次尝试（含对冲）前调用一次选择目标（如负载均衡的上游），耗时按目标的 name 分别统计
+
+        Returns:
+            (最后一次响应, 元数据)；元数据包含 attempts、hedged、retries、elapsed_ms，启用对冲时还有 hedge_after_seconds。
+            重试用尽仍然抛出网络异常时，异常对象的 retry_meta 属性携带元数据。
+        """
+        if pick is None:
+            send, pick = _without_target(send), _no_target
+
+        started = time.monotonic()
+        meta = {"attempts": 0, "hedged": False, "retries": []}
+
+        attempt = 0
+        while True:
+            attempt += 1
+            meta["attempts"] = attempt
+            remaining = self.deadline_seconds - (time.monotonic() - started)
+
+            response = None
+            error = None
+            try:
+                if self.hedge_after_seconds > 0:
+                    response, hedged, threshold = self._send_hedged(send, pick, remaining)
+                    meta["hedged"] = meta["hedged"] or hedged
+                    meta["hedge_after_seconds"] = round(threshold, 3)
+                else:
+                    response = self._send_timed(send, pick(), remaining)
+            except RETRYABLE_EXCEPTIONS as e:
+                if not self.retry_on_timeout:
+                    raise
+                error = e
+
+            if response is not None and not self._is_retryable(response):
+                break
+
+            delay = self.backoff(attempt, response)
+            elapsed = time.monotonic() - started
+            if attempt >= self.max_attempts or elapsed + delay >= self.deadline_seconds:
+                if error is not None:
+                    meta["elapsed_ms"] = round(elapsed * 1000, 1)
+                    error.retry_meta = meta
+                    raise error
+                break
+
+            meta["retries"].append({
+                "attempt": attempt,
+                "status": response.status_code if response is not None else None,
+                "error": type(error).__name__ if error is not None else None,
+                "backoff_seconds": round(delay, 3),
+            })
+            if response is not None:
+                response.close()
+            time.sleep(delay)
+
+        meta["elapsed_ms"] = round((time.monotonic() - started) * 1000, 1)
+        return response, meta
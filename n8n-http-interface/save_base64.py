@@ -4,46 +4,73 @@ Base64 文件保存模块
 """
 
 import base64
+import json
+import re
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from typing import Tuple, Optional
+from typing import BinaryIO, List, Tuple, Optional
 
+from b64stream import Base64FileWriter, JsonStringFilter
+from config_loader import DEFAULT_CONFIG, load_config
+from content_store import commit_writer, save_bytes
+from file_allocator import allocate_numbered_path
 
-# 文件类型魔术字节签名
-FILE_SIGNATURES = {
+
+# 文件类型检测只查看开头这么多字节（流式保存时直接用第一块解码数据）
+SNIFF_BYTES = 512
+
+# 文件类型魔术字节签名：(签名, 扩展名, MIME类型)，签名都从文件开头匹配
+# RIFF / ftyp 容器按子类型进一步区分，见 RIFF_SUBTYPES / FTYP_BRANDS
+FILE_SIGNATURES = [
     # 图片格式
-    b'\xFF\xD8\xFF': ('jpg', 'image/jpeg'),
-    b'\x89PNG\r\n\x1a\n': ('png', 'image/png'),
-    b'GIF87a': ('gif', 'image/gif'),
-    b'GIF89a': ('gif', 'image/gif'),
-    b'RIFF': ('webp', 'image/webp'),  # 需要进一步检查
-    b'BM': ('bmp', 'image/bmp'),
-    b'\x00\x00\x01\x00': ('ico', 'image/x-icon'),
+    (b'\xFF\xD8\xFF', 'jpg', 'image/jpeg'),
+    (b'\x89PNG\r\n\x1a\n', 'png', 'image/png'),
+    (b'GIF87a', 'gif', 'image/gif'),
+    (b'GIF89a', 'gif', 'image/gif'),
+    (b'BM', 'bmp', 'image/bmp'),
+    (b'\x00\x00\x01\x00', 'ico', 'image/x-icon'),
     
     # 音频格式
-    b'ID3': ('mp3', 'audio/mpeg'),
-    b'\xFF\xFB': ('mp3', 'audio/mpeg'),
-    b'\xFF\xF3': ('mp3', 'audio/mpeg'),
-    b'\xFF\xF2': ('mp3', 'audio/mpeg'),
-    b'ftyp': ('mp4', 'audio/mp4'),  # MP4音频容器
-    b'RIFF': ('wav', 'audio/wav'),  # 需要进一步检查
-    b'OggS': ('ogg', 'audio/ogg'),
-    b'fLaC': ('flac', 'audio/flac'),
+    (b'ID3', 'mp3', 'audio/mpeg'),
+    (b'\xFF\xFB', 'mp3', 'audio/mpeg'),
+    (b'\xFF\xF3', 'mp3', 'audio/mpeg'),
+    (b'\xFF\xF2', 'mp3', 'audio/mpeg'),
+    (b'OggS', 'ogg', 'audio/ogg'),
+    (b'fLaC', 'flac', 'audio/flac'),
     
     # 视频格式
-    b'\x00\x00\x00\x18ftypmp4': ('mp4', 'video/mp4'),
-    b'\x00\x00\x00\x1Cftypmp4': ('mp4', 'video/mp4'),
-    b'\x1AE\xDF\xA3': ('webm', 'video/webm'),
-    b'FLV': ('flv', 'video/x-flv'),
+    (b'\x1AE\xDF\xA3', 'webm', 'video/webm'),
+    (b'FLV', 'flv', 'video/x-flv'),
     
     # 文档格式
-    b'%PDF': ('pdf', 'application/pdf'),
-    b'PK\x03\x04': ('zip', 'application/zip'),
-    
-    # 文本格式
-    b'{': ('json', 'application/json'),
-    b'<?xml': ('xml', 'application/xml'),
+    (b'%PDF', 'pdf', 'application/pdf'),
+    (b'PK\x03\x04', 'zip', 'application/zip'),
+]
+
+# RIFF 容器：偏移 8 处的 4 字节表示具体格式
+RIFF_SUBTYPES = {
+    b'WAVE': ('wav', 'audio/wav'),
+    b'WEBP': ('webp', 'image/webp'),
+    b'AVI ': ('avi', 'video/x-msvideo'),
 }
 
+# ISO 媒体容器：偏移 4 处为 ftyp，偏移 8 处的主品牌表示具体格式，未知品牌按 mp4 视频处理
+FTYP_BRANDS = {
+    b'M4A ': ('m4a', 'audio/mp4'),
+    b'M4B ': ('m4a', 'audio/mp4'),
+    b'qt  ': ('mov', 'video/quicktime'),
+    b'heic': ('heic', 'image/heic'),
+    b'heix': ('heic', 'image/heic'),
+    b'mif1': ('heic', 'image/heic'),
+    b'avif': ('avif', 'image/avif'),
+}
+
+# 按首字节索引签名表，同一首字节下长签名优先
+_SIGNATURE_INDEX = {}
+for _signature, _ext, _mime in sorted(FILE_SIGNATURES, key=lambda item: -len(item[0])):
+    _SIGNATURE_INDEX.setdefault(_signature[0], []).append((_signature, _ext, _mime))
+
 # MIME类型到文件扩展名的映射
 MIME_TO_EXTENSION = {
     # 图片格式
@@ -55,6 +82,8 @@ MIME_TO_EXTENSION = {
     'image/bmp': 'bmp',
     'image/x-icon': 'ico',
     'image/svg+xml': 'svg',
+    'image/heic': 'heic',
+    'image/avif': 'avif',
     
     # 音频格式
     'audio/mpeg': 'mp3',
@@ -92,45 +121,139 @@ MIME_TO_EXTENSION = {
 }
 
 
+def _sniff_text(head: bytes) -> Optional[Tuple[str, str]]:
+    """根据开头的一小段内容猜测文本格式，不是文本时返回 None"""
+    # 截断处可能正好切开一个多字节字符，只检查完整的部分
+    try:
+        text = head.decode('utf-8')
+    except UnicodeDecodeError as e:
+        if e.start < len(head) - 3:
+            return None
+        text = head[:e.start].decode('utf-8')
+    
+    # 含有控制字符的视为二进制
+    if any(ord(ch) < 32 and ch not in '\t\n\r\f' for ch in text):
+        return None
+    
+    text = text.lstrip('\ufeff \t\r\n').lower()
+    if text.startswith('{') or text.startswith('['):
+        return ('json', 'application/json')
+    elif text.startswith('<?xml'):
+        return ('xml', 'application/xml')
+    elif text.startswith('<!doctype html') or '<html' in text:
+        return ('html', 'text/html')
+    return ('txt', 'text/plain')
+
+
 def detect_file_type(data: bytes) -> Tuple[str, str]:
     """
     通过魔术字节检测文件类型
     
+    只查看开头 SNIFF_BYTES 字节，可以直接传入完整数据或流式解码的第一块数据
+    
     Args:
-        data: 文件的二进制数据
+        data: 文件的二进制数据（或其开头部分）
     
     Returns:
         (扩展名, MIME类型)
     """
-    # 检查文件签名
-    for signature, (ext, mime) in FILE_SIGNATURES.items():
-        if data.startswith(signature):
-            # 特殊处理 RIFF 格式（WAV 和 WEBP）
-            if signature == b'RIFF' and len(data) > 12:
-                if data[8:12] == b'WAVE':
-                    return ('wav', 'audio/wav')
-                elif data[8:12] == b'WEBP':
-                    return ('webp', 'image/webp')
+    head = bytes(data[:SNIFF_BYTES])
+    if not head:
+        return ('bin', 'application/octet-stream')
+    
+    # 容器格式按子类型区分
+    if head.startswith(b'RIFF') and len(head) >= 12:
+        subtype = RIFF_SUBTYPES.get(head[8:12])
+        if subtype:
+            return subtype
+    if head[4:8] == b'ftyp':
+        return FTYP_BRANDS.get(head[8:12], ('mp4', 'video/mp4'))
+    
+    # 检查文件签名（按首字节查表）
+    for signature, ext, mime in _SIGNATURE_INDEX.get(head[0], ()):
+        if head.startswith(signature):
             return (ext, mime)
     
     # 尝试检测文本格式
-    try:
-        text = data.decode('utf-8')
-        if text.strip().startswith('{') or text.strip().startswith('['):
-            return ('json', 'application/json')
-        elif text.strip().startswith('<?xml'):
-            return ('xml', 'application/xml')
-        elif text.strip().startswith('<!DOCTYPE html') or '<html' in text.lower():
-            return ('html', 'text/html')
-        else:
-            return ('txt', 'text/plain')
-    except:
-        pass
+    text_type = _sniff_text(head)
+    if text_type:
+        return text_type
     
     # 默认为二进制文件
     return ('bin', 'application/octet-stream')
 
 
+def _is_directory_path(output_path: Path) -> bool:
+    """路径是目录（没有文件名、以 / 结尾或没有扩展名）时自动生成按序编号的文件名"""
+    return output_path.is_dir() or str(output_path).endswith(('/','\\')) or not output_path.suffix
+
+
+def _output_directory(output_path: str) -> Path:
+    """返回文件最终所在的目录（用于放置同目录下的临时文件）"""
+    output_path = Path(output_path)
+    if _is_directory_path(output_path) and not output_path.is_file():
+        return output_path
+    return output_path.parent
+
+
+def _resolve_output_path(
+    output_path: str,
+    detected_ext: str,
+    detected_mime: str,
+    auto_extension: bool = True,
+    force_extension: Optional[str] = None,
+    mime_type: Optional[str] = None
+) -> Tuple[Path, str]:
+    """
+    确定最终的输出文件和 MIME 类型
+    
+    Returns:
+        (输出文件路径, MIME 类型)；目录路径时由编号分配器独占创建编号文件
+    """
+    # 处理输出路径
+    output_path = Path(output_path)
+    
+    # 确定最终的文件扩展名和 MIME 类型
+    final_extension = None
+    final_mime_type = detected_mime
+    
+    if force_extension:
+        # 优先使用强制指定的扩展名
+        final_extension = force_extension.lstrip('.')
+    elif mime_type:
+        # 如果提供了 MIME 类型参数，使用它来确定扩展名
+        final_mime_type = mime_type
+        final_extension = MIME_TO_EXTENSION.get(mime_type.lower(), detected_ext)
+    elif auto_extension:
+        # 使用自动检测的扩展名
+        final_extension = detected_ext
+    
+    # 如果是目录路径，自动生成按序编号的文件名
+    if _is_directory_path(output_path):
+        # 如果路径是一个已存在的文件，使用其父目录；否则当作目录处理
+        target_dir = output_path.parent if output_path.is_file() else output_path
+        
+        # 分配下一个编号的文件名：编号.扩展名（独占创建，并发保存不会互相覆盖）
+        output_path = allocate_numbered_path(target_dir, final_extension or "")
+    else:
+        # 如果是完整的文件路径，按原逻辑处理
+        # 如果需要添加扩展名
+        if final_extension and not output_path.suffix:
+            output_path = output_path.with_suffix(f'.{final_extension}')
+    
+    # 创建目标目录（如果不存在）
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    
+    return output_path, final_mime_type
+
+
+def _clean_base64(base64_data: str) -> str:
+    """移除可能的 data URL 前缀和所有空白字符（空格、换行、制表符等）"""
+    if ',' in base64_data and base64_data.startswith('data:'):
+        base64_data = base64_data.split(',', 1)[1]
+    return ''.join(base64_data.split())
+
+
 def save_base64_file_core(
     base64_data: str,
     output_path: str,
@@ -152,89 +275,235 @@ def save_base64_file_core(
         包含操作结果的字典
     """
     try:
-        # 移除可能的 data URL 前缀
-        if ',' in base64_data and base64_data.startswith('data:'):
-            base64_data = base64_data.split(',', 1)[1]
-        
-        # 清理 Base64 字符串：移除所有空白字符（空格、换行、制表符等）
-        base64_data = ''.join(base64_data.split())
-        
         # 解码 Base64
-        file_data = base64.b64decode(base64_data)
+        file_data = base64.b64decode(_clean_base64(base64_data))
         
         # 检测文件类型
         detected_ext, detected_mime = detect_file_type(file_data)
         
-        # 处理输出路径
-        output_path = Path(output_path)
-        
-        # 确定最终的文件扩展名和 MIME 类型
-        final_extension = None
-        final_mime_type = detected_mime
-        
-        if force_extension:
-            # 优先使用强制指定的扩展名
-            final_extension = force_extension.lstrip('.')
-        elif mime_type:
-            # 如果提供了 MIME 类型参数，使用它来确定扩展名
-            final_mime_type = mime_type
-            final_extension = MIME_TO_EXTENSION.get(mime_type.lower(), detected_ext)
-        elif auto_extension:
-            # 使用自动检测的扩展名
-            final_extension = detected_ext
-        
-        # 检查路径是否是目录（没有文件名或以/结尾）
-        # 如果是目录路径，自动生成按序编号的文件名
-        if output_path.is_dir() or str(output_path).endswith(('/','\\')) or not output_path.suffix:
-            # 确保目录存在
-            if output_path.is_file():
-                # 如果路径是一个已存在的文件，使用其父目录
-                target_dir = output_path.parent
-            else:
-                # 如果路径是目录或不存在，当作目录处理
-                target_dir = output_path
+        # 确定输出文件、扩展名和 MIME 类型
+        output_path, final_mime_type = _resolve_output_path(
+            output_path, detected_ext, detected_mime, auto_extension, force_extension, mime_type
+        )
+        
+        # 写入文件（开启去重时相同内容只存一份）
+        stored = save_bytes(file_data, output_path)
+        
+        file_size = len(file_data)
+        
+        return {
+            "success": True,
+            "file_path": str(output_path.absolute()),
+            "file_size": file_size,
+            "file_type": detected_ext,
+            "mime_type": final_mime_type,
+            "sha256": stored["sha256"],
+            "deduplicated": stored["deduplicated"],
+            "message": f"文件保存成功: {output_path.absolute()}"
+        }
+        
+    except base64.binascii.Error as e:
+        return {
+            "success": False,
+            "error": f"Base64 解码失败: {e}",
+            "invalid_request": True
+        }
+    except Exception as e:
+        import traceback
+        return {
+            "success": False,
+            "error": str(e),
+            "traceback": traceback.format_exc()
+        }
+
+
+
+# 流式保存时每次读取的字节数
+STREAM_CHUNK_SIZE = 64 * 1024
+
+# 请求体超过该大小时 HTTP 接口自动走流式保存
+STREAM_THRESHOLD_BYTES = 8 * 1024 * 1024
+
+# data URL 前缀最长保留的字节数（data:<mime>;base64,）
+_DATA_URL_MAX_PREFIX = 1024
+
+_DATA_FIELD_PATTERN = re.compile(rb'"data"\s*:\s*"')
+_PATH_FIELD_PATTERN = re.compile(rb'"path"\s*:\s*("(?:[^"\\]|\\.)*")')
+
+
+class _DataUrlStripper:
+    """去掉 Base64 内容开头可能的 data URL 前缀（data:...;base64,），其余内容原样交给写入器"""
+    
+    def __init__(self, writer: Base64FileWriter):
+        self.writer = writer
+        self._lead: Optional[bytes] = b""
+    
+    def feed(self, data: bytes):
+        if self._lead is None:
+            self.writer.feed(data)
+            return
+        
+        lead = self._lead + data
+        if b"data:".startswith(lead[:5]) and b"," not in lead and len(lead) < _DATA_URL_MAX_PREFIX:
+            # 还不能确定是否是 data URL，继续累积
+            self._lead = lead
+            return
+        
+        self._lead = None
+        if lead.startswith(b"data:") and b"," in lead:
+            lead = lead.split(b",", 1)[1]
+        self.writer.feed(lead)
+    
+    def flush(self):
+        if self._lead and not self._lead.startswith(b"data:"):
+            self.writer.feed(self._lead)
+        self._lead = None
+
+
+def save_base64_stream_core(
+    stream: BinaryIO,
+    output_path: Optional[str] = None,
+    auto_extension: bool = True,
+    force_extension: Optional[str] = None,
+    mime_type: Optional[str] = None,
+    json_body: bool = True,
+    chunk_size: int = STREAM_CHUNK_SIZE
+) -> dict:
+    """
+    流式保存 Base64 数据到文件（核心函数）
+    
+    从 stream 分块读取，按 4 字节对齐边解码边写入目标目录下的临时文件，完成后原子重命名；
+    内存占用与数据大小无关。
+    
+    Args:
+        stream: 可读的二进制流（如 HTTP 请求体）
+        output_path: 输出文件路径（可选，json_body=True 时请求体中的 path 字段优先）
+        auto_extension / force_extension / mime_type: 同 save_base64_file_core，请求体中的
+                                                       auto_extension / force_ext / mime_type 字段优先
+        json_body: True 表示流内容是 {"data": "...", "path": "...", ...} 形式的 JSON，只有 data 字段被流式处理；
+                   False 表示流内容就是 Base64 文本（可以带 data URL 前缀）
+        chunk_size: 每次读取的字节数
+    
+    Returns:
+        包含操作结果的字典
+    """
+    writer = None
+    
+    try:
+        prefix = b""
+        rest = b""
+        
+        if json_body:
+            # 读到 data 字段开始为止（之前的部分很小）
+            while True:
+                match = _DATA_FIELD_PATTERN.search(prefix)
+                if match:
+                    break
+                chunk = stream.read(chunk_size)
+                if not chunk:
+                    return {
+                        "success": False,
+                        "error": "缺少必需参数: data",
+                        "invalid_request": True
+                    }
+                prefix += chunk
             
-            # 创建目录（如果不存在）
-            target_dir.mkdir(parents=True, exist_ok=True)
+            prefix, rest = prefix[:match.end()], prefix[match.end():]
             
-            # 获取目录中已有的文件数量
-            existing_files = list(target_dir.iterdir())
-            file_count = len([f for f in existing_files if f.is_file()])
+            # data 之前已经出现 path 时，临时文件直接放在目标目录，完成后可以原子重命名
+            path_match = _PATH_FIELD_PATTERN.search(prefix)
+            if path_match:
+                output_path = json.loads(path_match.group(1))
+        
+        temp_dir = _output_directory(output_path) if output_path else Path(tempfile.gettempdir())
+        writer = Base64FileWriter(temp_dir)
+        stripper = _DataUrlStripper(writer)
+        json_filter = JsonStringFilter() if json_body else None
+        
+        # 流式解码 data 的值
+        chunk = rest
+        while True:
+            if not chunk:
+                chunk = stream.read(chunk_size)
+                if not chunk:
+                    if json_body:
+                        return {
+                            "success": False,
+                            "error": "请求体 JSON 格式不正确: data 字段没有结束",
+                            "invalid_request": True
+                        }
+                    break
             
-            # 生成新的编号（从1开始）
-            next_number = file_count + 1
+            if json_filter is None:
+                stripper.feed(chunk)
+                chunk = b""
+                continue
             
-            # 生成新的文件名：编号.扩展名
-            new_filename = f"{next_number}.{final_extension}" if final_extension else str(next_number)
-            output_path = target_dir / new_filename
-        else:
-            # 如果是完整的文件路径，按原逻辑处理
-            # 如果需要添加扩展名
-            if final_extension and not output_path.suffix:
-                output_path = output_path.with_suffix(f'.{final_extension}')
-        
-        # 创建目标目录（如果不存在）
-        output_path.parent.mkdir(parents=True, exist_ok=True)
-        
-        # 写入文件
-        with open(output_path, 'wb') as f:
-            f.write(file_data)
+            content, end = json_filter.feed(chunk)
+            stripper.feed(content)
+            if end >= 0:
+                rest = chunk[end:]
+                break
+            chunk = b""
         
-        file_size = len(file_data)
+        stripper.flush()
+        writer.finish()
+        
+        if json_body:
+            # 其余字段：把 data 替换为空字符串后解析（不含 data 的部分很小）
+            remainder = [rest]
+            while True:
+                chunk = stream.read(chunk_size)
+                if not chunk:
+                    break
+                remainder.append(chunk)
+            
+            try:
+                fields = json.loads(prefix + b"".join(remainder))
+            except ValueError as e:
+                return {
+                    "success": False,
+                    "error": f"请求体 JSON 格式不正确: {e}",
+                    "invalid_request": True
+                }
+            
+            output_path = fields.get("path", output_path)
+            force_extension = fields.get("force_ext", force_extension)
+            auto_extension = fields.get("auto_extension", auto_extension)
+            mime_type = fields.get("mime_type", mime_type)
+        
+        if not output_path:
+            return {
+                "success": False,
+                "error": "缺少必需参数: path",
+                "invalid_request": True
+            }
+        
+        # 检测文件类型（只需要文件头）
+        detected_ext, detected_mime = detect_file_type(writer.head)
+        
+        output_path, final_mime_type = _resolve_output_path(
+            output_path, detected_ext, detected_mime, auto_extension, force_extension, mime_type
+        )
+        stored = commit_writer(writer, output_path)
         
         return {
             "success": True,
             "file_path": str(output_path.absolute()),
-            "file_size": file_size,
+            "file_size": writer.bytes_written,
             "file_type": detected_ext,
             "mime_type": final_mime_type,
+            "sha256": stored["sha256"],
+            "deduplicated": stored["deduplicated"],
+            "streamed": True,
             "message": f"文件保存成功: {output_path.absolute()}"
         }
         
     except base64.binascii.Error as e:
         return {
             "success": False,
-            "error": f"Base64 解码失败: {e}"
+            "error": f"Base64 解码失败: {e}",
+            "invalid_request": True
         }
     except Exception as e:
         import traceback
@@ -243,4 +512,150 @@ def save_base64_file_core(
             "error": str(e),
             "traceback": traceback.format_exc()
         }
+    finally:
+        if writer is not None:
+            writer.abort()
+
+
+
+# 批量保存时各项可单独指定的参数（未指定时使用批量请求中的同名参数）
+BATCH_ITEM_FIELDS = ('path', 'force_ext', 'auto_extension', 'mime_type')
+
+# 检测文件类型需要解码的 Base64 字符数（覆盖 SNIFF_BYTES 字节）
+_SNIFF_BASE64_CHARS = (SNIFF_BYTES + 2) // 3 * 4
+
+
+def _decode_head(base64_data: str) -> bytes:
+    """只解码 Base64 开头足够检测文件类型的部分"""
+    if base64_data.startswith('data:') and ',' in base64_data[:_DATA_URL_MAX_PREFIX]:
+        base64_data = base64_data.split(',', 1)[1]
+    
+    # 开头可能夹杂换行等空白，不够时扩大截取范围
+    take = _SNIFF_BASE64_CHARS
+    while True:
+        head = ''.join(base64_data[:take].split())
+        if len(head) >= _SNIFF_BASE64_CHARS or take >= len(base64_data):
+            break
+        take *= 2
+    
+    head = head[:_SNIFF_BASE64_CHARS]
+    return base64.b64decode(head[:len(head) - len(head) % 4])
+
+
+def _save_batch_item(base64_data: str, output_path: Path, numbered: bool, detected_ext: str, final_mime_type: str) -> dict:
+    """解码并写入批量中的一项（在线程池中执行）"""
+    try:
+        file_data = base64.b64decode(_clean_base64(base64_data))
+        stored = save_bytes(file_data, output_path)
+    except Exception as e:
+        # 放弃已分配的编号文件，不留下空文件
+        if numbered:
+            try:
+                output_path.unlink()
+            except OSError:
+                pass
+        if isinstance(e, base64.binascii.Error):
+            return {
+                "success": False,
+                "error": f"Base64 解码失败: {e}"
+            }
+        return {
+            "success": False,
+            "error": str(e)
+        }
+    
+    return {
+        "success": True,
+        "file_path": str(output_path.absolute()),
+        "file_size": len(file_data),
+        "file_type": detected_ext,
+        "mime_type": final_mime_type,
+        "sha256": stored["sha256"],
+        "deduplicated": stored["deduplicated"],
+        "message": f"文件保存成功: {output_path.absolute()}"
+    }
 
+
+def save_base64_batch_core(
+    items: List[dict],
+    defaults: Optional[dict] = None,
+    max_workers: Optional[int] = None
+) -> dict:
+    """
+    批量保存 Base64 数据（核心函数）
+    
+    - 按输入顺序只解码每项开头的一小段来检测文件类型并分配文件名，保存到同一目录的各项编号与输入顺序一致
+    - 完整的解码和写入在线程池中并行执行，同时在解码的数据最多 max_workers 份
+    - 单项失败不影响其他项
+    
+    Args:
+        items: 每项 {"data": "...", "path": "...", "force_ext": ..., "auto_extension": ..., "mime_type": ...}
+        defaults: 各项缺省时使用的公共参数（path / force_ext / auto_extension / mime_type）
+        max_workers: 并行线程数（可选，不传则读取 config.json 的 storage.batch_max_workers）
+    
+    Returns:
+        {"success": True, "total", "succeeded", "failed", "results"}，results 与输入顺序一致，每项包含 index
+        及 save_base64_file_core 的结果字段
+    """
+    defaults = defaults or {}
+    if max_workers is None:
+        max_workers = load_config().get("storage", {}).get(
+            "batch_max_workers", DEFAULT_CONFIG["storage"]["batch_max_workers"]
+        )
+    max_workers = max(1, min(int(max_workers), len(items) or 1))
+    
+    total = len(items)
+    results: List[Optional[dict]] = [None] * total
+    futures = {}
+    
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="save-base64") as executor:
+        for index, item in enumerate(items):
+            if not isinstance(item, dict):
+                results[index] = {"index": index, "success": False, "error": "每一项必须是对象"}
+                continue
+            
+            params = {key: defaults[key] for key in BATCH_ITEM_FIELDS if key in defaults}
+            params.update({key: item[key] for key in BATCH_ITEM_FIELDS if key in item})
+            
+            base64_data = item.get('data')
+            if not isinstance(base64_data, str) or not base64_data:
+                results[index] = {"index": index, "success": False, "error": "缺少必需参数: data"}
+                continue
+            if not params.get('path'):
+                results[index] = {"index": index, "success": False, "error": "缺少必需参数: path"}
+                continue
+            
+            # 在提交线程中按顺序分配文件名
+            try:
+                detected_ext, detected_mime = detect_file_type(_decode_head(base64_data))
+                numbered = _is_directory_path(Path(params['path']))
+                output_path, final_mime_type = _resolve_output_path(
+                    params['path'],
+                    detected_ext,
+                    detected_mime,
+                    params.get('auto_extension', True),
+                    params.get('force_ext'),
+                    params.get('mime_type')
+                )
+            except base64.binascii.Error as e:
+                results[index] = {"index": index, "success": False, "error": f"Base64 解码失败: {e}"}
+                continue
+            except Exception as e:
+                results[index] = {"index": index, "success": False, "error": str(e)}
+                continue
+            
+            futures[index] = executor.submit(
+                _save_batch_item, base64_data, output_path, numbered, detected_ext, final_mime_type
+            )
+        
+        for index, future in futures.items():
+            results[index] = {"index": index, **future.result()}
+    
+    succeeded = sum(1 for result in results if result["success"])
+    return {
+        "success": True,
+        "total": total,
+        "succeeded": succeeded,
+        "failed": total - succeeded,
+        "results": results
+    }
@@ -0,0 +1,105 @@
+"""
+SRT 字幕解析模块
+单次线性扫描解析 SRT，逐条产出带时间轴的字幕片段，并按需渲染为纯文本 / WebVTT
+"""
+
+import io
+import re
+from typing import Iterable, Iterator, NamedTuple
+
+TIMING_PATTERN = re.compile(
+    r"(\d+):(\d{1,2}):(\d{1,2})[,.](\d{1,3})\s*-->\s*(\d+):(\d{1,2}):(\d{1,2})[,.](\d{1,3})"
+)
+
+
+class SrtSegment(NamedTuple):
+    """一条字幕"""
+    index: int
+    start_ms: int
+    end_ms: int
+    text: str
+
+
+def _to_ms(hours: str, minutes: str, seconds: str, millis: str) -> int:
+    return ((int(hours) * 60 + int(minutes)) * 60 + int(seconds)) * 1000 + int(millis.ljust(3, "0"))
+
+
+def iter_srt_segments(srt_content: str) -> Iterator[SrtSegment]:
+    """
+    逐条解析 SRT 字幕（生成器）
+
+    只扫描一遍输入，不会整体切分成行列表。纯数字行只有紧跟时间轴行时才视为序号，
+    否则作为字幕正文保留（如字幕内容本身就是 "42"）。缺少序号的条目按出现顺序编号。
+    """
+    if not srt_content:
+        return
+
+    index = None
+    start_ms = end_ms = 0
+    text_lines: list = []
+    # 待定的纯数字行：下一行是时间轴则为序号，否则是正文
+    pending_number = None
+    count = 0
+
+    for raw_line in io.StringIO(srt_content):
+        line = raw_line.lstrip("\ufeff").strip()
+
+        match = TIMING_PATTERN.match(line) if "-->" in line else None
+        if match:
+            if index is not None:
+                yield SrtSegment(index, start_ms, end_ms, "\n".join(text_lines))
+
+            count += 1
+            index = int(pending_number) if pending_number is not None else count
+            start_ms = _to_ms(*match.group(1, 2, 3, 4))
+            end_ms = _to_ms(*match.group(5, 6, 7, 8))
+            text_lines = []
+            pending_number = None
+            continue
+
+        if pending_number is not None:
+            if index is not None:
+                text_lines.append(pending_number)
+            pending_number = None
+
+        if not line:
+            continue
+
+        if line.isdigit():
+            pending_number = line
+        elif index is not None:
+            text_lines.append(line)
+
+    if pending_number is not None and index is not None:
+        text_lines.append(pending_number)
+    if index is not None:
+        yield SrtSegment(index, start_ms, end_ms, "\n".join(text_lines))
+
+
+def parse_srt_to_text(srt_content: str) -> str:
+    """将 SRT 格式字幕转换为纯文本（去除序号和时间戳）"""
+    return "\n".join(segment.text for segment in iter_srt_segments(srt_content) if segment.text)
+
+
+def segments_to_dicts(segments: Iterable[SrtSegment]) -> list:
+    """转换为可 JSON 序列化的字典列表"""
+    return [segment._asdict() for segment in segments]
+
+
+def _format_timestamp(ms: int, separator: str) -> str:
+    hours, ms = divmod(ms, 3600000)
+    minutes, ms = divmod(ms, 60000)
+    seconds, ms = divmod(ms, 1000)
+    return f"{hours:02d}:{minutes:02d}:{seconds:02d}{separator}{ms:03d}"
+
+
+def format_vtt(segments: Iterable[SrtSegment]) -> str:
+    """渲染为 WebVTT 文本"""
+    out = io.StringIO()
+    out.write("WEBVTT\n\n")
+    for segment in segments:
+        out.write(
+            f"{_format_timestamp(segment.start_ms, '.')} --> {_format_timestamp(segment.end_ms, '.')}\n"
+            f"{segment.text}\n\n"
+        )
+    return out.getvalue()
@@ -0,0 +1,218 @@
+"""
+字幕结果缓存模块
+以规范化的 BV 号为键缓存 subtitleExtract 响应：内存 LRU + 可选的 SQLite 磁盘层，支持 TTL 和命中统计
+"""
+
+import asyncio
+import copy
+import json
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Optional
+from urllib.parse import parse_qs, urlsplit
+
+from config_loader import DEFAULT_CONFIG, load_config, resolve_path
+
+BV_PATTERN = re.compile(r"BV[0-9A-Za-z]{10}")
+
+
+def normalize_bv_id(video_url: str) -> Optional[str]:
+    """
+    从视频链接或 BV 号中提取缓存键
+
+    链接和裸 BV 号映射为同一个键；多 P 视频的 p>1 分P 会附加 ":p<N>" 后缀。
+    无法识别 BV 号时返回 None（不缓存）。
+    """
+    if not video_url:
+        return None
+
+    match = BV_PATTERN.search(video_url)
+    if not match:
+        return None
+
+    key = match.group(0)
+    page = parse_qs(urlsplit(video_url).query).get("p", ["1"])[0]
+    if page.isdigit() and int(page) > 1:
+        key = f"{key}:p{int(page)}"
+    return key
+
+
+class SubtitleCache:
+    """
+    两级字幕缓存
+
+    - 内存层：OrderedDict 实现的 LRU，最多 max_entries 条
+    - 磁盘层：可选的 SQLite 文件，服务重启后仍然有效
+    - 两层共用同一个 TTL，过期条目在读取时清除
+    - 在事件循环中使用 get_async / set_async，SQLite 读写在线程中执行
+    """
+
+    def __init__(self, max_entries: int = 512, ttl_seconds: float = 86400, db_path: Optional[str] = None):
+        self.max_entries = max(1, int(max_entries))
+        self.ttl_seconds = float(ttl_seconds)
+        self.db_path = db_path or None
+
+        self._memory: "OrderedDict[str, tuple[float, dict]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._db: Optional[sqlite3.Connection] = None
+
+        self._stats = {
+            "hits": 0,
+            "memory_hits": 0,
+            "disk_hits": 0,
+            "misses": 0,
+            "expired": 0,
+            "stores": 0,
+        }
+
+        if self.db_path:
+            self.db_path = str(resolve_path(self.db_path))
+            Path(self.db_path).parent.mkdir(parents=True, exist_ok=True)
+            self._db = sqlite3.connect(self.db_path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS subtitle_cache ("
+                "key TEXT PRIMARY KEY, expires_at REAL NOT NULL, value TEXT NOT NULL)"
+            )
+            self._db.commit()
+
+    def _remember(self, key: str, expires_at: float, value: dict):
+        self._memory[key] = (expires_at, value)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def _get_memory(self, key: str, now: float) -> Optional[dict]:
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is None:
+                return None
+
+            expires_at, value = entry
+            if expires_at > now:
+                self._memory.move_to_end(key)
+                self._stats["hits"] += 1
+                self._stats["memory_hits"] += 1
+                return copy.deepcopy(value)
+            del self._memory[key]
+            self._stats["expired"] += 1
+            return None
+
+    def _get_disk(self, key: str, now: float) -> Optional[dict]:
+        """读取磁盘层（内存层未命中之后），未命中时计入 misses"""
+        with self._lock:
+            if self._db is not None:
+                row = self._db.execute(
+                    "SELECT expires_at, value FROM subtitle_cache WHERE key = ?", (key,)
+                ).fetchone()
+                if row is not None:
+                    expires_at, raw = row
+                    if expires_at > now:
+                        value = json.loads(raw)
+                        self._remember(key, expires_at, value)
+                        self._stats["hits"] += 1
+                        self._stats["disk_hits"] += 1
+                        return copy.deepcopy(value)
+                    self._db.execute("DELETE FROM subtitle_cache WHERE key = ?", (key,))
+                    self._db.commit()
+                    self._stats["expired"] += 1
+
+            self._stats["misses"] += 1
+            return None
+
+    def get(self, key: str) -> Optional[dict]:
+        """读取缓存，返回副本；未命中或已过期返回 None"""
+        now = time.time()
+        value = self._get_memory(key, now)
+        if value is None:
+            value = self._get_disk(key, now)
+        return value
+
+    async def get_async(self, key: str) -> Optional[dict]:
+        """在事件循环中读取缓存：内存层直接读取，SQLite 查询放到线程中执行，不阻塞事件循环"""
+        now = time.time()
+        value = self._get_memory(key, now)
+        if value is None:
+            if self._db is None:
+                value = self._get_disk(key, now)
+            else:
+                value = await asyncio.to_thread(self._get_disk, key, now)
+        return value
+
+    def _set_memory(self, key: str, value: dict) -> float:
+        """写入内存层（保存副本），返回过期时间"""
+        expires_at = time.time() + self.ttl_seconds
+        with self._lock:
+            self._remember(key, expires_at, copy.deepcopy(value))
+            self._stats["stores"] += 1
+        return expires_at
+
+    def _set_disk(self, key: str, expires_at: float, raw: str):
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO subtitle_cache (key, expires_at, value) VALUES (?, ?, ?)",
+                (key, expires_at, raw),
+            )
+            self._db.commit()
+
+    def set(self, key: str, value: dict):
+        """写入缓存（保存副本，调用方之后修改 value 不影响缓存）"""
+        expires_at = self._set_memory(key, value)
+        if self._db is not None:
+            self._set_disk(key, expires_at, json.dumps(value, ensure_ascii=False))
+
+    async def set_async(self, key: str, value: dict):
+        """在事件循环中写入缓存：内存层直接写入，SQLite 写入放到线程中执行"""
+        expires_at = self._set_memory(key, value)
+        if self._db is not None:
+            # 先序列化，之后调用方修改 value 不影响写入的内容
+            raw = json.dumps(value, ensure_ascii=False)
+            await asyncio.to_thread(self._set_disk, key, expires_at, raw)
+
+    def clear(self):
+        """清空内存层和磁盘层"""
+        with self._lock:
+            self._memory.clear()
+            if self._db is not None:
+                self._db.execute("DELETE FROM subtitle_cache")
+                self._db.commit()
+
+    def stats(self) -> dict:
+        """返回命中统计"""
+        with self._lock:
+            lookups = self._stats["hits"] + self._stats["misses"]
+            return {
+                "memory_entries": len(self._memory),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl_seconds,
+                "disk_enabled": self._db is not None,
+                "hit_rate": round(self._stats["hits"] / lookups, 4) if lookups else 0.0,
+                **self._stats,
+            }
+
+
+_CACHE: Optional[SubtitleCache] = None
+_CACHE_LOCK = threading.Lock()
+
+
+def get_subtitle_cache() -> Optional[SubtitleCache]:
+    """返回进程级共享的字幕缓存；config.json 中关闭缓存时返回 None"""
+    global _CACHE
+
+    cfg = load_config().get("bilibili", {}).get("cache", {})
+    defaults = DEFAULT_CONFIG["bilibili"]["cache"]
+    if not cfg.get("enabled", defaults["enabled"]):
+        return None
+
+    with _CACHE_LOCK:
+        if _CACHE is None:
+            _CACHE = SubtitleCache(
+                max_entries=cfg.get("max_entries", defaults["max_entries"]),
+                ttl_seconds=cfg.get("ttl_seconds", defaults["ttl_seconds"]),
+                db_path=cfg.get("db_path", defaults["db_path"]),
+            )
+
+    return _CACHE
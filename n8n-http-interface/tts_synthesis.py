@@ -4,25 +4,171 @@ TTS 语音合成模块
 """
 
 import os
+import shutil
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
+from typing import Optional
 from openai import OpenAI
 
+from blob_cache import DiskLRUCache, hash_json
+from config_loader import DEFAULT_CONFIG, load_config
+from content_store import ingest_file
+from rate_limiter import KeyedRateLimiter
 
-def tts_synthesis_core(text_dict, prompt_audio_url, save_path, api_key):
+# 结果缓存模式：bypass 不读也不写；use 命中直接复用，未命中时合成并写入；refresh 忽略已有缓存，重新合成并覆盖
+CACHE_MODES = ("bypass", "use", "refresh")
+
+_rate_limiter: Optional[KeyedRateLimiter] = None
+_rate_limiter_lock = threading.Lock()
+_audio_cache: Optional[DiskLRUCache] = None
+_audio_cache_lock = threading.Lock()
+
+
+def _tts_config_value(key: str):
+    return load_config().get("tts", {}).get(key, DEFAULT_CONFIG["tts"][key])
+
+
+def _get_rate_limiter() -> KeyedRateLimiter:
+    """按 API Key 限流的共享调度器（每分钟请求数 + 在途请求数），所有 TTS 请求共用"""
+    global _rate_limiter
+    
+    with _rate_limiter_lock:
+        if _rate_limiter is None:
+            _rate_limiter = KeyedRateLimiter(
+                requests_per_minute=_tts_config_value("requests_per_minute"),
+                max_in_flight=_tts_config_value("max_in_flight"),
+            )
+    
+    return _rate_limiter
+
+
+def rate_limit_stats() -> dict:
+    """返回 TTS 各 API Key 的限流统计"""
+    return _get_rate_limiter().stats()
+
+
+def _get_audio_cache() -> DiskLRUCache:
+    """进程级共享的 TTS 音频缓存"""
+    global _audio_cache
+    
+    with _audio_cache_lock:
+        if _audio_cache is None:
+            cfg = _tts_config_value("cache")
+            defaults = DEFAULT_CONFIG["tts"]["cache"]
+            _audio_cache = DiskLRUCache(
+                cfg.get("dir", defaults["dir"]),
+                max_bytes=cfg.get("max_bytes", defaults["max_bytes"]),
+            )
+    
+    return _audio_cache
+
+
+def audio_cache_stats() -> dict:
+    """返回 TTS 音频缓存的统计"""
+    return _get_audio_cache().stats()
+
+
+def _resolve_cache_mode(cache: Optional[str]) -> str:
+    if cache is None:
+        cache = _tts_config_value("cache").get("default_mode", DEFAULT_CONFIG["tts"]["cache"]["default_mode"])
+    return str(cache).lower()
+
+
+def _materialize(source: Path, output_file: Path) -> bool:
+    """
+    把 source 复制到 output_file；失败（如缓存条目刚被淘汰）返回 False
+    
+    始终复制而不是硬链接：缓存条目与用户文件共用 inode 时，原地修改输出文件会同时改坏缓存
+    """
+    temp_file = output_file.with_name(f".{output_file.name}.{uuid.uuid4().hex}.part")
+    
+    try:
+        shutil.copyfile(source, temp_file)
+        os.replace(temp_file, output_file)
+        return True
+    except OSError:
+        return False
+    finally:
+        if temp_file.exists():
+            temp_file.unlink()
+
+
+def _synthesize_line(client, text_content, prompt_audio_url, output_file, api_key, cache_mode="bypass"):
+    """
+    合成一行文案并保存到 output_file
+    
+    音频先写入同目录的临时文件，完成后重命名，失败时不会留下半截文件；
+    按 cache_mode 读写音频缓存，缓存键包含文案、提示音频、模型、音色和情感参数
+    """
+    request_params = {
+        "input": text_content,
+        "model": _tts_config_value("model"),
+        "extra_body": {
+            "prompt_audio_url": prompt_audio_url,
+            "prompt_text": "",  # 可以根据需要调整
+            "emo_text": "",
+            "use_emo_text": False,
+        },
+        "voice": "alloy",
+    }
+    cache_key = hash_json(request_params) if cache_mode != "bypass" else None
+    
+    # 命中缓存时直接放到目标位置，不调用 API
+    if cache_mode == "use":
+        cached = _get_audio_cache().get_path(cache_key)
+        if cached is not None and _materialize(cached, output_file):
+            return {**ingest_file(output_file), "cache_hit": True, "reused": False}
+    
+    temp_file = output_file.with_name(f".{output_file.name}.{uuid.uuid4().hex}.part")
+    
+    try:
+        # 调用 TTS API（按 API Key 限流）
+        with _get_rate_limiter().acquire(api_key):
+            response = client.audio.speech.create(**request_params)
+            
+            # 保存音频文件
+            response.stream_to_file(str(temp_file))
+        
+        os.replace(temp_file, output_file)
+    finally:
+        if temp_file.exists():
+            temp_file.unlink()
+    
+    if cache_key is not None:
+        _get_audio_cache().put(cache_key, output_file.read_bytes(), {"model": request_params["model"]})
+    
+    # 开启去重时内容相同的音频只存一份
+    return {**ingest_file(output_file), "cache_hit": False, "reused": False}
+
+
+def tts_synthesis_core(text_dict, prompt_audio_url, save_path, api_key, max_workers=None, cache=None):
     """
     TTS 语音合成核心函数
     
+    各行文案在线程池中并发合成（按 API Key 限流），文件名按文案顺序固定为 1.mp3、2.mp3……
+    某一行失败不影响其他行继续合成，失败信息在 results 中逐行返回；只要有一行失败，success 即为 False 并带 partial 标记
+    
     参数:
         text_dict: 包含 "自述文案" 键的字典，值为字符串数组
         prompt_audio_url: 提示音频的URL
         save_path: 保存路径
         api_key: API密钥
+        max_workers: 并发合成的行数（可选，不传则读取 config.json 的 tts.max_workers）
+        cache: 音频缓存模式 bypass / use / refresh（可选，不传则读取 config.json 的 tts.cache.default_mode）
     
     返回:
         {
-            "success": True/False,
+            "success": True/False,  # 所有行都成功才为 True
+            "partial": True/False,  # 部分行成功、部分行失败
             "message": "处理信息",
-            "files": ["生成的文件路径列表"],
+            "files": ["生成的文件路径列表（按文案顺序，只含成功的行）"],
+            "results": [{"index": 1, "success": True, "file": "文件路径", "sha256": "内容哈希", "deduplicated": False, "cache_hit": False, "reused": False}],
+            "succeeded": 成功行数,
+            "failed": 失败行数,
+            "cache_hits": 命中缓存的行数,
+            "reused": 复用同一请求中相同文案音频的行数,
             "error": "错误信息（如果有）"
         }
     """
@@ -54,58 +200,82 @@ def tts_synthesis_core(text_dict, prompt_audio_url, save_path, api_key):
                 "error": "'自述文案' 列表不能为空"
             }
         
+        cache_mode = _resolve_cache_mode(cache)
+        if cache_mode not in CACHE_MODES:
+            return {
+                "success": False,
+                "error": f"不支持的 cache 模式: {cache_mode}，可选值: {', '.join(CACHE_MODES)}"
+            }
+        
         # 创建保存目录
         save_dir = Path(save_path)
         save_dir.mkdir(parents=True, exist_ok=True)
         
-        # 初始化 OpenAI 客户端
+        # 初始化 OpenAI 客户端（线程安全，各行共用连接池）
         client = OpenAI(
-            base_url="https://ai.gitee.com/v1",
+            base_url=_tts_config_value("base_url"),
             api_key=api_key,
         )
         
-        generated_files = []
+        if max_workers is None:
+            max_workers = _tts_config_value("max_workers")
+        max_workers = max(1, min(int(max_workers), len(text_list)))
         
-        # 遍历文案列表，逐个生成音频
-        for index, text_content in enumerate(text_list, start=1):
-            # 生成文件名: 1.mp3, 2.mp3, 3.mp3...
-            output_file = save_dir / f"{index}.mp3"
-            
-            try:
-                # 调用 TTS API
-                response = client.audio.speech.create(
-                    input=text_content,
-                    model="IndexTTS-2",
-                    extra_body={
-                        "prompt_audio_url": prompt_audio_url,
-                        "prompt_text": "",  # 可以根据需要调整
-                        "emo_text": "",
-                        "use_emo_text": False,
-                    },
-                    voice="alloy",
+        # 并发合成，文件名按位置固定: 1.mp3, 2.mp3, 3.mp3...
+        # 使用缓存时，同一请求中重复的文案只合成一次，其余行复用第一次出现时的音频
+        first_index = {}
+        with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="tts") as executor:
+            futures = {}
+            for index, text_content in enumerate(text_list, start=1):
+                if cache_mode == "use" and isinstance(text_content, str):
+                    if text_content in first_index:
+                        continue
+                    first_index[text_content] = index
+                futures[index] = executor.submit(
+                    _synthesize_line, client, text_content, prompt_audio_url, save_dir / f"{index}.mp3", api_key, cache_mode
                 )
-                
-                # 保存音频文件
-                response.stream_to_file(str(output_file))
-                
-                generated_files.append(str(output_file))
-                
-            except Exception as e:
-                # 如果某个文件生成失败，记录错误但继续处理其他文件
-                print(f"生成第 {index} 个文件时出错: {str(e)}")
-                return {
-                    "success": False,
-                    "error": f"生成第 {index} 个音频文件时失败: {str(e)}",
-                    "files": generated_files  # 返回已成功生成的文件
-                }
+            
+            results = []
+            for index, text_content in enumerate(text_list, start=1):
+                output_file = save_dir / f"{index}.mp3"
+                try:
+                    if index in futures:
+                        stored = futures[index].result()
+                    else:
+                        source = results[first_index[text_content] - 1]
+                        if not source["success"]:
+                            raise RuntimeError(source["error"])
+                        if not _materialize(Path(source["file"]), output_file):
+                            raise RuntimeError(f"无法复用第 {source['index']} 个音频文件")
+                        stored = {**ingest_file(output_file), "cache_hit": False, "reused": True}
+                    results.append({"index": index, "success": True, "file": str(output_file), **stored})
+                except Exception as e:
+                    # 某一行失败时记录错误，继续处理其他行
+                    print(f"生成第 {index} 个文件时出错: {str(e)}")
+                    results.append({"index": index, "success": False, "error": f"生成第 {index} 个音频文件时失败: {str(e)}"})
         
-        return {
-            "success": True,
-            "message": f"成功生成 {len(generated_files)} 个音频文件",
+        generated_files = [result["file"] for result in results if result["success"]]
+        failed = len(results) - len(generated_files)
+        
+        result = {
+            "success": failed == 0,
+            "partial": failed > 0 and len(generated_files) > 0,
+            "message": f"成功生成 {len(generated_files)} 个音频文件" + (f"，{failed} 个失败" if failed else ""),
             "files": generated_files,
+            "results": results,
+            "succeeded": len(generated_files),
+            "failed": failed,
+            "cache_hits": sum(1 for item in results if item.get("cache_hit")),
+            "reused": sum(1 for item in results if item.get("reused")),
+            "deduplicated": sum(1 for item in results if item.get("deduplicated")),
             "total": len(generated_files)
         }
         
+        if failed:
+            result["error"] = next(item["error"] for item in results if not item["success"])
+        
+        return result
+    
     except Exception as e:
         import traceback
         return {
@@ -113,4 +283,3 @@ def tts_synthesis_core(text_dict, prompt_audio_url, save_path, api_key):
             "error": str(e),
             "traceback": traceback.format_exc()
         }
-
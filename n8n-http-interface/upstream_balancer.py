@@ -0,0 +1,164 @@
+"""
+上游负载均衡模块
+在多个上游地址 / API Key 之间按权重分配请求，返回 429 的上游会被暂时摘除，并记录每个上游的统计
+"""
+
+import random
+import threading
+import time
+from contextlib import contextmanager
+from typing import Iterable, List
+from urllib.parse import urlsplit
+
+# 可选的选择策略：
+#   least_in_flight - 选择 在途请求数 / 权重 最小的上游
+#   token_bucket    - 每个上游按权重匀速积累令牌，选择当前令牌最多的上游
+BALANCE_POLICIES = ("least_in_flight", "token_bucket")
+
+
+class Upstream:
+    """一个上游（地址 + API Key）及其运行状态"""
+
+    def __init__(self, base_url: str, api_key: str, weight: float = 1.0, tokens_per_second: float = 1.0):
+        self.base_url = base_url.rstrip("/")
+        self.api_key = api_key
+        self.weight = max(float(weight), 0.001)
+        # 名称只保留主机和 Key 末 4 位，用于统计展示
+        self.name = f"{urlsplit(self.base_url).netloc or self.base_url}#{api_key[-4:] if api_key else '-'}"
+
+        self.in_flight = 0
+        self.ejected_until = 0.0
+
+        self._rate = tokens_per_second * self.weight
+        self._capacity = max(1.0, self._rate)
+        self.tokens = self._capacity
+        self._updated = time.monotonic()
+
+        self.stats = {
+            "requests": 0,
+            "successes": 0,
+            "failures": 0,
+            "rate_limited": 0,
+            "ejections": 0,
+        }
+
+    def refill(self, now: float):
+        self.tokens = min(self._capacity, self.tokens + (now - self._updated) * self._rate)
+        self._updated = now
+
+
+class UpstreamBalancer:
+    """
+    上游负载均衡器
+
+    - policy: least_in_flight / token_bucket
+    - eject_seconds: 上游返回 429 后摘除的秒数，期间不再分配请求（全部被摘除时选最早恢复的）
+    """
+
+    def __init__(self, upstreams: List[Upstream], policy: str = "least_in_flight", eject_seconds: float = 30):
+        if not upstreams:
+            raise ValueError("至少需要一个上游")
+        self.upstreams = upstreams
+        self.policy = policy if policy in BALANCE_POLICIES else "least_in_flight"
+        self.eject_seconds = float(eject_seconds)
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_config(
+        cls,
+        entries: Iterable[dict],
+        policy: str = "least_in_flight",
+        eject_seconds: float = 30,
+        requests_per_minute: float = 0,
+    ) -> "UpstreamBalancer":
+        # 令牌速率以每个 Key 的额度为基准；未配置额度时只表示相对权重
+        tokens_per_second = requests_per_minute / 60.0 if requests_per_minute else 1.0
+        upstreams = [
+            Upstream(
+                entry["base_url"],
+                entry.get("api_key", ""),
+                weight=entry.get("weight", 1.0),
+                tokens_per_second=tokens_per_second,
+            )
+            for entry in entries
+            if entry.get("base_url")
+        ]
+        return cls(upstreams, policy, eject_seconds)
+
+    def pick(self) -> Upstream:
+        """
+        选择一个上游，并在同一把锁内为这次请求占用一个在途名额
+
+        并发选择时后来者能看到先前的占用，不会都落到同一个上游；名额由随后的 track 释放，
+        因此每次 pick 之后必须对返回的上游调用一次 track。
+        """
+        with self._lock:
+            chosen = self._choose(time.monotonic())
+            chosen.in_flight += 1
+            chosen.stats["requests"] += 1
+            return chosen
+
+    def _choose(self, now: float) -> Upstream:
+        candidates = [u for u in self.upstreams if u.ejected_until <= now]
+        if not candidates:
+            return min(self.upstreams, key=lambda u: u.ejected_until)
+
+        if self.policy == "token_bucket":
+            for upstream in candidates:
+                upstream.refill(now)
+            best = max(u.tokens / u._capacity for u in candidates)
+            chosen = random.choice([u for u in candidates if u.tokens / u._capacity == best])
+            chosen.tokens -= 1
+            return chosen
+
+        best = min(u.in_flight / u.weight for u in candidates)
+        return random.choice([u for u in candidates if u.in_flight / u.weight == best])
+
+    @contextmanager
+    def track(self, upstream: Upstream):
+        """
+        记录 pick 选出的上游上一次请求的结果，结束时释放 pick 占用的在途名额
+
+        用法:
+            upstream = balancer.pick()
+            with balancer.track(upstream) as record:
+                response = session.post(...)
+                record(response.status_code)
+        """
+        outcome = {"status": None}
+
+        def record(status: int):
+            outcome["status"] = status
+
+        try:
+            yield record
+        finally:
+            status = outcome["status"]
+            with self._lock:
+                upstream.in_flight -= 1
+                if status == 200:
+                    upstream.stats["successes"] += 1
+                else:
+                    upstream.stats["failures"] += 1
+                if status == 429:
+                    upstream.stats["rate_limited"] += 1
+                    if upstream.ejected_until <= time.monotonic():
+                        upstream.stats["ejections"] += 1
+                    upstream.ejected_until = time.monotonic() + self.eject_seconds
+
+    def stats(self) -> dict:
+        with self._lock:
+            now = time.monotonic()
+            return {
+                "policy": self.policy,
+                "upstreams": [
+                    {
+                        "name": u.name,
+                        "weight": u.weight,
+                        "in_flight": u.in_flight,
+                        "ejected_for_seconds": round(max(0.0, u.ejected_until - now), 1),
+                        **u.stats,
+                    }
+                    for u in self.upstreams
+                ],
+            }
@@ -7,7 +7,8 @@ import json
 import sys
 import os
 from pathlib import Path
-from flask import Flask, request, jsonify
+from urllib.parse import quote
+from flask import Flask, Response, request, jsonify
 from flask_cors import CORS
 
 # 解决 Windows 控制台中文乱码问题
@@ -21,10 +22,33 @@ if sys.platform == 'win32':
 sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'n8n-http-interface'))
 
 # 导入工具模块
-from save_base64 import save_base64_file_core
-from get_bilibili_subtitle import get_bilibili_subtitle_core
-from tts_synthesis import tts_synthesis_core
-from generate_image_gemini import generate_image_gemini_core, modify_image_with_prompt
+from async_runtime import run_sync
+from browser_pool import get_browser_pool
+from content_store import content_store_stats
+from http_client import session_stats
+from subtitle_cache import get_subtitle_cache
+from image_sources import ImageSource
+from save_base64 import (
+    BATCH_ITEM_FIELDS as SAVE_BATCH_ITEM_FIELDS,
+    STREAM_THRESHOLD_BYTES,
+    save_base64_batch_core,
+    save_base64_file_core,
+    save_base64_stream_core,
+)
+from get_bilibili_subtitle import get_bilibili_subtitle_core, get_bilibili_subtitles_batch_core
+from tts_synthesis import audio_cache_stats, rate_limit_stats as tts_rate_limit_stats, tts_synthesis_core
+from generate_image_gemini import (
+    BATCH_ITEM_FIELDS,
+    generate_image_gemini_batch_core,
+    generate_image_gemini_core,
+    image_cache_stats,
+    iter_generate_image_gemini_batch,
+    iter_generate_image_gemini_stream,
+    iter_modify_image_with_prompt_stream,
+    modify_image_with_prompt,
+    rate_limit_stats,
+    upstream_stats,
+)
 
 app = Flask(__name__)
 CORS(app)  # 允许跨域请求
@@ -33,6 +57,66 @@ CORS(app)  # 允许跨域请求
 PORT = 6666
 HOST = '127.0.0.1'
 
+# 图像接口的返回格式：json - JSON 结果；binary - 直接返回图片字节，元数据放在响应头中
+RESPONSE_FORMATS = ('json', 'binary')
+
+
+def image_response(result: dict) -> Response:
+    """把包含 image_bytes 的生成结果转换为二进制图片响应"""
+    upstream = result.get('upstream') or {}
+    headers = {
+        'X-Cache-Hit': 'true' if result.get('cache_hit') else 'false',
+        # 响应头只能是 latin-1，文本按 URL 编码
+        'X-Generated-Text': quote(result.get('generated_text') or ''),
+        'X-Upstream': upstream.get('served_by') or '',
+        'X-Upstream-Attempts': str(upstream.get('attempts', 0)),
+    }
+    if result.get('file_path'):
+        headers['X-File-Path'] = quote(result['file_path'])
+    if 'steps' in result:
+        headers['X-Pipeline-Steps'] = str(len(result['steps']))
+
+    return Response(result['image_bytes'], mimetype=result.get('mime_type') or 'image/png', headers=headers)
+
+
+def sse_response(events) -> Response:
+    """把事件迭代器转换为 Server-Sent Events 响应，每个事件一条 event/data"""
+    def generate():
+        for event in events:
+            yield f"event: {event['event']}\ndata: {json.dumps(event, ensure_ascii=False)}\n\n"
+
+    return Response(generate(), mimetype='text/event-stream', headers={'Cache-Control': 'no-cache'})
+
+
+# multipart 表单中按原样作为字符串处理的字段，其余字段按 JSON 解析（true / 数字 / 对象）
+FORM_STRING_FIELDS = ('prompt', 'save_path', 'aspect_ratio', 'cache', 'response_format', 'base_url', 'model', 'api_key')
+
+
+def multipart_image_body() -> dict:
+    """
+    把 multipart/form-data 请求转换为与 JSON 请求相同的参数字典
+
+    - 上传的文件（任意字段名，按出现顺序）作为图片，构建上游请求时才读取
+    - image_path / image_url 字段（可重复）作为本地文件 / URL 图片
+    """
+    body = {}
+    for key, value in request.form.items():
+        if key in ('image_path', 'image_url'):
+            continue
+        if key in FORM_STRING_FIELDS:
+            body[key] = value
+            continue
+        try:
+            body[key] = json.loads(value)
+        except ValueError:
+            body[key] = value
+    
+    images = [ImageSource.from_upload(upload) for _, upload in request.files.items(multi=True)]
+    images += [{"path": path} for path in request.form.getlist('image_path')]
+    images += [{"url": url} for url in request.form.getlist('image_url')]
+    body['images'] = images
+    return body
+
 
 @app.route('/', methods=['GET'])
 def index():
@@ -47,21 +131,36 @@ def index():
                 "method": "POST",
                 "description": "保存 Base64 数据到本地文件，自动识别文件类型"
             },
+            {
+                "path": "/save-base64/batch",
+                "method": "POST",
+                "description": "批量保存 Base64 数据（按输入顺序编号，并行解码写入）"
+            },
             {
                 "path": "/get-bilibili-subtitle",
                 "method": "POST",
                 "description": "获取B站视频字幕"
             },
+            {
+                "path": "/get-bilibili-subtitles/batch",
+                "method": "POST",
+                "description": "批量获取B站视频字幕（有界并发，按输入顺序返回逐项结果）"
+            },
             {
                 "path": "/tts-synthesis",
                 "method": "POST",
-                "description": "TTS 语音合成，批量生成音频文件"
+                "description": "TTS 语音合成，批量并发生成音频文件（按顺序编号，逐行返回结果）"
             },
             {
                 "path": "/generate-image-gemini",
                 "method": "POST",
                 "description": "使用 Google Gemini 生成图片（Nano Banana / gemini-2.5-flash-image）"
             },
+            {
+                "path": "/generate-image-gemini/batch",
+                "method": "POST",
+                "description": "批量并发生成图片（按 API Key 限流，可流式返回进度）"
+            },
             {
                 "path": "/modify-image-with-prompt",
                 "method": "POST",
@@ -71,6 +170,11 @@ def index():
                 "path": "/health",
                 "method": "GET",
                 "description": "健康检查"
+            },
+            {
+                "path": "/stats",
+                "method": "GET",
+                "description": "运行统计（字幕缓存、浏览器池、HTTP 连接复用）"
             }
         ],
         "server": {
@@ -89,6 +193,23 @@ def health():
     })
 
 
+@app.route('/stats', methods=['GET'])
+def stats():
+    """运行统计"""
+    subtitle_cache = get_subtitle_cache()
+    return jsonify({
+        "subtitle_cache": subtitle_cache.stats() if subtitle_cache else None,
+        "browser_pool": get_browser_pool().stats(),
+        "http_sessions": session_stats(),
+        "gemini_cache": image_cache_stats(),
+        "gemini_rate_limits": rate_limit_stats(),
+        "gemini_upstreams": upstream_stats(),
+        "tts_rate_limits": tts_rate_limit_stats(),
+        "tts_cache": audio_cache_stats(),
+        "content_store": content_store_stats()
+    })
+
+
 @app.route('/save-base64', methods=['POST'])
 def api_save_base64():
     """
@@ -102,8 +223,30 @@ def api_save_base64():
         "auto_extension": true,  // 可选：是否自动添加扩展名，默认 true
         "mime_type": "image/jpeg"  // 可选：指定 MIME 类型来确定文件扩展名
     }
+    
+    大文件不经过 request.get_json()，直接从请求流边读边解码写盘：
+    - JSON 请求体超过 STREAM_THRESHOLD_BYTES 或带 ?stream=true 时流式处理 data 字段
+    - 非 JSON 请求体（如 text/plain）整体视为 Base64 文本，参数放在查询字符串中（?path=...&force_ext=...）
     """
     try:
+        is_json = request.mimetype == 'application/json'
+        stream = request.args.get('stream', '').lower() in ('1', 'true')
+        if not is_json or stream or (request.content_length or 0) > STREAM_THRESHOLD_BYTES:
+            result = save_base64_stream_core(
+                request.stream,
+                output_path=request.args.get('path'),
+                auto_extension=request.args.get('auto_extension', 'true').lower() != 'false',
+                force_extension=request.args.get('force_ext'),
+                mime_type=request.args.get('mime_type'),
+                json_body=is_json
+            )
+            
+            if result.get('success'):
+                return jsonify(result), 200
+            # 请求内容有误（缺少参数、JSON 或 Base64 格式不正确）返回 400，写盘等服务端错误返回 500
+            status = 400 if result.pop('invalid_request', False) else 500
+            return jsonify(result), status
+        
         # 获取请求数据
         body = request.get_json()
         
@@ -143,8 +286,69 @@ def api_save_base64():
         
         if result.get('success'):
             return jsonify(result), 200
-        else:
-            return jsonify(result), 500
+        status = 400 if result.pop('invalid_request', False) else 500
+        return jsonify(result), status
+            
+    except Exception as e:
+        import traceback
+        return jsonify({
+            "success": False,
+            "error": str(e),
+            "traceback": traceback.format_exc()
+        }), 500
+
+
+@app.route('/save-base64/batch', methods=['POST'])
+def api_save_base64_batch():
+    """
+    批量保存 Base64 数据到本地文件
+    
+    POST Body:
+    {
+        "items": [
+            {"data": "base64_1"},
+            {"data": "base64_2", "path": "other/path", "mime_type": "image/png"}
+        ],
+        "path": "output/path",  // 可选：各项的默认保存路径
+        "force_ext": "jpg",  // 可选：各项的默认强制扩展名
+        "auto_extension": true,  // 可选：各项的默认值，默认 true
+        "mime_type": "image/jpeg",  // 可选：各项的默认 MIME 类型
+        "max_workers": 4  // 可选：并行线程数，默认读取 config.json
+    }
+    """
+    try:
+        body = request.get_json()
+        
+        if not body:
+            return jsonify({
+                "success": False,
+                "error": "请求体不能为空"
+            }), 400
+        
+        if 'items' not in body:
+            return jsonify({
+                "success": False,
+                "error": "缺少必需参数: items"
+            }), 400
+        
+        items = body['items']
+        
+        if not isinstance(items, list):
+            return jsonify({
+                "success": False,
+                "error": "items 参数必须是列表"
+            }), 400
+        
+        if len(items) == 0:
+            return jsonify({
+                "success": False,
+                "error": "至少需要提供一项"
+            }), 400
+        
+        defaults = {key: body[key] for key in SAVE_BATCH_ITEM_FIELDS if key in body}
+        
+        result = save_base64_batch_core(items, defaults, body.get('max_workers'))
+        return jsonify(result), 200
             
     except Exception as e:
         import traceback
@@ -163,7 +367,10 @@ def api_get_bilibili_subtitle():
     POST Body:
     {
         "url": "https://www.bilibili.com/video/BV1DdDAYfEWQ",
-        "text_only": true  // 可选，默认 true（去除时间戳）
+        "text_only": true,  // 可选，默认 true（去除时间戳）
+        "backend": "auto",  // 可选：auto / direct / playwright，默认读取 config.json
+        "use_cache": true,  // 可选，默认 true，false 时强制重新提取
+        "output": "text"  // 可选：text / segments / srt / vtt，优先于 text_only
     }
     """
     try:
@@ -183,15 +390,12 @@ def api_get_bilibili_subtitle():
         
         video_url = body['url']
         text_only = body.get('text_only', True)
+        backend = body.get('backend')
+        use_cache = body.get('use_cache', True)
+        output = body.get('output')
         
-        # 调用异步函数
-        import asyncio
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-        result = loop.run_until_complete(
-            get_bilibili_subtitle_core(video_url, text_only)
-        )
-        loop.close()
+        # 提交到共享的后台事件循环执行，复用浏览器池
+        result = run_sync(get_bilibili_subtitle_core(video_url, text_only, backend, use_cache, output))
         
         if result.get('success'):
             return jsonify(result), 200
@@ -207,6 +411,77 @@ def api_get_bilibili_subtitle():
         }), 500
 
 
+@app.route('/get-bilibili-subtitles/batch', methods=['POST'])
+def api_get_bilibili_subtitles_batch():
+    """
+    批量获取B站视频字幕
+    
+    POST Body:
+    {
+        "urls": ["BV1DdDAYfEWQ", "https://www.bilibili.com/video/BV..."],
+        "text_only": true,  // 可选，默认 true（去除时间戳）
+        "backend": "auto",  // 可选：auto / direct / playwright，默认读取 config.json
+        "use_cache": true,  // 可选，默认 true
+        "concurrency": 4,  // 可选：最大并发数，默认读取 config.json
+        "output": "text"  // 可选：text / segments / srt / vtt，优先于 text_only
+    }
+    """
+    try:
+        body = request.get_json()
+        
+        if not body:
+            return jsonify({
+                "success": False,
+                "error": "请求体不能为空"
+            }), 400
+        
+        if 'urls' not in body:
+            return jsonify({
+                "success": False,
+                "error": "缺少必需参数: urls"
+            }), 400
+        
+        video_urls = body['urls']
+        
+        if not isinstance(video_urls, list):
+            return jsonify({
+                "success": False,
+                "error": "urls 参数必须是列表"
+            }), 400
+        
+        if len(video_urls) == 0:
+            return jsonify({
+                "success": False,
+                "error": "至少需要提供一个视频链接"
+            }), 400
+
+        concurrency = body.get('concurrency')
+        if concurrency is not None and (isinstance(concurrency, bool) or not isinstance(concurrency, int) or concurrency < 1):
+            return jsonify({
+                "success": False,
+                "error": "concurrency 参数必须是正整数"
+            }), 400
+
+        result = run_sync(get_bilibili_subtitles_batch_core(
+            video_urls,
+            text_only=body.get('text_only', True),
+            backend=body.get('backend'),
+            use_cache=body.get('use_cache', True),
+            concurrency=concurrency,
+            output=body.get('output')
+        ))
+        
+        return jsonify(result), 200
+            
+    except Exception as e:
+        import traceback
+        return jsonify({
+            "success": False,
+            "error": str(e),
+            "traceback": traceback.format_exc()
+        }), 500
+
+
 @app.route('/tts-synthesis', methods=['POST'])
 def api_tts_synthesis():
     """
@@ -219,7 +494,9 @@ def api_tts_synthesis():
         },
         "prompt_audio_url": "https://example.com/audio.wav",
         "save_path": "output/path",
-        "api_key": "your_api_key"
+        "api_key": "your_api_key",
+        "max_workers": 4,  // 可选：并发合成的行数，默认读取 config.json
+        "cache": "use"  // 可选：bypass / use / refresh，默认读取 config.json
     }
     """
     try:
@@ -250,7 +527,9 @@ def api_tts_synthesis():
             text_dict=text_dict,
             prompt_audio_url=prompt_audio_url,
             save_path=save_path,
-            api_key=api_key
+            api_key=api_key,
+            max_workers=body.get('max_workers'),
+            cache=body.get('cache')
         )
         
         if result.get('success'):
@@ -277,7 +556,15 @@ def api_generate_image_gemini():
         "prompt": "生成图像的提示词",
         "save_path": "output/path",
         "aspect_ratio": "16:9",  // 可选：宽高比
-        "added_prompt": "additional refinement prompt"  // 可选：附加提示词（两步生成）
+        "added_prompt": "additional refinement prompt",  // 可选：附加提示词（两步生成）
+        "refine_prompts": ["step 2 prompt", "step 3 prompt"],  // 可选：多步精修提示词
+        "resume_from": {"step": 2, "image_sha256": "..."},  // 可选：多步生成失败时返回的 resume_from，从该步之后继续
+        "cache": "use",  // 可选：bypass / use / refresh，默认读取 config.json
+        "response_format": "json",  // 可选：json / binary（直接返回图片字节，此时 save_path 可省略）
+        "stream": false,  // 可选：true 时通过 streamGenerateContent 流式生成，以 SSE 推送文本和进度
+        "base_url": "https://...",  // 可选：固定使用该上游（不参与负载均衡），默认读取 config.json
+        "model": "gemini-2.5-flash-image-preview",  // 可选，默认读取 config.json
+        "api_key": "your_api_key"  // 可选，默认读取 config.json
     }
     """
     try:
@@ -296,26 +583,58 @@ def api_generate_image_gemini():
                 "error": "缺少必需参数: prompt"
             }), 400
         
-        if 'save_path' not in body:
+        response_format = body.get('response_format', 'json')
+        if response_format not in RESPONSE_FORMATS:
+            return jsonify({
+                "success": False,
+                "error": f"不支持的 response_format: {response_format}，可选值: {', '.join(RESPONSE_FORMATS)}"
+            }), 400
+        
+        if 'save_path' not in body and response_format != 'binary':
             return jsonify({
                 "success": False,
                 "error": "缺少必需参数: save_path"
             }), 400
         
         prompt = body['prompt']
-        save_path = body['save_path']
+        save_path = body.get('save_path')
         aspect_ratio = body.get('aspect_ratio')
         added_prompt = body.get('added_prompt')
+        refine_prompts = body.get('refine_prompts')
+        resume_from = body.get('resume_from')
+        cache = body.get('cache')
+        upstream_params = {key: body.get(key) for key in ('base_url', 'model', 'api_key')}
+        
+        if body.get('stream', False):
+            if added_prompt or refine_prompts or resume_from or response_format != 'json':
+                return jsonify({
+                    "success": False,
+                    "error": "stream 模式不支持 added_prompt / refine_prompts / resume_from / response_format=binary"
+                }), 400
+            
+            return sse_response(iter_generate_image_gemini_stream(
+                prompt=prompt,
+                save_path=save_path,
+                aspect_ratio=aspect_ratio,
+                **upstream_params
+            ))
         
         # 调用核心函数
         result = generate_image_gemini_core(
             prompt=prompt,
             save_path=save_path,
             aspect_ratio=aspect_ratio,
-            added_prompt=added_prompt
+            added_prompt=added_prompt,
+            cache=cache,
+            refine_prompts=refine_prompts,
+            resume_from=resume_from,
+            return_bytes=response_format == 'binary',
+            **upstream_params
         )
         
         if result.get('success'):
+            if response_format == 'binary':
+                return image_response(result)
             return jsonify(result), 200
         else:
             return jsonify(result), 500
@@ -329,6 +648,74 @@ def api_generate_image_gemini():
         }), 500
 
 
+@app.route('/generate-image-gemini/batch', methods=['POST'])
+def api_generate_image_gemini_batch():
+    """
+    批量并发生成图片
+    
+    POST Body:
+    {
+        "items": [
+            {"prompt": "提示词1"},
+            {"prompt": "提示词2", "aspect_ratio": "1:1", "save_path": "other/path"}
+        ],
+        "save_path": "output/path",  // 可选：各项的默认保存路径
+        "aspect_ratio": "16:9",  // 可选：各项的默认宽高比
+        "max_workers": 8,  // 可选：并发线程数，默认读取 config.json
+        "stream": false  // 可选：true 时以 NDJSON 逐行返回进度
+    }
+    """
+    try:
+        body = request.get_json()
+        
+        if not body:
+            return jsonify({
+                "success": False,
+                "error": "请求体不能为空"
+            }), 400
+        
+        if 'items' not in body:
+            return jsonify({
+                "success": False,
+                "error": "缺少必需参数: items"
+            }), 400
+        
+        items = body['items']
+        
+        if not isinstance(items, list):
+            return jsonify({
+                "success": False,
+                "error": "items 参数必须是列表"
+            }), 400
+        
+        if len(items) == 0:
+            return jsonify({
+                "success": False,
+                "error": "至少需要提供一项"
+            }), 400
+        
+        defaults = {key: body[key] for key in BATCH_ITEM_FIELDS if key in body}
+        max_workers = body.get('max_workers')
+        
+        if body.get('stream', False):
+            def generate():
+                for event in iter_generate_image_gemini_batch(items, defaults, max_workers):
+                    yield json.dumps(event, ensure_ascii=False) + "\n"
+            
+            return Response(generate(), mimetype='application/x-ndjson')
+        
+        result = generate_image_gemini_batch_core(items, defaults, max_workers)
+        return jsonify(result), 200
+            
+    except Exception as e:
+        import traceback
+        return jsonify({
+            "success": False,
+            "error": str(e),
+            "traceback": traceback.format_exc()
+        }), 500
+
+
 @app.route('/modify-image-with-prompt', methods=['POST'])
 def api_modify_image_with_prompt():
     """
@@ -346,13 +733,33 @@ def api_modify_image_with_prompt():
             {"data": "base64_data", "mime_type": "image/png"},
             {"data": "base64_data", "mime_type": "image/jpeg"}
         ],
+        // 或者本地文件 / URL
+        "images": [
+            {"path": "D:/input/1.png"},
+            {"url": "https://example.com/2.jpg"}
+        ],
         "prompt": "修改图像的提示词",
         "save_path": "output/path",
-        "aspect_ratio": "16:9"  // 可选：宽高比
+        "aspect_ratio": "16:9",  // 可选：宽高比
+        "return_base64": false,  // 可选：返回 Base64 而不保存文件，默认读取 config.json
+        "preprocess": true,  // 可选：预处理输入图片（缩小、重新编码、去重），默认读取 config.json
+        "cache": "use",  // 可选：bypass / use / refresh，默认读取 config.json
+        "response_format": "json",  // 可选：json / binary（直接返回图片字节，此时 save_path 可省略）
+        "stream": false,  // 可选：true 时通过 streamGenerateContent 流式生成，以 SSE 推送文本和进度
+        "base_url": "https://...",  // 可选：固定使用该上游（不参与负载均衡），默认读取 config.json
+        "model": "gemini-2.5-flash-image-preview",  // 可选，默认读取 config.json
+        "api_key": "your_api_key"  // 可选，默认读取 config.json
     }
+    
+    也可以用 multipart/form-data 上传：文件字段作为图片，image_path / image_url 字段（可重复）作为本地文件 / URL，
+    其余参数作为普通表单字段
     """
     try:
-        body = request.get_json()
+        # multipart 上传时图片不经过 JSON / Base64
+        if request.mimetype == 'multipart/form-data':
+            body = multipart_image_body()
+        else:
+            body = request.get_json()
         
         if not body:
             return jsonify({
@@ -373,16 +780,21 @@ def api_modify_image_with_prompt():
                 "error": "缺少必需参数: prompt"
             }), 400
         
-        if 'save_path' not in body:
+        response_format = body.get('response_format', 'json')
+        if response_format not in RESPONSE_FORMATS:
             return jsonify({
                 "success": False,
-                "error": "缺少必需参数: save_path"
+                "error": f"不支持的 response_format: {response_format}，可选值: {', '.join(RESPONSE_FORMATS)}"
             }), 400
         
         images = body['images']
         prompt = body['prompt']
-        save_path = body['save_path']
+        save_path = body.get('save_path')
         aspect_ratio = body.get('aspect_ratio')
+        return_base64 = body.get('return_base64')
+        preprocess = body.get('preprocess')
+        cache = body.get('cache')
+        upstream_params = {key: body.get(key) for key in ('base_url', 'model', 'api_key')}
         
         # 验证 images 是列表
         if not isinstance(images, list):
@@ -397,15 +809,38 @@ def api_modify_image_with_prompt():
                 "error": "至少需要提供一张图片"
             }), 400
         
+        if body.get('stream', False):
+            if not save_path or response_format != 'json':
+                return jsonify({
+                    "success": False,
+                    "error": "stream 模式必须提供 save_path，且不支持 response_format=binary"
+                }), 400
+            
+            return sse_response(iter_modify_image_with_prompt_stream(
+                images=images,
+                prompt=prompt,
+                save_path=save_path,
+                aspect_ratio=aspect_ratio,
+                preprocess=preprocess,
+                **upstream_params
+            ))
+        
         # 调用核心函数
         result = modify_image_with_prompt(
             images=images,
             prompt=prompt,
             save_path=save_path,
-            aspect_ratio=aspect_ratio
+            aspect_ratio=aspect_ratio,
+            return_base64=return_base64,
+            cache=cache,
+            return_bytes=response_format == 'binary',
+            preprocess=preprocess,
+            **upstream_params
         )
         
         if result.get('success'):
+            if response_format == 'binary':
+                return image_response(result)
             return jsonify(result), 200
         else:
             return jsonify(result), 500
@@ -447,16 +882,23 @@ def main():
     print(f"服务地址: http://{HOST}:{PORT}")
     print(f"API 文档: http://{HOST}:{PORT}/")
     print(f"健康检查: http://{HOST}:{PORT}/health")
+    print(f"运行统计: http://{HOST}:{PORT}/stats")
     print("=" * 60)
     print("\n可用 API:")
     print(f"  POST http://{HOST}:{PORT}/save-base64")
     print("    - 保存 Base64 数据到本地文件")
+    print(f"  POST http://{HOST}:{PORT}/save-base64/batch")
+    print("    - 批量保存 Base64 数据")
     print(f"  POST http://{HOST}:{PORT}/get-bilibili-subtitle")
     print("    - 获取B站视频字幕")
+    print(f"  POST http://{HOST}:{PORT}/get-bilibili-subtitles/batch")
+    print("    - 批量获取B站视频字幕")
     print(f"  POST http://{HOST}:{PORT}/tts-synthesis")
     print("    - TTS 语音合成，批量生成音频文件")
     print(f"  POST http://{HOST}:{PORT}/generate-image-gemini")
     print("    - 使用 Google Gemini 生成图片（Nano Banana）")
+    print(f"  POST http://{HOST}:{PORT}/generate-image-gemini/batch")
+    print("    - 批量并发生成图片")
     print(f"  POST http://{HOST}:{PORT}/modify-image-with-prompt")
     print("    - 使用多张图片和提示词修改/生成新图片")
     print("\n按 Ctrl+C 停止服务")
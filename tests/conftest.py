@@ -0,0 +1,199 @@
+"""
+测试公共设施：模块路径、配置覆盖和本地桩服务器
+"""
+
+import base64
+import importlib.util
+import json
+import os
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [ROOT, os.path.join(ROOT, "n8n-http-interface")]
+
+import config_loader  # noqa: E402
+
+
+@pytest.fixture
+def config(monkeypatch):
+    """用给定的覆盖项替换 config.json（与默认配置合并），返回设置函数"""
+    def apply(overrides: dict):
+        merged = config_loader._deep_merge(config_loader.DEFAULT_CONFIG, overrides)
+        monkeypatch.setattr(config_loader, "_CONFIG_CACHE", merged)
+        return merged
+
+    apply({})
+    return apply
+
+
+class StubServer:
+    """
+    在后台线程运行的 HTTP 桩服务器
+
+    handler(method, path, body) 返回 (状态码, 响应头, 响应体)；响应体为可迭代对象时逐块以 chunked 编码发送
+    """
+
+    def __init__(self, handler):
+        self.handler = handler
+        self.requests = []
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def _handle(self):
+                length = int(self.headers.get("Content-Length") or 0)
+                body = self.rfile.read(length) if length else b""
+                stub.requests.append((self.command, self.path, body))
+                status, headers, payload = stub.handler(self.command, self.path, body)
+
+                self.send_response(status)
+                for key, value in (headers or {}).items():
+                    self.send_header(key, value)
+
+                if isinstance(payload, (bytes, str)):
+                    data = payload.encode() if isinstance(payload, str) else payload
+                    self.send_header("Content-Length", str(len(data)))
+                    self.end_headers()
+                    self.wfile.write(data)
+                    return
+
+                self.send_header("Transfer-Encoding", "chunked")
+                self.end_headers()
+                try:
+                    for chunk in payload:
+                        data = chunk.encode() if isinstance(chunk, str) else chunk
+                        self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+                        self.wfile.flush()
+                    self.wfile.write(b"0\r\n\r\n")
+                except (BrokenPipeError, ConnectionResetError):
+                    pass
+
+            do_GET = do_POST = _handle
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.server.daemon_threads = True
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.server.server_port}"
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def json_reply(payload, status: int = 200):
+    return status, {"Content-Type": "application/json"}, json.dumps(payload)
+
+
+@pytest.fixture
+def tools():
+    """加载 n8n-http-tools.py（文件名含连字符，不能直接 import），返回模块"""
+    spec = importlib.util.spec_from_file_location("n8n_http_tools", os.path.join(ROOT, "n8n-http-tools.py"))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+@pytest.fixture
+def stub_server():
+    """创建桩服务器，测试结束时关闭"""
+    servers = []
+
+    def start(handler) -> StubServer:
+        server = StubServer(handler)
+        servers.append(server)
+        return server
+
+    yield start
+    for server in servers:
+        server.close()
+
+
+PNG_HEADER = b"\x89PNG\r\n\x1a\n"
+
+
+class GeminiStub:
+    """
+    模拟 Gemini 的 generateContent / streamGenerateContent
+
+    每个请求先消耗 script 中的一个动作，script 为空时正常返回：
+    - ("status", 状态码) 或 ("status", 状态码, 响应头)：返回错误状态
+    - ("delay", 秒数)：等待后正常返回（超过客户端读取超时即为超时）
+    正常返回的图片内容由请求中的文本决定，不同提示词得到不同的图片
+    """
+
+    def __init__(self):
+        self.script = []
+        self.calls = 0
+        self.paths = []
+        self.bodies = []
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def image_for(texts) -> bytes:
+        return PNG_HEADER + "|".join(texts).encode("utf-8")
+
+    def __call__(self, method, path, body):
+        with self._lock:
+            self.calls += 1
+            self.paths.append(path)
+            self.bodies.append(body)
+            action = self.script.pop(0) if self.script else None
+
+        if action and action[0] == "status":
+            return action[1], (action[2] if len(action) > 2 else {}), '{"error": "injected"}'
+        if action and action[0] == "delay":
+            time.sleep(action[1])
+
+        texts = [part["text"] for part in json.loads(body)["contents"][0]["parts"] if "text" in part]
+        image = base64.b64encode(self.image_for(texts)).decode("ascii")
+        text_part = {"text": "ok:" + "|".join(texts)}
+        image_part = {"inlineData": {"mimeType": "image/png", "data": image}}
+
+        if ":streamGenerateContent" in path:
+            return 200, {"Content-Type": "text/event-stream"}, self._stream_events(text_part, image)
+        return json_reply({"candidates": [{"content": {"parts": [text_part, image_part]}}]})
+
+    @staticmethod
+    def _stream_events(text_part, image):
+        """先推送文本，再把图片数据拆成多个小块推送"""
+        yield "data: " + json.dumps({"candidates": [{"content": {"parts": [text_part]}}]}) + "\n\n"
+        head = '{"candidates": [{"content": {"parts": [{"inlineData": {"mimeType": "image/png", "data": "'
+        yield "data: " + head
+        for start in range(0, len(image), 7):
+            yield image[start:start + 7]
+        yield '"}}]}, "finishReason": "STOP"}]}\n\n'
+
+
+@pytest.fixture
+def gemini(config, stub_server, tmp_path, monkeypatch):
+    """指向本地 Gemini 桩服务器的配置，重置模块级共享对象；返回 (generate_image_gemini 模块, 桩)"""
+    import generate_image_gemini
+
+    stub = GeminiStub()
+    server = stub_server(stub)
+    config({
+        "gemini": {
+            "base_url": server.url,
+            "api_key": "test-key",
+            "read_timeout": 5,
+            "retry": {"backoff_base": 0.01, "backoff_max": 0.05},
+            "cache": {"dir": str(tmp_path / "cache")},
+            "pipeline": {"dir": str(tmp_path / "steps")},
+        },
+    })
+    for name in ("_image_cache", "_step_store", "_balancer", "_rate_limiter"):
+        monkeypatch.setattr(generate_image_gemini, name, None)
+    return generate_image_gemini, stub
@@ -0,0 +1,99 @@
+"""
+direct 后端与 auto 回退：对照模拟 subtitleExtract 接口的本地桩服务器
+"""
+
+import asyncio
+import copy
+import json
+
+import pytest
+
+from conftest import json_reply
+
+import get_bilibili_subtitle
+
+SRT = "1\n00:00:01,000 --> 00:00:02,500\nHello\n\n2\n00:00:03,000 --> 00:00:04,000\nWorld\n"
+
+SUBTITLE_RESPONSE = {
+    "code": 200,
+    "data": {"title": "测试视频", "subtitleItemVoList": [{"lan": "zh", "content": SRT}]},
+}
+
+
+def _reply(method, path, body):
+    url = json.loads(body)["url"]
+    if "nosub" in url:
+        return json_reply({"code": 404, "message": "视频没有字幕"})
+    if "forbidden" in url:
+        return 403, {}, "forbidden"
+    if "html" in url:
+        return 200, {"Content-Type": "text/html"}, "<html>captcha</html>"
+    return json_reply(SUBTITLE_RESPONSE)
+
+
+@pytest.fixture
+def playwright_calls(monkeypatch):
+    calls = []
+
+    async def fake_playwright(video_url, timings):
+        calls.append(video_url)
+        return {"success": True, "data": copy.deepcopy(SUBTITLE_RESPONSE)}
+
+    monkeypatch.setattr(get_bilibili_subtitle, "_extract_via_playwright", fake_playwright)
+    return calls
+
+
+def _extract(video_url, backend="auto"):
+    return asyncio.run(get_bilibili_subtitle.get_bilibili_subtitle_core(video_url, backend=backend, use_cache=False))
+
+
+@pytest.fixture
+def direct_api(config, stub_server):
+    server = stub_server(_reply)
+    config({"bilibili": {"direct_api_url": f"{server.url}/subtitleExtract", "direct_api_timeout": 5}})
+    return server
+
+
+def test_direct_success_skips_browser(direct_api, playwright_calls):
+    result = _extract("BV1ok")
+
+    assert result["success"]
+    assert result["backend"] == "direct"
+    assert result["data"]["data"]["subtitleItemVoList"][0]["content"] == "Hello\nWorld"
+    assert playwright_calls == []
+
+
+def test_business_error_is_returned_without_fallback(direct_api, playwright_calls):
+    result = _extract("BV1nosub")
+
+    assert not result["success"]
+    assert result["error"] == "视频没有字幕"
+    assert "business_error" not in result
+    assert playwright_calls == []
+
+
+@pytest.mark.parametrize("video_url", ["BV1forbidden", "BV1html"])
+def test_direct_failure_falls_back_to_playwright(direct_api, playwright_calls, video_url):
+    result = _extract(video_url)
+
+    assert result["success"]
+    assert result["backend"] == "playwright"
+    assert result["fallback_reason"]
+    assert len(playwright_calls) == 1
+
+
+def test_unreachable_direct_api_falls_back(config, playwright_calls):
+    config({"bilibili": {"direct_api_url": "http://127.0.0.1:1/subtitleExtract", "direct_api_timeout": 2}})
+
+    result = _extract("BV1ok")
+
+    assert result["backend"] == "playwright"
+    assert len(playwright_calls) == 1
+
+
+def test_direct_backend_never_falls_back(direct_api, playwright_calls):
+    result = _extract("BV1forbidden", backend="direct")
+
+    assert not result["success"]
+    assert result["backend"] == "direct"
+    assert playwright_calls == []
@@ -0,0 +1,21 @@
+"""
+内容寻址存储：关闭去重时覆盖写入不能改动与目标文件共享数据的硬链接
+"""
+
+import os
+
+import content_store
+
+
+def test_overwrite_without_dedup_keeps_hardlinked_copy(monkeypatch, tmp_path):
+    monkeypatch.setattr(content_store, "get_content_store", lambda: None)
+    original = tmp_path / "original.png"
+    linked = tmp_path / "linked.png"
+    original.write_bytes(b"shared")
+    os.link(original, linked)
+
+    content_store.save_bytes(b"replacement", linked)
+
+    assert linked.read_bytes() == b"replacement"
+    assert original.read_bytes() == b"shared"
+    assert sorted(os.listdir(tmp_path)) == ["linked.png", "original.png"]
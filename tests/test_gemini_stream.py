@@ -0,0 +1,100 @@
+"""
+流式生成：对照分块（chunked）推送 SSE 的本地桩服务器，检查文本转发和图像的增量解码
+"""
+
+import base64
+import json
+import os
+
+import pytest
+
+from conftest import GeminiStub
+
+from b64stream import Base64FileWriter
+
+
+def _sse(payload: dict) -> bytes:
+    return b"data: " + json.dumps(payload).encode() + b"\n\n"
+
+
+def test_parser_decodes_image_split_across_tiny_chunks(tmp_path):
+    import generate_image_gemini
+
+    image = os.urandom(3000)
+    encoded = base64.b64encode(image)
+    body = (
+        _sse({"candidates": [{"content": {"parts": [{"text": "hello"}]}}]})
+        + b'data: {"candidates": [{"content": {"parts": [{"inlineData": {"mimeType": "image/png", "data": "'
+        + encoded
+        + b'"}}]}, "finishReason": "STOP"}]}\n\n'
+    )
+
+    parser = generate_image_gemini._StreamingResponseParser(lambda: Base64FileWriter(tmp_path))
+    events = []
+    largest_buffer = 0
+    for start in range(0, len(body), 5):
+        events += parser.feed(body[start:start + 5])
+        largest_buffer = max(largest_buffer, len(parser._buffer))
+    events += parser.close()
+
+    texts = [part["text"] for event in events for part in event["candidates"][0]["content"]["parts"] if "text" in part]
+    assert texts == ["hello"]
+    assert events[-1]["candidates"][0]["finishReason"] == "STOP"
+    # 图像数据直接进入写入器，缓冲区只保存 JSON 结构
+    assert largest_buffer < 200
+
+    writer = parser.sinks[-1]
+    writer.finish()
+    assert writer.temp_path.read_bytes() == image
+    writer.abort()
+
+
+def test_parser_rejects_response_truncated_inside_image(tmp_path):
+    import generate_image_gemini
+
+    parser = generate_image_gemini._StreamingResponseParser(lambda: Base64FileWriter(tmp_path))
+    parser.feed(b'data: {"candidates": [{"content": {"parts": [{"inlineData": {"data": "AAAA')
+
+    with pytest.raises(ValueError):
+        parser.close()
+    for sink in parser.sinks:
+        sink.abort()
+
+
+def test_stream_forwards_text_and_saves_image(gemini, tmp_path):
+    module, stub = gemini
+
+    events = list(module.iter_generate_image_gemini_stream("draw a cat", str(tmp_path / "out")))
+
+    assert [event["event"] for event in events] == ["start", "text", "done"]
+    assert events[1]["text"] == "ok:draw a cat"
+
+    done = events[-1]
+    assert done["success"]
+    assert done["finish_reason"] == "STOP"
+    assert done["ttfb_ms"] is not None
+    with open(done["file_path"], "rb") as f:
+        assert f.read() == GeminiStub.image_for(["draw a cat"])
+    assert len(stub.paths) == 1 and ":streamGenerateContent?alt=sse" in stub.paths[0]
+
+
+def test_stream_retries_before_first_byte(gemini, tmp_path):
+    module, stub = gemini
+    stub.script = [("status", 503)]
+
+    events = list(module.iter_generate_image_gemini_stream("draw a cat", str(tmp_path / "out")))
+
+    assert [event["event"] for event in events] == ["retry", "start", "text", "done"]
+    assert events[0]["status"] == 503
+
+
+def test_sse_endpoint_streams_events(gemini, tools, tmp_path):
+    response = tools.app.test_client().post(
+        "/generate-image-gemini",
+        json={"prompt": "draw a cat", "save_path": str(tmp_path / "out"), "stream": True},
+    )
+
+    assert response.mimetype == "text/event-stream"
+    body = response.get_data(as_text=True)
+    names = [line[len("event: "):] for line in body.splitlines() if line.startswith("event: ")]
+    assert names == ["start", "text", "done"]
@@ -0,0 +1,64 @@
+"""
+输入图片预处理：缩小重新编码，以及超过像素上限的图片原样发送
+"""
+
+import base64
+import io
+import json
+
+import pytest
+
+Image = pytest.importorskip("PIL.Image")
+
+import image_preprocess  # noqa: E402
+
+
+def _png(size, color=(200, 30, 30)) -> str:
+    out = io.BytesIO()
+    Image.new("RGB", size, color).save(out, format="PNG")
+    return base64.b64encode(out.getvalue()).decode("ascii")
+
+
+def test_resizes_large_image():
+    parts = [{"inlineData": {"mimeType": "image/png", "data": _png((400, 200))}}, {"text": "prompt"}]
+
+    new_parts, stats = image_preprocess.preprocess_inline_parts(parts, max_edge=100, output_format="jpeg")
+
+    assert "error" not in stats
+    assert new_parts[1] == {"text": "prompt"}
+    assert new_parts[0]["inlineData"]["mimeType"] == "image/jpeg"
+    # 处理结果保持原始字节，序列化请求体时才编码
+    with Image.open(io.BytesIO(new_parts[0]["inlineData"]["data"])) as image:
+        assert image.size == (100, 50)
+
+
+def test_path_input_is_read_and_encoded_once(tmp_path, monkeypatch):
+    import generate_image_gemini
+
+    raw = base64.b64decode(_png((300, 300), (9, 9, 9)))
+    (tmp_path / "in.png").write_bytes(raw)
+    monkeypatch.setattr(base64, "b64decode", lambda *args, **kwargs: pytest.fail("不应解码"))
+
+    parts, error = generate_image_gemini._build_image_parts([{"path": str(tmp_path / "in.png")}])
+    assert error is None
+    assert parts[0]["inlineData"] == {"mimeType": "image/png", "data": raw}
+
+    new_parts, stats = image_preprocess.preprocess_inline_parts(parts, max_edge=100, output_format="png")
+    assert "error" not in stats
+    assert stats["input_bytes"] == len(raw)
+
+    body = json.loads(generate_image_gemini._encode_request_body({"contents": [{"parts": new_parts}]}))
+    encoded = body["contents"][0]["parts"][0]["inlineData"]["data"]
+    assert encoded == base64.b64encode(new_parts[0]["inlineData"]["data"]).decode("ascii")
+
+
+def test_decompression_bomb_passes_original_through(monkeypatch):
+    monkeypatch.setattr(Image, "MAX_IMAGE_PIXELS", 100)
+    bomb = {"inlineData": {"mimeType": "image/png", "data": _png((64, 64), (1, 2, 3))}}
+
+    new_parts, stats = image_preprocess.preprocess_inline_parts([bomb], max_edge=16)
+
+    assert "error" not in stats
+    assert new_parts == [bomb]
+    assert stats["images"][0]["skipped"]
+    assert stats["input_bytes"] == stats["output_bytes"] > 0
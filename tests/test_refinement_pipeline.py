@@ -0,0 +1,61 @@
+"""
+多步精修流水线：中间图片按内容哈希保存，失败后用 resume_from 从最后完成的一步继续
+"""
+
+import pytest
+
+
+PROMPTS = dict(prompt="draw a cat", refine_prompts=["add a hat", "make it blue"])
+
+
+def test_failed_step_returns_resume_point_under_bypass(gemini, tmp_path):
+    module, stub = gemini
+    stub.script = [None, None, ("status", 400)]
+
+    failed = module.generate_image_gemini_core(save_path=str(tmp_path / "out"), cache="bypass", **PROMPTS)
+
+    assert not failed["success"]
+    assert failed["completed_steps"] == 2
+    assert failed["resumable"]
+    assert failed["resume_from"] == {"step": 2, "image_sha256": failed["steps"][1]["image_sha256"]}
+    for step in failed["steps"]:
+        assert step["image_path"]
+
+    calls = stub.calls
+    resumed = module.generate_image_gemini_core(
+        save_path=str(tmp_path / "out"), cache="bypass", resume_from=failed["resume_from"], **PROMPTS
+    )
+
+    assert resumed["success"]
+    assert stub.calls == calls + 1
+    assert [step.get("resumed", False) for step in resumed["steps"]] == [True, True, False]
+    assert resumed["steps"][1]["image_sha256"] == failed["steps"][1]["image_sha256"]
+
+
+def test_resume_rejects_mismatched_prompts(gemini, tmp_path):
+    module, stub = gemini
+    stub.script = [None, ("status", 400)]
+
+    failed = module.generate_image_gemini_core(save_path=str(tmp_path / "out"), **PROMPTS)
+    calls = stub.calls
+
+    result = module.generate_image_gemini_core(
+        prompt="draw a dog",
+        refine_prompts=PROMPTS["refine_prompts"],
+        save_path=str(tmp_path / "out"),
+        resume_from=failed["resume_from"],
+    )
+
+    assert not result["success"]
+    assert "resume_from" in result["error"]
+    assert stub.calls == calls
+
+
+@pytest.mark.parametrize("resume_from", [{"image_sha256": "0" * 64}, {"step": 1}, "abc"])
+def test_resume_with_unknown_image_fails_cleanly(gemini, tmp_path, resume_from):
+    module, stub = gemini
+
+    result = module.generate_image_gemini_core(save_path=str(tmp_path / "out"), resume_from=resume_from, **PROMPTS)
+
+    assert not result["success"]
+    assert stub.calls == 0
@@ -0,0 +1,132 @@
+"""
+浏览器请求拦截：规则单元测试，以及在本地替身页面上跑一次完整的 playwright 提取
+"""
+
+import asyncio
+import json
+
+import pytest
+
+from conftest import json_reply
+
+import get_bilibili_subtitle
+from browser_pool import BrowserPool, ResourceBlocker
+
+SUBTITLE_RESPONSE = {
+    "code": 200,
+    "data": {"subtitleItemVoList": [{"content": "第一行"}]},
+}
+
+# 替身页面：带图片、样式表、字体和第三方统计脚本，结构与真实提取页一致（输入框 + 提取按钮）
+STAND_IN_PAGE = """<!doctype html>
+<html>
+<head>
+  <link rel="stylesheet" href="/static/site.css">
+  <style>@font-face {{ font-family: stub; src: url(/static/font.woff2); }} body {{ font-family: stub; }}</style>
+  <script src="{third_party}/analytics.js"></script>
+</head>
+<body>
+  <img src="/static/banner.png">
+  <input placeholder="请将链接粘贴到这里">
+  <button class="el-button--primary" onclick="extract()">提取</button>
+  <script>
+    function extract() {{
+      const url = document.querySelector("input").value;
+      fetch("/api/subtitleExtract", {{method: "POST", body: JSON.stringify({{url}})}});
+    }}
+  </script>
+</body>
+</html>
+"""
+
+
+class TestShouldBlock:
+    def test_resource_types(self):
+        blocker = ResourceBlocker(blocked_resource_types=["Image", "font"])
+        assert blocker.should_block("image", "https://example.com/a.png")
+        assert blocker.should_block("font", "https://example.com/a.woff2")
+        assert not blocker.should_block("script", "https://example.com/a.js")
+
+    def test_blocked_domains_include_subdomains(self):
+        blocker = ResourceBlocker(blocked_domains=[".hm.baidu.com", "doubleclick.net"])
+        assert blocker.should_block("script", "https://hm.baidu.com/hm.js")
+        assert blocker.should_block("xhr", "https://stats.g.doubleclick.net/collect")
+        assert not blocker.should_block("script", "https://baidu.com/x.js")
+
+    def test_allowed_domains_block_other_hosts(self):
+        blocker = ResourceBlocker(allowed_domains=["example.com"])
+        assert not blocker.should_block("document", "https://example.com/")
+        assert not blocker.should_block("fetch", "https://api.example.com/subtitleExtract")
+        assert blocker.should_block("script", "https://cdn.other.com/lib.js")
+        # data: / blob: 等非 http 请求不受域名规则影响
+        assert not blocker.should_block("image", "data:image/png;base64,AAAA")
+
+    def test_empty_blocker_is_falsy(self):
+        assert not ResourceBlocker()
+        assert ResourceBlocker(blocked_domains=["example.com"])
+
+
+def _stand_in_handler(third_party: str):
+    def handler(method, path, body):
+        if path == "/":
+            page = STAND_IN_PAGE.format(third_party=third_party)
+            return 200, {"Content-Type": "text/html; charset=utf-8"}, page
+        if "subtitleExtract" in path:
+            return json_reply(SUBTITLE_RESPONSE)
+        # 静态资源返回较大的响应体，拦截与否在字节数上能明显区分
+        return 200, {"Content-Type": "application/octet-stream"}, b"x" * 50_000
+
+    return handler
+
+
+def _run_extraction(blocker):
+    async def run():
+        pool = BrowserPool(size=1, blocker=blocker)
+        network = {}
+        try:
+            async with pool.lease(network) as page:
+                result = await get_bilibili_subtitle._extract_with_page(
+                    page, "https://www.bilibili.com/video/BV1xx411c7mD", {}
+                )
+        finally:
+            await pool.close()
+        return result, network
+
+    try:
+        return asyncio.run(run())
+    except Exception as e:
+        if "Executable doesn't exist" in str(e) or "playwright install" in str(e):
+            pytest.skip("Chromium 未安装")
+        raise
+
+
+def test_stand_in_page_blocks_assets(config, stub_server):
+    # 第三方脚本用 localhost 访问同一个桩服务器，主机名不同于 127.0.0.1，可被 allowed_domains 拦下
+    server = stub_server(lambda *args: (404, {}, b""))
+    server.handler = _stand_in_handler(server.url.replace("127.0.0.1", "localhost"))
+    config({"bilibili": {"page_url": server.url + "/"}})
+
+    result, open_network = _run_extraction(None)
+    assert result["success"]
+    open_paths = [path for _, path, _ in server.requests]
+    assert "/static/banner.png" in open_paths
+    assert "/analytics.js" in open_paths
+
+    server.requests.clear()
+    blocker = ResourceBlocker(
+        blocked_resource_types=["image", "font", "stylesheet"],
+        allowed_domains=["127.0.0.1"],
+    )
+    result, network = _run_extraction(blocker)
+
+    assert result["success"]
+    assert result["data"]["data"]["subtitleItemVoList"][0]["content"] == "第一行"
+    paths = [path for _, path, _ in server.requests]
+    assert paths[0] == "/"
+    assert any("subtitleExtract" in path for path in paths)
+    assert not any(path.startswith("/static/") or path == "/analytics.js" for path in paths)
+    extract_body = next(body for _, path, body in server.requests if "subtitleExtract" in path)
+    assert json.loads(extract_body)["url"].endswith("BV1xx411c7mD")
+
+    assert network["blocked"] >= 3
+    assert network["bytes_received"] < open_network["bytes_received"]
@@ -0,0 +1,197 @@
+"""
+重试策略：对照注入 429 / 503 / 超时的本地桩服务器，检查重试、退避、总时限和对冲
+"""
+
+import threading
+import time
+
+import pytest
+import requests
+
+from retry_policy import LatencyTracker, RetryPolicy
+
+
+class FaultInjector:
+    """按 script 依次返回故障（状态码或延迟秒数），用完后立即返回 200"""
+
+    def __init__(self, *script):
+        self.script = list(script)
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def __call__(self, method, path, body):
+        with self._lock:
+            self.calls += 1
+            action = self.script.pop(0) if self.script else None
+
+        if isinstance(action, tuple):
+            return action[0], action[1], "injected"
+        if isinstance(action, int):
+            return action, {}, "injected"
+        if isinstance(action, float):
+            time.sleep(action)
+        return 200, {}, "ok"
+
+
+@pytest.fixture
+def faults(stub_server):
+    def start(*script, read_timeout=2.0):
+        injector = FaultInjector(*script)
+        server = stub_server(injector)
+
+        def send(remaining):
+            return requests.post(server.url, data=b"{}", timeout=(2, max(0.05, min(read_timeout, remaining))))
+
+        return injector, send
+
+    return start
+
+
+def _policy(**overrides):
+    params = dict(max_attempts=4, backoff_base=0.01, backoff_max=0.05, deadline_seconds=10)
+    params.update(overrides)
+    return RetryPolicy(**params)
+
+
+def test_retries_retryable_statuses_until_success(faults):
+    injector, send = faults(503, 429, 502)
+
+    response, meta = _policy().execute(send)
+
+    assert response.status_code == 200
+    assert meta["attempts"] == 4
+    assert [retry["status"] for retry in meta["retries"]] == [503, 429, 502]
+    assert all(0 <= retry["backoff_seconds"] <= 0.05 for retry in meta["retries"])
+
+
+def test_non_retryable_status_is_returned_immediately(faults):
+    injector, send = faults(400)
+
+    response, meta = _policy().execute(send)
+
+    assert response.status_code == 400
+    assert meta["attempts"] == 1
+    assert injector.calls == 1
+
+
+def test_gives_up_after_max_attempts(faults):
+    injector, send = faults(503, 503, 503, 503, 503)
+
+    response, meta = _policy(max_attempts=3).execute(send)
+
+    assert response.status_code == 503
+    assert meta["attempts"] == 3
+    assert injector.calls == 3
+
+
+def test_retry_after_header_raises_backoff(faults):
+    injector, send = faults((429, {"Retry-After": "1"}))
+
+    started = time.monotonic()
+    response, meta = _policy(backoff_max=0.3).execute(send)
+
+    assert response.status_code == 200
+    # Retry-After 取 min(Retry-After, backoff_max)
+    assert meta["retries"][0]["backoff_seconds"] == pytest.approx(0.3)
+    assert time.monotonic() - started >= 0.3
+
+
+def test_read_timeout_is_retried(faults):
+    injector, send = faults(1.0, read_timeout=0.2)
+
+    response, meta = _policy().execute(send)
+
+    assert response.status_code == 200
+    assert meta["retries"][0]["error"] == "ReadTimeout"
+
+
+def test_timeout_raises_with_meta_when_retries_disabled(faults):
+    injector, send = faults(1.0, read_timeout=0.2)
+
+    with pytest.raises(requests.exceptions.Timeout):
+        _policy(retry_on_timeout=False).execute(send)
+
+
+def test_deadline_stops_retrying(faults):
+    injector, send = faults(503, 503, 503)
+
+    response, meta = _policy(backoff_base=0.5, backoff_max=0.5, deadline_seconds=0.01).execute(send)
+
+    assert response.status_code == 503
+    assert meta["attempts"] == 1
+
+
+def test_deadline_exhausted_by_timeouts_raises_with_meta(faults):
+    injector, send = faults(1.0, 1.0, 1.0, read_timeout=0.2)
+
+    with pytest.raises(requests.exceptions.Timeout) as excinfo:
+        _policy(deadline_seconds=0.3).execute(send)
+
+    assert excinfo.value.retry_meta["attempts"] >= 1
+
+
+def test_hedge_uses_floor_until_enough_samples():
+    tracker = LatencyTracker(window=10)
+    policy = _policy(hedge_after_seconds=0.5, hedge_min_samples=5, latency=tracker)
+
+    for _ in range(4):
+        tracker.record("default", 0.05)
+    assert policy.hedge_threshold() == 0.5
+
+    tracker.record("default", 2.0)
+    assert policy.hedge_threshold() == 2.0
+
+
+def test_hedge_threshold_follows_observed_p95_per_target():
+    class Target:
+        def __init__(self, name):
+            self.name = name
+
+    tracker = LatencyTracker(window=100)
+    for index in range(100):
+        tracker.record("fast", 0.01 * (index + 1) / 100)
+        tracker.record("slow", 1.0 + index / 100)
+    policy = _policy(hedge_after_seconds=0.001, hedge_min_samples=20, latency=tracker)
+
+    assert policy.hedge_threshold(Target("fast")) == pytest.approx(0.0095)
+    assert policy.hedge_threshold(Target("slow")) == pytest.approx(1.94)
+
+
+def test_slow_request_is_hedged_at_observed_p95(faults):
+    tracker = LatencyTracker(window=50)
+    for _ in range(20):
+        tracker.record("default", 0.1)
+    injector, send = faults(1.5)
+    policy = _policy(hedge_after_seconds=0.01, hedge_min_samples=20, latency=tracker)
+
+    started = time.monotonic()
+    response, meta = policy.execute(send)
+
+    assert response.status_code == 200
+    assert meta["hedged"]
+    assert meta["hedge_after_seconds"] == pytest.approx(0.1)
+    assert time.monotonic() - started < 1.0
+    assert injector.calls == 2
+
+
+def test_fast_request_records_latency_without_hedging(faults):
+    tracker = LatencyTracker()
+    injector, send = faults()
+
+    response, meta = _policy(hedge_after_seconds=1.0, latency=tracker).execute(send)
+
+    assert not meta["hedged"]
+    assert injector.calls == 1
+    assert tracker.stats()["default"]["samples"] == 1
+
+
+def test_gemini_call_survives_injected_faults(gemini, tmp_path):
+    module, stub = gemini
+    stub.script = [("status", 503), ("status", 429)]
+
+    result = module.generate_image_gemini_core("draw a cat", str(tmp_path / "out"))
+
+    assert result["success"]
+    assert result["upstream"]["attempts"] == 3
+    assert [retry["status"] for retry in result["upstream"]["retries"]] == [503, 429]
+    assert module.upstream_stats()["latency"]
@@ -0,0 +1,56 @@
+"""
+保存 Base64 接口：流式与非流式路径对请求错误返回 400，对写盘失败返回 500
+"""
+
+import base64
+
+import pytest
+
+DATA = base64.b64encode(b"\x89PNG\r\n\x1a\n" + b"\x00" * 64).decode()
+
+
+@pytest.fixture
+def client(config, tools):
+    return tools.app.test_client()
+
+
+@pytest.mark.parametrize("stream", ["false", "true"])
+def test_saves_file(client, tmp_path, stream):
+    response = client.post(f"/save-base64?stream={stream}", json={"data": DATA, "path": str(tmp_path / "a.png")})
+
+    assert response.status_code == 200
+    assert (tmp_path / "a.png").read_bytes() == base64.b64decode(DATA)
+
+
+@pytest.mark.parametrize("stream", ["false", "true"])
+def test_invalid_base64_is_client_error(client, tmp_path, stream):
+    response = client.post(f"/save-base64?stream={stream}", json={"data": "QUJDR", "path": str(tmp_path / "a")})
+
+    assert response.status_code == 400
+    assert "Base64" in response.get_json()["error"]
+    assert "invalid_request" not in response.get_json()
+
+
+@pytest.mark.parametrize("body", [{"path": "a"}, {"data": DATA}])
+def test_stream_missing_field_is_client_error(client, body):
+    response = client.post("/save-base64?stream=true", json=body)
+
+    assert response.status_code == 400
+    assert "缺少必需参数" in response.get_json()["error"]
+
+
+def test_raw_stream_without_path_is_client_error(client):
+    response = client.post("/save-base64", data=DATA, content_type="text/plain")
+
+    assert response.status_code == 400
+
+
+def test_raw_stream_write_failure_is_server_error(client, tmp_path):
+    # 目标目录的位置被普通文件占用，无法写入
+    blocker = tmp_path / "taken"
+    blocker.write_text("")
+    response = client.post(
+        f"/save-base64?path={blocker / 'a.png'}", data=DATA, content_type="text/plain"
+    )
+
+    assert response.status_code == 500
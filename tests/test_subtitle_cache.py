@@ -0,0 +1,55 @@
+"""
+字幕缓存：SQLite 磁盘层的读写不在事件循环线程中执行
+"""
+
+import asyncio
+import threading
+
+from subtitle_cache import SubtitleCache
+
+VALUE = {"code": 200, "data": {"subtitleItemVoList": [{"content": "第一行"}]}}
+
+
+def test_disk_tier_runs_off_the_event_loop(tmp_path, monkeypatch):
+    cache = SubtitleCache(max_entries=1, db_path=str(tmp_path / "subtitles.sqlite3"))
+    disk_threads = []
+
+    for name in ("_get_disk", "_set_disk"):
+        original = getattr(cache, name)
+
+        def traced(*args, _original=original):
+            disk_threads.append(threading.get_ident())
+            return _original(*args)
+
+        monkeypatch.setattr(cache, name, traced)
+
+    async def run():
+        loop_thread = threading.get_ident()
+        await cache.set_async("BV1", VALUE)
+        await cache.set_async("BV2", VALUE)
+        # 内存层只有 1 条，BV1 只能从磁盘层读到
+        first = await cache.get_async("BV1")
+        missing = await cache.get_async("BV3")
+        return loop_thread, first, missing
+
+    loop_thread, first, missing = asyncio.run(run())
+
+    assert first == VALUE
+    assert missing is None
+    assert len(disk_threads) == 4
+    assert loop_thread not in disk_threads
+    stats = cache.stats()
+    assert stats["disk_hits"] == 1 and stats["misses"] == 1 and stats["stores"] == 2
+
+
+def test_memory_only_cache_returns_copies():
+    cache = SubtitleCache()
+
+    async def run():
+        await cache.set_async("BV1", VALUE)
+        value = await cache.get_async("BV1")
+        value["code"] = 500
+        return await cache.get_async("BV1")
+
+    assert asyncio.run(run()) == VALUE
+    assert cache.stats()["memory_hits"] == 2
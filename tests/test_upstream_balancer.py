@@ -0,0 +1,62 @@
+"""
+上游负载均衡：选择时占用在途名额，并发选择会分散到各个上游
+"""
+
+import threading
+
+from upstream_balancer import Upstream, UpstreamBalancer
+
+
+def _balancer(count: int = 2, **kwargs) -> UpstreamBalancer:
+    return UpstreamBalancer([Upstream(f"http://u{i}", f"key-{i}") for i in range(count)], **kwargs)
+
+
+def test_consecutive_picks_spread_before_any_request_starts():
+    balancer = _balancer(2)
+
+    picked = [balancer.pick() for _ in range(4)]
+
+    assert sorted(u.name for u in picked[:2]) == sorted(u.name for u in balancer.upstreams)
+    assert [u.in_flight for u in balancer.upstreams] == [2, 2]
+
+
+def test_concurrent_picks_are_balanced():
+    balancer = _balancer(4)
+    barrier = threading.Barrier(8)
+    picked = []
+
+    def worker():
+        barrier.wait()
+        picked.append(balancer.pick())
+
+    threads = [threading.Thread(target=worker) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert sorted(u.in_flight for u in balancer.upstreams) == [2, 2, 2, 2]
+
+
+def test_track_releases_the_reserved_slot():
+    balancer = _balancer(1)
+    upstream = balancer.pick()
+
+    with balancer.track(upstream) as record:
+        assert upstream.in_flight == 1
+        record(429)
+
+    assert upstream.in_flight == 0
+    assert upstream.stats["requests"] == 1
+    assert upstream.stats["rate_limited"] == 1
+    assert upstream.ejected_until > 0
+
+    upstream = balancer.pick()
+    try:
+        with balancer.track(upstream):
+            raise RuntimeError("boom")
+    except RuntimeError:
+        pass
+
+    assert upstream.in_flight == 0
+    assert upstream.stats["failures"] == 2